@@ -0,0 +1,326 @@
+'''
+This file contains the benchmark suite for the cruise control and simulation hot
+paths. It times the control functions on their own, whole headless simulation
+steps with different amounts of traffic and the drawing of a frame (with the dummy
+SDL video driver so no window is needed). The results are written as JSON and can
+be compared against a saved baseline so that a slowdown shows up as a number
+'''
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+# Let pygame draw without a window when timing the rendering
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+# pylint: disable=C0413
+import cruise_control
+import utils
+from car import Car, PIXELS_PER_METER, SCREEN_HEIGHT
+from highway import Highway
+from simulation import Simulation
+
+def time_call(function, number, repeat=5):
+    '''
+    Function to time how long a call takes, the best of a few repeats is used so
+    that other programs on the machine affect the result as little as possible
+    Input:
+        function (callable) - The function to time, it is called with no arguments
+        number (int) - How many times to call it in every repeat
+        repeat (int) - How many repeats to run
+    Output:
+        The time in seconds of a single call
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+
+    return best / number
+
+def make_simulation(cars, seed=0):
+    '''
+    Function to make a simulation with a given number of cars spread over the three
+    lanes of a road that is long enough for all of them
+    Input:
+        cars (int) - The number of cars to put on the road
+        seed (int) - The seed for the placement of the cars
+    Output:
+        The Simulation obj
+    '''
+    return make_highway_simulation(Highway().lanes, cars, seed)
+
+def make_highway_simulation(lanes, cars, seed=0):
+    '''
+    Function to make a simulation of dense traffic on a highway with any number of
+    lanes, the cars are spread over every lane without overlapping
+    Input:
+        lanes (int) - The number of lanes of the highway
+        cars (int) - The number of cars to put on the road
+        seed (int) - The seed for the placement of the cars
+    Output:
+        The Simulation obj, with the main car in one of the middle lanes
+    '''
+    # Fill the lanes to about half of the most cars that would fit, on a highway that
+    # is long enough to hold the whole stretch
+    stretch = cars * 140 // lanes
+    highway = Highway(length=max(20000, (stretch + SCREEN_HEIGHT) / PIXELS_PER_METER),
+                      lanes=lanes)
+    sim = Simulation(seed=seed, follow_dist='mid', highway=highway)
+    sim.player.cur_lane = lanes // 2
+    sim.player.x_pos = highway.lane_x(sim.player.cur_lane)
+
+    sim.spawn_many(cars, y_range=(840 - stretch, 840), velocity=(70, 90))
+    return sim
+
+def bench_control():
+    '''
+    Function to time the cruise control and velocity functions on their own
+    Output:
+        A dict with the time in seconds of a single call of each function
+    '''
+    player = Car(280, 800, 1, 90)
+    lead = Car(280, 600, 1, 60)
+    traffic = make_simulation(100).cars_on_road
+
+    return {
+        'check_collision': time_call(lambda: cruise_control.check_collision(280, 800, 280, 760),
+                                     20000),
+        'check_lane_change': time_call(lambda: cruise_control.check_lane_change(0, player,
+                                                                                traffic), 2000),
+        'acc_scenario_1': time_call(lambda: cruise_control.acc_scenario_1(player, lead, 'mid'),
+                                    20000),
+        'update_velocity': time_call(lambda: utils.update_velocity(60, 90, 1.5), 20000),
+        'calculate_time': time_call(lambda: utils.calculate_time(60, 90), 20000),
+    }
+
+def bench_simulation(sizes):
+    '''
+    Function to time whole headless simulation steps
+    Input:
+        sizes (list of int) - The numbers of cars to time a step with
+    Output:
+        A dict with the time in seconds of a single step for each number of cars
+    '''
+    results = dict()
+    for cars in sizes:
+        sim = make_simulation(cars)
+        sim.request_lane_change(0)
+        results[f'step_{cars}_cars'] = time_call(lambda sim=sim: sim.step(), 50)
+
+    return results
+
+def bench_lanes(lane_counts, cars):
+    '''
+    Function to time how the lane change check, planning a whole lane change and
+    whole simulation steps (with the cruise control of every car) scale with the
+    number of lanes
+    Input:
+        lane_counts (list of int) - The numbers of lanes to time
+        cars (int) - The number of cars on the highway
+    Output:
+        A dict with the time in seconds of a lane change check, of planning a lane
+        change and of a step for each number of lanes
+    '''
+    results = dict()
+    for lanes in lane_counts:
+        sim = make_highway_simulation(lanes, cars)
+        traffic = sim.cars_on_road
+        player = sim.player
+        results[f'lane_change_{lanes}_lanes'] = time_call(
+            lambda traffic=traffic, player=player: (
+                cruise_control.check_lane_change(0, player, traffic),
+                cruise_control.check_lane_change(1, player, traffic)), 2000)
+        results[f'step_{lanes}_lanes'] = time_call(lambda sim=sim: sim.step(), 50)
+        results[f'lane_plan_{lanes}_lanes'] = time_call(
+            lambda planner=sim.lane_change, player=player: (
+                planner.begin(player, 0, 0.0), planner.begin(player, 1, 0.0)), 2000)
+
+    return results
+
+def bench_lane_change_mask(states=1000000, cars=5000):
+    '''
+    Function to time checking a lane change from a grid of positions and velocities of
+    the main car all at once
+    Input:
+        states (int) - About how many states of the main car to check
+        cars (int) - The number of cars on the highway
+    Output:
+        A dict with the time in seconds of checking the whole grid
+    '''
+    sim = make_highway_simulation(3, cars)
+    traffic = sim.cars_on_road
+    velocities = np.linspace(0, 150, 100)
+    positions = np.linspace(traffic.y_pos[:traffic.count].min(), 900, states // 100)
+    grid_y, grid_v = np.meshgrid(positions, velocities)
+
+    return {f'lane_change_mask_{grid_y.size}_states': time_call(
+        lambda: cruise_control.lane_change_mask(0, 1, grid_y, grid_v, traffic), 1, 3)}
+
+def bench_event_driven(cars=20, duration=60):
+    '''
+    Function to time a run of sparse highway traffic stepped at the frame rate and
+    event driven
+    Input:
+        cars (int) - The number of cars spread along the highway
+        duration (double) - The simulated time of a run in seconds
+    Output:
+        A dict with the time in seconds of a whole run in each mode
+    '''
+    def run_sparse(event_driven):
+        sim = Simulation(seed=0, follow_dist='mid')
+        sim.spawn_many(cars, y_range=(-300000, 700), velocity=(60, 110))
+        sim.set_target_velocity(100)
+        sim.run(duration, event_driven)
+
+    return {'sparse_run_stepped': time_call(lambda: run_sparse(False), 1, 3),
+            'sparse_run_events': time_call(lambda: run_sparse(True), 1, 3)}
+
+def bench_startup(modules=('simulation', 'monte_carlo', 'display')):
+    '''
+    Function to time how long a new Python process takes to start and import a module,
+    the way every worker process of a batch run starts
+    Input:
+        modules (list of str) - The modules to import
+    Output:
+        A dict with the time in seconds of starting Python on its own and of starting
+        it and importing each module
+    '''
+    def start(code):
+        subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.DEVNULL,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    results = {'startup_python': time_call(lambda: start('pass'), 1)}
+    for module in modules:
+        results[f'startup_{module}'] = time_call(lambda module=module: start(f'import {module}'),
+                                                 1)
+
+    return results
+
+def bench_render(sizes):
+    '''
+    Function to time drawing a frame, without any of the simulation
+    Input:
+        sizes (list of int) - The numbers of cars to time a frame with
+    Output:
+        A dict with the time in seconds of drawing a single frame for each number of cars
+    '''
+    # pylint: disable=C0415, E1101
+    import pygame
+    from display import Game, BLACK
+
+    game = Game()
+    results = dict()
+    for cars in sizes:
+        sim = make_simulation(cars)
+        game.camera = sim.camera
+
+        def frame(sim=sim):
+            sim.scroll += 7
+            dirty = game.draw_road(sim.scroll)
+            rects = game.draw_lane_change_lines(sim.player, BLACK, BLACK)
+            visible = [sim.cars_on_road.view(row) for row in sim.visible_rows().tolist()]
+            rects += game.draw_cars(visible, sim.player, sim.find_closest_car())
+            game.update_display(dirty, rects)
+
+        sim.player.load_image("images/chevy.png")
+        frame()
+        results[f'render_{cars}_cars'] = time_call(frame, 20)
+
+    pygame.quit()
+    return results
+
+def run(sizes, render=True, lane_counts=(3, 6, 8), lane_cars=5000):
+    '''
+    Function to run the whole suite
+    Input:
+        sizes (list of int) - The numbers of cars for the simulation and render timings
+        render (bool) - Whether to time the rendering as well
+        lane_counts (list of int) - The numbers of lanes to time the highway with
+        lane_cars (int) - The number of cars on the highway for the lane timings
+    Output:
+        A dict with the results and a description of the machine they were run on
+    '''
+    results = dict()
+    results.update(bench_control())
+    results.update(bench_simulation(sizes))
+    results.update(bench_lanes(lane_counts, lane_cars))
+    results.update(bench_lane_change_mask())
+    results.update(bench_event_driven())
+    results.update(bench_startup())
+    if render:
+        results.update(bench_render(sizes))
+
+    return {'machine': {'python': sys.version.split()[0],
+                        'numpy': np.__version__,
+                        'platform': platform.platform(),
+                        'processor': platform.processor()},
+            'results': results}
+
+def compare(current, baseline, threshold):
+    '''
+    Function to compare results against a baseline
+    Input:
+        current (dict) - The results that were just measured
+        baseline (dict) - The results saved from an earlier run
+        threshold (double) - How much slower (0.1 for 10%) counts as a regression
+    Output:
+        A list of the names of the benchmarks that regressed
+    '''
+    regressions = []
+    print(f"{'benchmark':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print(f"{name:<28} {'-':>12} {value * 1e6:>10.2f}us {'new':>8}")
+            continue
+
+        change = value / old - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<28} {old * 1e6:>10.2f}us {value * 1e6:>10.2f}us {change:>+8.1%}{flag}")
+
+    return regressions
+
+def main():
+    '''
+    Command line entry point for the benchmarks
+    '''
+    parser = argparse.ArgumentParser(description="Benchmark the control and simulation code")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--no-render', action='store_true', help="Skip the render timings")
+    parser.add_argument('--lanes', type=int, nargs='+', default=[3, 6, 8],
+                        help="The numbers of lanes to time the highway with")
+    parser.add_argument('--lane-cars', type=int, default=5000,
+                        help="The number of cars on the highway for the lane timings")
+    parser.add_argument('--output', help="File to write the results to as JSON")
+    parser.add_argument('--baseline', help="Results from an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Slowdown that counts as a regression (0.1 is 10%%)")
+    args = parser.parse_args()
+
+    current = run(args.sizes, not args.no_render, args.lanes, args.lane_cars)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(current, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if compare(current, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        print(json.dumps(current, indent=2))
+
+if __name__ == '__main__':
+    main()
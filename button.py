@@ -6,9 +6,9 @@ demo requires
 # pylint: disable= E1101
 
 import pygame
-from display import YELLOW, GREY
 
-pygame.init()
+YELLOW = pygame.Color("#fcdb38")
+GREY = (159, 163, 168)
 
 class Button:
     '''
@@ -29,8 +29,11 @@ class Button:
     def draw_button(self, screen):
         '''
         Method to draw the buttons to the screen
+        Output:
+            The rect of the screen that was drawn to
         '''
-        pygame.draw.rect(screen, self.colour, (self.x_pos, self.y_pos, self.width, self.height))
+        return pygame.draw.rect(screen, self.colour,
+                                (self.x_pos, self.y_pos, self.width, self.height))
 
     def handle_event(self, event):
         '''
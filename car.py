@@ -2,11 +2,49 @@
 This file contains the logic for anything related to the movement of a car
 '''
 
-# pylint: disable= E0611
+BLACK = (0, 0, 0)
 
-import pygame
+# The frame rate the movement of the spawned cars was originally tuned for
+FRAME_RATE = 60
 
-BLACK = (0, 0, 0)
+# Arbitrary height and width of cars
+# Initial values are w=110, h=191
+CAR_WIDTH = 42
+CAR_HEIGHT = 60
+
+# The height of the visible road in pixels
+SCREEN_HEIGHT = 900
+
+# How many pixels the cars move for every meter they drive, a velocity of v km/h moves
+# a car v / 10 pixels every frame
+PIXELS_PER_METER = FRAME_RATE / 10 * 3.6
+
+# The scaled images that have been loaded so far, shared by every car
+SPRITES = dict()
+
+def load_sprite(img, size=(CAR_WIDTH, CAR_HEIGHT)):
+    '''
+    Function to get the image for a car. Each file is only loaded from disk and
+    scaled once, after that the same surface is shared by every car that uses it
+    Input:
+        img (str) - The name of the file/image to load
+        size ((int, int)) - The width and height to scale the image to
+    Output:
+        The surface with the scaled image
+    '''
+    key = (img, size)
+    sprite = SPRITES.get(key)
+    if sprite is None:
+        # pygame is only needed to draw, so the cars can be used without it
+        # pylint: disable=C0415
+        import pygame
+
+        sprite = pygame.image.load(img).convert()
+        sprite = pygame.transform.scale(sprite, size)
+        sprite.set_colorkey(BLACK)
+        SPRITES[key] = sprite
+
+    return sprite
 
 class Car:
     '''
@@ -20,55 +58,27 @@ class Car:
         self.velocity = velocity # in kmh
         self.cur_lane = start_lane
 
-        # Arbitrary height and width of cars
-        # Initial values are w=110, h=191
-        self.width = 42
-        self.height = 60
+        self.width = CAR_WIDTH
+        self.height = CAR_HEIGHT
 
     def load_image(self, img):
         '''
-        Function to load the image we are going to use for the car
+        Function to load the image we are going to use for the car, the image is
+        shared with every other car that uses the same file
         Input:
             img (str) - The name of the file/image to load
         Output:
             None
         '''
-        self.image = pygame.image.load(img).convert()
-        self.image = pygame.transform.scale(self.image, (42, 60))
-        self.image.set_colorkey(BLACK)
+        self.image = load_sprite(img, (self.width, self.height))
 
-    def draw_image(self, screen):
+    def draw_image(self, screen, top=0):
         '''
         Draw the image of the car to the screen
         Input:
             screen (screen object) - The screen the game will output to
+            top (double) - The world y position at the top of the screen
         Output:
-            None
-        '''
-        screen.blit(self.image, [self.x_pos, self.y_pos])
-
-    def change_velocity(self, velocity):
+            The rect of the screen that was drawn to
         '''
-        Method to change the velocity of the car
-        Input:
-            velocity (double) - The new velocity of the car in km/h
-        Output:
-            None
-        '''
-        self.velocity = round(velocity)
-
-    def check_out_of_screen(self):
-        '''
-        Method to see if the car has moved off of the visible screen
-        Input:
-            None
-        Output:
-            Boolean values denoting if the car is still on the screen
-        '''
-        if self.y_pos + self.height > 900 or self.y_pos < 0:
-            return True
-
-        return False
-
-    def move_spawned_cars(self, player_velocity):
-        self.y_pos += (player_velocity - self.velocity) / 10
\ No newline at end of file
+        return screen.blit(self.image, [self.x_pos, self.y_pos - top])
@@ -2,12 +2,85 @@
 This file contains the logic for the cruise control algorithms
 '''
 
+import numpy as np
 import utils
+from car import CAR_WIDTH, CAR_HEIGHT, PIXELS_PER_METER
 
-# Defining some constants
-BRAKE = -10.04
-ACCEL = 3.3
-LANESUPERPOSITIONS = [180, 280, 380]
+# The extra space in pixels around a car that still counts as a collision
+COLLISION_MARGIN = 10
+
+# How far ahead of the main car (in pixels) the lane change check looks, this is the
+# part of the screen in front of it
+SENSOR_RANGE = 800
+
+# The id the main car is given in the threat map, the other cars use their traffic ids
+PLAYER_ID = -1
+
+class ControllerParams:
+    '''
+    This class holds all of the values the cruise control is tuned with, so that
+    different settings can be tried side by side without changing any constants
+    '''
+
+    # pylint: disable=R0913
+    def __init__(self, brake=None, accel=None, follow_short=2, follow_mid=3,
+                 follow_long=4, blind_spot_time=1, lane_change_speed=20,
+                 lane_change_lengths=3, threat_horizon=5):
+        '''
+        Method to initialize the controller settings
+        Input:
+            brake (double) - The (negative) deceleration of the car in m/s^2, utils.BRAKE
+                             if None
+            accel (double) - The acceleration of the car in m/s^2, utils.ACCEL if None
+            follow_short (double) - The "short" following distance in seconds
+            follow_mid (double) - The "mid" following distance in seconds
+            follow_long (double) - The "long" following distance in seconds
+            blind_spot_time (double) - The blind spot braking starts when the time to
+                                       reach the car ahead drops to this many seconds
+            lane_change_speed (double) - Cars ahead in the target lane going this many m/s
+                                         faster than the main car block a lane change
+            lane_change_lengths (double) - No car may be within this many car lengths in
+                                           the target lane for a lane change
+            threat_horizon (double) - Pairs of cars with a time to collision or a time
+                                      headway of this many seconds or less are threats
+        '''
+        self.brake = utils.BRAKE if brake is None else brake
+        self.accel = utils.ACCEL if accel is None else accel
+        self.follow_dist = {'short': follow_short, 'mid': follow_mid, 'long': follow_long}
+        self.blind_spot_time = blind_spot_time
+        self.lane_change_speed = lane_change_speed
+        self.lane_change_lengths = lane_change_lengths
+        self.threat_horizon = threat_horizon
+
+    def as_dict(self):
+        '''
+        Method to get the settings in the same form they are passed to __init__
+        '''
+        return {'brake': self.brake, 'accel': self.accel,
+                'follow_short': self.follow_dist['short'],
+                'follow_mid': self.follow_dist['mid'],
+                'follow_long': self.follow_dist['long'],
+                'blind_spot_time': self.blind_spot_time,
+                'lane_change_speed': self.lane_change_speed,
+                'lane_change_lengths': self.lane_change_lengths,
+                'threat_horizon': self.threat_horizon}
+
+def overlaps(player_x, player_y, car_x, car_y):
+    '''
+    Function to check if cars overlap, this works on single coordinates as well
+    as on numpy arrays of coordinates (in which case every pair is checked at once)
+    Input:
+        player_x (int or array) - The x coordinates of the first cars
+        player_y (int or array) - The y coordinates of the first cars
+        car_x (int or array) - The x coordinates of the second cars
+        car_y (int or array) - The y coordinates of the second cars
+    Output:
+        A boolean (or an array of booleans) denoting which pairs overlap
+    '''
+    return (player_x + CAR_WIDTH + COLLISION_MARGIN > car_x) & \
+           (player_x < car_x + CAR_WIDTH + COLLISION_MARGIN) & \
+           (player_y < car_y + CAR_HEIGHT + COLLISION_MARGIN) & \
+           (player_y + CAR_HEIGHT + COLLISION_MARGIN > car_y)
 
 def check_collision(player_x, player_y, car_x, car_y):
     '''
@@ -22,10 +95,179 @@ def check_collision(player_x, player_y, car_x, car_y):
         given cars(inputs)
     '''
 
-    return bool((player_x + 42 + 10 > car_x) and (player_x < car_x + 42 + 10) and \
-                (player_y < car_y + 60 + 10) and (player_y + 60 + 10 > car_y))
+    return bool(overlaps(player_x, player_y, car_x, car_y))
 
-def acc_scenario_1(car_1, car_2, dist):
+def find_collisions(state):
+    '''
+    Function to find every pair of cars on the road that have crashed. The cars are
+    sorted by y position and swept so that only cars that are close enough vertically
+    are checked against each other, and those checks are done for all pairs at once
+    Input:
+        state (Traffic obj) - All of the cars currently on the road
+    Output:
+        An (n, 2) array with the ids of the two cars in each collision
+    '''
+    count = state.count
+    order = np.argsort(state.y_pos[:count], kind='stable')
+    sorted_x = state.x_pos[order]
+    sorted_y = state.y_pos[order]
+
+    # Compare every car with the car offset places after it in y order. Once a car is
+    # too far from the car offset places after it, it is too far from all later cars
+    pairs = []
+    first = np.arange(count)
+    for offset in range(1, count):
+        first = first[first + offset < count]
+        second = first + offset
+        close = sorted_y[second] - sorted_y[first] < CAR_HEIGHT + COLLISION_MARGIN
+        first = first[close]
+        second = second[close]
+        if len(first) == 0:
+            break
+
+        hit = overlaps(sorted_x[first], sorted_y[first], sorted_x[second], sorted_y[second])
+        pairs.append(np.column_stack((order[first[hit]], order[second[hit]])))
+
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    return np.sort(state.ids[np.concatenate(pairs)], axis=1)
+
+class ThreatMap:
+    '''
+    This class holds the pairs of cars that are closing in on each other, worked out
+    at most once per step so that everything that needs them reads the same numbers. Every
+    pair is a leader (the car ahead) and a follower (the car behind) that are in the
+    same lane or in lanes next to each other
+    '''
+
+    # pylint: disable=R0913
+    def __init__(self, leader, follower, leader_row, follower_row, lane_offset, gap, ttc,
+                 headway):
+        '''
+        Method to initialize a threat map, every input has one value per pair
+        Input:
+            leader (array of int) - The id of the car ahead, PLAYER_ID for the main car
+            follower (array of int) - The id of the car behind, PLAYER_ID for the main car
+            leader_row (array of int) - The traffic row of the car ahead, -1 for the main
+                                        car, only valid until cars are added or removed
+            follower_row (array of int) - The traffic row of the car behind, as above
+            lane_offset (array of int) - The lane of the follower minus the lane of the
+                                         leader, 0 for cars in the same lane
+            gap (array of double) - The distance in meters from the back of the leader to
+                                    the front of the follower, negative if they are side
+                                    by side
+            ttc (array of double) - The time to collision in seconds, inf if the gap is
+                                    not closing
+            headway (array of double) - The time in seconds the follower takes to cover
+                                        the gap, inf if it is not moving
+        '''
+        self.leader = leader
+        self.follower = follower
+        self.leader_row = leader_row
+        self.follower_row = follower_row
+        self.lane_offset = lane_offset
+        self.gap = gap
+        self.ttc = ttc
+        self.headway = headway
+
+    def __len__(self):
+        return len(self.leader)
+
+    def involving(self, car_id, lane_offset=None):
+        '''
+        Method to find the pairs a car is part of
+        Input:
+            car_id (int) - The id of the car, PLAYER_ID for the main car
+            lane_offset (int) - Only the pairs with this lane offset, all of them if None
+        Output:
+            An array of the indices of the pairs
+        '''
+        mask = (self.leader == car_id) | (self.follower == car_id)
+        if lane_offset is not None:
+            mask &= self.lane_offset == lane_offset
+
+        return np.flatnonzero(mask)
+
+    def min_ttc(self, car_id):
+        '''
+        Method to get the smallest time to collision of a car with any other car
+        Input:
+            car_id (int) - The id of the car, PLAYER_ID for the main car
+        Output:
+            The time in seconds, inf if the car is not part of any threat
+        '''
+        pairs = self.involving(car_id)
+        return float(self.ttc[pairs].min()) if len(pairs) else np.inf
+
+def threat_map(player, cars_on_road, horizon):
+    '''
+    Function to work out the time to collision and the time headway of every car with
+    the car directly ahead of it and behind it in its own lane and in the lanes next
+    to it, for all of the cars at once. Only the pairs that are within the horizon are
+    kept
+    Input:
+        player (Car obj) - The main car
+        cars_on_road (Traffic obj) - All of the other cars on the road
+        horizon (double) - The largest time to collision or time headway in seconds
+                           that still counts as a threat
+    Output:
+        A ThreatMap obj with the pairs under the horizon
+    '''
+    count = cars_on_road.count
+    ids = np.concatenate(([PLAYER_ID], cars_on_road.ids[:count]))
+    rows = np.arange(-1, count)
+    y_pos = np.concatenate(([player.y_pos], cars_on_road.y_pos[:count]))
+    velocity = np.concatenate(([player.velocity], cars_on_road.velocity[:count]))
+    lanes = np.concatenate(([player.cur_lane], cars_on_road.lane[:count]))
+
+    # Every car in the order of its lane and then its y position, as a single key so
+    # that a position in any lane can be found with one binary search
+    span = y_pos.max() - y_pos.min() + 1
+    keys = lanes * span + (y_pos - y_pos.min())
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    sorted_lanes = lanes[order]
+
+    # Cars next to each other in that order and in the same lane are leader and follower
+    same = np.flatnonzero(sorted_lanes[1:] == sorted_lanes[:-1])
+    leaders = [order[same]]
+    followers = [order[same + 1]]
+
+    # For the lanes on either side, the closest car ahead of and behind every car
+    for side in (-1, 1):
+        other = sorted_lanes + side
+        lane_start = np.searchsorted(sorted_lanes, other, side='left')
+        lane_end = np.searchsorted(sorted_lanes, other, side='right')
+        place = np.searchsorted(keys, keys + side * span, side='left')
+
+        ahead = place > lane_start
+        leaders.append(order[place[ahead] - 1])
+        followers.append(order[ahead])
+
+        behind = place < lane_end
+        leaders.append(order[behind])
+        followers.append(order[place[behind]])
+
+    # A pair of cars in neighbouring lanes is found from both of them, so drop the
+    # repeats (as a single integer key, which is much faster to sort than rows)
+    pairs = np.unique(np.concatenate(leaders) * len(ids) + np.concatenate(followers))
+    leader, follower = np.divmod(pairs, len(ids))
+
+    # Gaps are in meters (at the scale the cars move at) and velocities in m/s
+    gap = (y_pos[follower] - y_pos[leader] - CAR_HEIGHT) / PIXELS_PER_METER
+    closing = utils.kmh_to_ms(velocity[follower] - velocity[leader])
+    follower_vel = utils.kmh_to_ms(velocity[follower])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ttc = np.where(closing > 0, np.maximum(gap, 0) / closing, np.inf)
+        headway = np.where(follower_vel > 0, np.maximum(gap, 0) / follower_vel, np.inf)
+
+    keep = (ttc <= horizon) | (headway <= horizon)
+    leader, follower = leader[keep], follower[keep]
+    return ThreatMap(ids[leader], ids[follower], rows[leader], rows[follower],
+                     lanes[follower] - lanes[leader], gap[keep], ttc[keep], headway[keep])
+
+def acc_scenario_1(car_1, car_2, dist, params=None):
     '''
     This is the function that handles the first acc scenario (dealing with cruise control
     for a car that is in our lane)
@@ -34,15 +276,14 @@ def acc_scenario_1(car_1, car_2, dist):
         car_2 (Car obj) - This is the lead car
         dist (string) - This will either be "short", "mid", or "far" indicating the
                         distance at which car_1 will be following car_2
+        params (ControllerParams obj) - The controller settings, the defaults if None
     Output:
         The time in seconds (float) for deceleration
     '''
-    # The following distances below represent the time in seconds the main car should be
+    # The following distances represent the time in seconds the main car should be
     # behind the lead car
-    follow_dist = dict()
-    follow_dist['short'] = 2
-    follow_dist['mid'] = 3
-    follow_dist['long'] = 4
+    params = params or ControllerParams()
+    follow_dist = params.follow_dist
 
     # Getting the velocities in m/s rather than km/h
     car_1_vel = utils.kmh_to_ms(car_1.velocity)
@@ -52,10 +293,10 @@ def acc_scenario_1(car_1, car_2, dist):
     if car_1_vel < car_2_vel:
         return 0.0
 
-    # Calculating the time it takes to slow down
-    # note that the 12 used below is to convert from meters to pixels
-    time = utils.calculate_time(car_1.velocity, car_2.velocity)
-    delta_d = ((car_1_vel - car_2_vel) / 2) * time * 12
+    # Calculating the time it takes to slow down, and the distance covered meanwhile in
+    # pixels at the scale the cars are moved at (the same one the traffic follows with)
+    time = utils.calculate_time(car_1.velocity, car_2.velocity, params.accel, params.brake)
+    delta_d = ((car_1_vel - car_2_vel) / 2) * time * PIXELS_PER_METER
 
     if car_1.x_pos == car_2.x_pos and \
        abs(car_1.y_pos - car_2.y_pos) <= (follow_dist[dist] * delta_d):
@@ -65,71 +306,159 @@ def acc_scenario_1(car_1, car_2, dist):
     # the lead car is not close enough to do anything about it
     return 0.0
 
-def check_lane_change(direction, car_1, cars_on_road):
+def acc_following(velocity, leader_y, leader_vel, y_pos, dist, params=None):
+    '''
+    This is acc_scenario_1 for many cars at once, every car is checked against the
+    car ahead of it in its lane
+    Input:
+        velocity (array of double) - The velocities (km/h) of the following cars
+        leader_y (array of double) - The y positions of the cars ahead, nan for none
+        leader_vel (array of double) - The velocities (km/h) of the cars ahead
+        y_pos (array of double) - The y positions of the following cars
+        dist (string) - This will either be "short", "mid", or "long" indicating the
+                        distance at which the cars follow the car ahead
+        params (ControllerParams obj) - The controller settings, the defaults if None
+    Output:
+        An array with the time in seconds each car needs to slow down to the speed of
+        the car ahead, 0 where it does not have to slow down
+    '''
+    params = params or ControllerParams()
+    follow_dist = params.follow_dist[dist]
+
+    # The same steps as acc_scenario_1
+    time = utils.kmh_to_ms(leader_vel - velocity) / params.brake
+    delta_d = utils.kmh_to_ms(velocity - leader_vel) / 2 * time * PIXELS_PER_METER
+    with np.errstate(invalid='ignore'):
+        slow = (velocity > leader_vel) & (np.abs(y_pos - leader_y) <= follow_dist * delta_d)
+
+    return np.where(slow, time, 0.0)
+
+def traffic_targets(velocity, cruise, y_pos, leader_y, leader_vel, dist, params=None):
+    '''
+    Function to work out the velocity every other car is heading for. Each car heads
+    for the velocity of the car ahead of it when acc_scenario_1 says it is closing in
+    too fast or it is within its following distance, and otherwise for the velocity it
+    cruises at. This works on arrays of any shape, so many steps can be checked at once
+    Input:
+        velocity (array of double) - The velocities (km/h) of the cars
+        cruise (array of double) - The velocities (km/h) the cars cruise at
+        y_pos (array of double) - The y positions of the cars
+        leader_y (array of double) - The y positions of the cars ahead, nan for none
+        leader_vel (array of double) - The velocities (km/h) of the cars ahead
+        dist (string) - This will either be "short", "mid", or "long" indicating the
+                        distance at which the cars follow the car ahead
+        params (ControllerParams obj) - The controller settings, the defaults if None
+    Output:
+        An array with the velocity (km/h) every car is heading for
+    '''
+    params = params or ControllerParams()
+
+    # The gap to the car ahead in meters, at the scale the cars are moved at
+    gap = (y_pos - leader_y - CAR_HEIGHT) / PIXELS_PER_METER
+    with np.errstate(invalid='ignore'):
+        close = gap <= params.follow_dist[dist] * utils.kmh_to_ms(velocity)
+        slow = acc_following(velocity, leader_y, leader_vel, y_pos, dist, params) > 0
+        follow = (cruise > leader_vel) & (close | slow)
+
+    return np.where(follow, leader_vel, cruise)
+
+def lead_car(car_1, cars_on_road):
+    '''
+    Function to find the car directly in front of the main car, this is the car the
+    adaptive cruise control follows
+    Input:
+        car_1 (Car obj) - The main car on the road
+        cars_on_road (Traffic obj) - All of the cars currently on the road
+    Output:
+        The closest Car obj ahead of car_1 in its lane, or None if the lane is clear
+    '''
+    return cars_on_road.leader(car_1.cur_lane, car_1.y_pos)
+
+def check_lane_change(direction, car_1, cars_on_road, params=None):
     '''
     This function that will validate whether a lane change requested by the user
     is safe to perform
     Input:
         direction (int) - A 0 (for left) or 1 (for right) to indicate the direction
         car_1 (Car obj) - The main car on the road
-        cars_on_road (dict of Car objs) - All of the cars currently on the road
+        cars_on_road (Traffic obj) - All of the cars currently on the road
+        params (ControllerParams obj) - The controller settings, the defaults if None
     Output:
         A boolean value denoting if the lane change requested by the user is safe
         to perform
     '''
+    params = params or ControllerParams()
     player_vel = utils.kmh_to_ms(car_1.velocity)
 
-    # Get all of the cars in the left, middle, and right lanes
-    left_cars = set()
-    middle_cars = set()
-    right_cars = set()
-    cars = [left_cars, middle_cars, right_cars]
-
-    # Adding the cars to their respective lane set
-    for car in cars_on_road:
-        cars[car.cur_lane].add(car)
-
-    # This first check is accounting for the case when the cars try to turn off the road
-    if (car_1.x_pos == LANESUPERPOSITIONS[0] and direction == 0) or \
-        (car_1.x_pos == LANESUPERPOSITIONS[2] and direction == 1):
+    # The lane the car is moving into, the current lane only changes once the car
+    # has made it all the way over. Turning off the edge of the road is never safe
+    target_lane = car_1.cur_lane - 1 if direction == 0 else car_1.cur_lane + 1
+    if not cars_on_road.highway.has_lane(target_lane):
         return False
 
     # All of the following scenarios will follow the same general set of guidelines:
     # 1. The car will only be allowed to change lanes if there is no car in the zone
-    #    (+- 2 car lengths in size) in the direction they wish to turn
+    #    (+- 3 car lengths in size) in the direction they wish to turn
     # 2. The cars behind the main car in the adjacent lane they wish to turn to are not
     #    going more than 20m/s faster than the main car (so they have time to slow down)
+    index = cars_on_road.sorted_index()
 
-    lower = car_1.y_pos - 3 * car_1.height
-    upper = car_1.y_pos + 3 * car_1.height
-
-    # The car wants to make a right turn from the left or left turn from the right
-    if car_1.x_pos in range(180, 281) and direction == 1 or \
-        car_1.x_pos in range(280, 381) and direction == 0:
-        for car in middle_cars:
-            car_vel = utils.kmh_to_ms(car.velocity)
-            relative_vel = car_vel - player_vel
-            if int (car.y_pos) in range(lower, upper) or \
-                (relative_vel > 20 and car.y_pos < car_1.y_pos):
-                return False
-
-    # The car wants to make a right turn from the middle lane
-    elif car_1.x_pos in range(280, 381) and direction == 1:
-        for car in right_cars:
-            car_vel = utils.kmh_to_ms(car.velocity)
-            relative_vel = car_vel - player_vel
-            if int (car.y_pos) in range(lower, upper) or \
-                (relative_vel > 20 and car.y_pos < car_1.y_pos):
-                return False
-
-    # The car wants to make a left turn from the middle lane
-    elif car_1.x_pos in range(180, 280) and direction == 0:
-        for car in left_cars:
-            car_vel = utils.kmh_to_ms(car.velocity)
-            relative_vel = car_vel - player_vel
-            if int (car.y_pos ) in range(lower, upper) or \
-                (relative_vel > 20 and car.y_pos < car_1.y_pos):
-                return False
+    lower = car_1.y_pos - params.lane_change_lengths * car_1.height
+    upper = car_1.y_pos + params.lane_change_lengths * car_1.height
+    if len(index.between(target_lane, lower, upper)) > 0:
+        return False
+
+    ahead = index.between(target_lane, car_1.y_pos - SENSOR_RANGE, car_1.y_pos)
+    relative_vel = utils.kmh_to_ms(cars_on_road.velocity[ahead]) - player_vel
+    if (relative_vel > params.lane_change_speed).any():
+        return False
 
     # If all checks pass then we are safe to make the lane change
     return True
+
+def lane_change_mask(direction, lanes, y_pos, velocity, cars_on_road, params=None):
+    '''
+    This is check_lane_change for many states of the main car at once, every state is
+    checked against the cars on the road as they are now. The states can be any shape
+    (a grid of positions and velocities for example), the inputs are broadcast together
+    Input:
+        direction (array of int) - A 0 (for left) or 1 (for right) for every state
+        lanes (array of int) - The lane the main car is in for every state
+        y_pos (array of double) - The y position of the main car for every state
+        velocity (array of double) - The velocity (km/h) of the main car for every state
+        cars_on_road (Traffic obj) - All of the cars currently on the road
+        params (ControllerParams obj) - The controller settings, the defaults if None
+    Output:
+        An array of booleans, True for the states the lane change would be safe from
+    '''
+    params = params or ControllerParams()
+    direction, lanes, y_pos, velocity = np.broadcast_arrays(direction, lanes, y_pos, velocity)
+    target_lane = np.where(direction == 0, lanes - 1, lanes + 1)
+    safe = (target_lane >= 0) & (target_lane < cars_on_road.highway.lanes)
+
+    count = cars_on_road.count
+    if count == 0:
+        return safe
+
+    # Every car in the order of its lane and then its y position, as a single key so
+    # that a range of any lane can be found with one binary search. The span of a lane
+    # covers every position that is looked up as well as the cars
+    lengths = params.lane_change_lengths * CAR_HEIGHT
+    car_y = cars_on_road.y_pos[:count]
+    lowest = min(car_y.min(), y_pos.min() - max(SENSOR_RANGE, lengths))
+    span = max(car_y.max(), y_pos.max() + lengths) - lowest + 1
+    keys = cars_on_road.lane[:count] * span + (car_y - lowest)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+
+    def place(position):
+        return np.searchsorted(keys, target_lane * span + (position - lowest), side='left')
+
+    # The same two rules as check_lane_change, no car within the lane change zone and no
+    # car ahead within the sensor range going too much faster
+    clear = place(y_pos + lengths) == place(y_pos - lengths)
+    fastest = utils.range_max(utils.kmh_to_ms(cars_on_road.velocity[:count][order]),
+                              place(y_pos - SENSOR_RANGE), place(y_pos))
+    slow = fastest - utils.kmh_to_ms(velocity) <= params.lane_change_speed
+
+    return safe & clear & slow
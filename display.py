@@ -5,13 +5,22 @@ display methods to the screen
 
 # pylint: disable=E1101
 
+import argparse
 import math
+import time
 import pygame
-import cruise_control
 import input_box as ib
 import utils
 import button as bt
-from car import Car
+import fonts
+from car import Car, CAR_HEIGHT, FRAME_RATE, load_sprite
+from highway import Camera
+from profiler import FrameProfiler
+from recorder import Trajectory, TrajectoryRecorder
+from simulation import Simulation, TIME_SCALES
+from telemetry import TelemetryServer
+from text_cache import TextCache, quantize
+from traffic_script import TrafficScript
 
 # Define some basic colours
 WHITE = (255, 255, 255)
@@ -22,12 +31,29 @@ BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 TEXT_COLOR = (250, 105, 10)
 
-# Load the fonts
-FONT_40 = pygame.font.SysFont("Arial", 40, True, False)
-FONT_30 = pygame.font.SysFont("Arial", 30, True, False)
-FONT_19 = pygame.font.SysFont("Arial", 19, True, False)
+# The fonts, they are only loaded the first time text is drawn with them
+FONT_40 = fonts.LazyFont("Arial", 40, True)
+FONT_30 = fonts.LazyFont("Arial", 30, True)
+FONT_19 = fonts.LazyFont("Arial", 19, True)
+PROFILE_FONT = fonts.LazyFont("Courier", 14, True)
 
-LANESUPERPOSITIONS = [180, 280, 380]
+# The size of the lane stripes, they repeat every STRIPE_PERIOD pixels
+STRIPE_WIDTH = 5
+STRIPE_HEIGHT = 45
+STRIPE_PERIOD = STRIPE_HEIGHT + 15
+
+# The part of the screen between the grass that scrolls with the road
+ROAD_RECT = pygame.Rect(163, 0, 274, 900)
+
+# How many times a second the simulation and the cruise control are stepped, and how
+# many frames a second are drawn. The cars are drawn between the last two steps so the
+# two rates do not need to line up
+PHYSICS_RATE = 240
+RENDER_RATE = FRAME_RATE
+
+# Rendered text is reused between frames, the numbers in the labels are rounded so
+# that they do not change (and need rendering again) every frame
+TEXT_CACHE = TextCache()
 
 class Game:
     '''
@@ -39,32 +65,68 @@ class Game:
         '''
         Method to initialize the game class and the pygame instance
         '''
-        pygame.init()
+        # Only the parts of pygame the demo uses are started, the fonts are loaded the
+        # first time they are drawn with
+        pygame.display.init()
+        pygame.font.init()
         pygame.display.set_caption("EcoCAR DEV Challenge")
         self.width = 600
         self.height = 900
         self.screen = pygame.display.set_mode((self.width, self.height))
         self.clock = pygame.time.Clock()
-        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background = self.build_road()
         self.exit = False
-        self.change = False
-        self.update = False
-        self.flag = True
-        self.cars_on_screen = 0
 
-    def run(self):
+        # The offset the road was last drawn at (None when the whole screen needs to
+        # be drawn again) and the areas that were drawn over the road last frame
+        self.road_offset = None
+        self.last_rects = []
+
+        # The timings of every part of a frame, and the lines of the on screen overlay
+        self.profiler = FrameProfiler()
+        self.show_profile = False
+        self.profile_lines = []
+
+        # Whether the pairs of cars in the threat map are drawn
+        self.show_threats = False
+
+        # Turns the world positions of the cars into screen positions
+        self.camera = Camera()
+
+    # pylint: disable=R0913, R0914
+    def run(self, record=None, profile=None, script=None, telemetry=None,
+            physics_rate=PHYSICS_RATE, render_rate=RENDER_RATE):
         '''
-        Method that will invoke that main loop that contains all the game logic
+        Method that will invoke that main loop that handles the user input and draws
+        the state of the simulation to the screen. F3 shows how long each part of the
+        frame takes. The simulation is stepped at its own fixed rate however long a
+        frame takes to draw, so a slow frame never holds up a braking decision
+        Input:
+            record (str) - A directory to record every frame of the run to, or None
+            profile (str) - A file to write the timing histograms to on exit, or None
+            script (str) - A JSONL or CSV traffic script to play once the demo starts,
+                           or None
+            telemetry (str) - "host:port" or a Unix socket path to stream the state of
+                              every frame to, or None
+            physics_rate (double) - How many steps of the simulation to run a second
+            render_rate (double) - How many frames to draw a second
         '''
         pygame.display.set_caption("EcoCAR DEV Challenge")
-
-        # Creating a set of all cars currently on the screen
-        cars_on_road = set()
-
-        # Creating the main car
-        player = Car(280, 800, 1, 75)
+        recorder = TrajectoryRecorder(record) if record else None
+        server = TelemetryServer(telemetry) if telemetry else None
+        if server is not None:
+            server.start()
+        profiler = self.profiler
+
+        # Creating the simulation that holds the main car and all of the other cars
+        sim = Simulation(profiler=profiler, physics_rate=physics_rate)
+        if script:
+            sim.script = TrafficScript(script)
+        player = sim.player
         player.load_image("images/chevy.png")
-        self.cars_on_screen += 1
+
+        # Load the image for the other cars now so spawning a car never reads from disk
+        load_sprite("images/chevy_black.png")
 
         # Setup the velocity input box
         velocity_input = ib.InputBox(480, 30, 50, 30, '')
@@ -73,19 +135,6 @@ class Game:
         text_ins = FONT_30.render("Click to Run!", True, TEXT_COLOR)
         text_velocity = FONT_19.render("Enter a velocity:", True, BLACK)
 
-        # Setup the stripes.
-        stripes = []
-        stripe_count = 50
-        stripe_y = -10
-        stripe_width = 5
-        stripe_height = 45
-        space = 15
-
-        for _ in range(stripe_count):
-            stripes.append([255, stripe_y])
-            stripes.append([345, stripe_y])
-            stripe_y += stripe_height + space
-
         # Setup the buttons
         buttons = dict()
         buttons['spawn'] = bt.Button(60, 80, 30, 30, YELLOW, GREY)
@@ -95,122 +144,335 @@ class Game:
         collision = True
 
         while not self.exit:
-            # Creating a set of cars in the same lane as the main car
-            cars_in_lane = set()
-            closest_car = None
-            min_distance = 10000 # Arbitrary value that is impossible for the cars to have
-
-            for car in cars_on_road:
-                if car.cur_lane == player.cur_lane:
-                    cars_in_lane.add(car)
-
-                    if player.y_pos - car.y_pos < min_distance:
-                        min_distance = player.y_pos - car.y_pos
-                        closest_car = car
+            frame_start = time.perf_counter()
 
             # pygame event queue
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.exit = True
+            with profiler.span('events'):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.exit = True
+
+                    # Reset everything when the user starts the game.
+                    if collision and event.type == pygame.MOUSEBUTTONDOWN:
+                        collision = False
+                        player.x_pos = 280
+                        pygame.mouse.set_visible(True)
+
+                    # handle the event for the velocity input box
+                    new_velocity = velocity_input.handle_event(event)
+
+                    # Handle the event for all of the various buttons
+                    for button in buttons.values():
+                        button.handle_event(event)
+
+                    # Only take the input when its a valid int between 0-100
+                    if utils.is_int(new_velocity) and int(new_velocity) in range(0, 101):
+                        sim.set_target_velocity(int(new_velocity))
+
+                    if event.type == pygame.KEYDOWN and not velocity_input.active:
+                        # Cycle through the time scales when tab is pressed
+                        if event.key == pygame.K_TAB:
+                            next_scale = (TIME_SCALES.index(sim.time_scale) + 1) % \
+                                         len(TIME_SCALES)
+                            sim.set_time_scale(TIME_SCALES[next_scale])
+
+                        # Show or hide the frame timings when F3 is pressed
+                        if event.key == pygame.K_F3:
+                            self.show_profile = not self.show_profile
+
+                        # Show or hide the threat map when F4 is pressed
+                        if event.key == pygame.K_F4:
+                            self.show_threats = not self.show_threats
 
-                # Reset everything when the user starts the game.
-                if collision and event.type == pygame.MOUSEBUTTONDOWN:
-                    collision = False
-                    player.x_pos = 280
-                    pygame.mouse.set_visible(True)
+            if not collision:
+                # Spawn another car if needed
+                if buttons['spawn'].pressed:
+                    buttons['spawn'].pressed = False
+                    buttons['spawn'].colour = GREY
+                    with profiler.span('car_spawn'):
+                        sim.spawn_car()
+
+                # Pass on any lane change the user asked for
+                if buttons['left'].pressed:
+                    sim.request_lane_change(0)
+                elif buttons['right'].pressed:
+                    sim.request_lane_change(1)
+                else:
+                    sim.request_lane_change(None)
+
+                with profiler.span('simulation'):
+                    sim.advance(self.clock.get_time() / 1000)
+                self.update_lane_buttons(sim, buttons)
+                if recorder is not None:
+                    with profiler.span('record'):
+                        recorder.record(sim)
+                if server is not None:
+                    with profiler.span('telemetry'):
+                        server.publish(sim)
+
+                # Methods to draw info the the screen, everything that is drawn over the
+                # road is kept track of so that only those parts of the screen are updated
+                with profiler.span('interpolate'):
+                    drawn, visible, closest_car, scroll = self.interpolated_cars(sim)
+                with profiler.span('draw_road'):
+                    dirty = self.draw_road(scroll)
+                with profiler.span('draw_background'):
+                    rects = self.draw_background(velocity_input, text_velocity,
+                                                 player.velocity, sim.time_scale)
+                with profiler.span('draw_buttons'):
+                    rects += self.draw_buttons(buttons)
+                with profiler.span('draw_lane_change_lines'):
+                    rects += self.draw_lane_change_lines(drawn, BLACK, BLACK)
+                with profiler.span('draw_cars'):
+                    rects += self.draw_cars(visible, drawn, closest_car)
+                if self.show_threats:
+                    rects += self.draw_threats(sim)
+                if self.show_profile:
+                    rects += self.draw_profile()
+                with profiler.span('display_update'):
+                    self.update_display(dirty, rects)
+
+                profiler.record('frame', time.perf_counter() - frame_start)
 
-                # handle the event for the velocity input box
-                new_velocity = velocity_input.handle_event(event)
+            else:
+                self.screen.fill(GREY)
+                self.road_offset = None
+                self.draw_start_menu(text_title, text_ins)
 
-                # Handle the event for all of the various buttons
-                for button in buttons.values():
-                    button.handle_event(event)
+            self.clock.tick(render_rate)
 
-                # Only take the input when its a valid int between 0-100
-                if utils.is_int(new_velocity) and int(new_velocity) in range(0, 101):
-                    target_velocity = int(new_velocity)
-                    self.change = True
+        if recorder is not None:
+            recorder.close()
 
-            #  Screen-clearing code
-            self.screen.fill(GREY)
+        if server is not None:
+            server.stop()
 
-            if not collision:
+        if profile is not None and profiler.buffers:
+            profiler.dump(profile)
 
-                if closest_car != None:
-                    y_diff = closest_car.y_pos - player.y_pos
-                    x_diff = abs(closest_car.x_pos - player.x_pos)
-                    distance = round(math.sqrt(y_diff ** 2 + x_diff ** 2) / 12, 2)
+        pygame.quit()
 
-                    bs_time = (2 * distance) / (player.velocity + closest_car.velocity)
+    def replay(self, path):
+        '''
+        Method to play back a recording made with run. Space pauses and resumes, the
+        left and right arrows jump a second back or forward and home/end jump to the
+        start/end of the recording
+        Input:
+            path (str) - The directory the recording was written to
+        '''
+        pygame.display.set_caption("EcoCAR DEV Challenge - Replay")
+        trajectory = Trajectory(path)
+        last_frame = max(len(trajectory) - 1, 0)
+        index = 0
+        playing = True
 
+        while not self.exit and len(trajectory):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.exit = True
 
-                    if bs_time <= 1 and self.flag and player.velocity > closest_car.velocity:
-                        target_velocity = closest_car.velocity
-                        self.change = True
-                        self.flag = False
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        playing = not playing
+                    elif event.key == pygame.K_LEFT:
+                        index = max(index - FRAME_RATE, 0)
+                    elif event.key == pygame.K_RIGHT:
+                        index = min(index + FRAME_RATE, last_frame)
+                    elif event.key == pygame.K_HOME:
+                        index = 0
+                    elif event.key == pygame.K_END:
+                        index = last_frame
+
+            frame = trajectory.frame(index)
+            player = Car(frame['player_x'], frame['player_y'], frame['player_lane'],
+                         frame['player_velocity'])
+            player.load_image("images/chevy.png")
+            self.camera.follow(player)
+
+            # Only the cars the camera can see are drawn
+            cars = []
+            closest_car = None
+            columns = frame['cars']
+            top, bottom = self.camera.bounds()
+            seen = (columns['y'] > top - CAR_HEIGHT) & (columns['y'] < bottom)
+            columns = {name: column[seen] for name, column in columns.items()}
+            for car_id, x_pos, y_pos, lane, velocity in zip(columns['id'].tolist(),
+                                                            columns['x'].tolist(),
+                                                            columns['y'].tolist(),
+                                                            columns['lane'].tolist(),
+                                                            columns['velocity'].tolist()):
+                car = Car(x_pos, y_pos, lane, velocity)
+                cars.append(car)
+                if car_id == frame['closest_id']:
+                    closest_car = car
+
+            dirty = self.draw_road(frame['scroll'])
+            rects = [self.screen.blit(TEXT_CACHE.render(FONT_19, "Current Velocity:"
+                                                        f"{quantize(player.velocity, 0.1)}",
+                                                        BLACK), [0, 0]),
+                     self.screen.blit(TEXT_CACHE.render(FONT_19, f"Replay {index}/{last_frame}"
+                                                        f"  t={frame['time']:.1f}s", BLACK),
+                                      [0, 20])]
+            if frame['lane_change'] is not None:
+                rects.append(self.screen.blit(TEXT_CACHE.render(FONT_19, "Lane change: "
+                                                                f"{frame['lane_change']}",
+                                                                BLACK), [0, 40]))
+            rects += self.draw_cars(cars, player, closest_car)
+            self.update_display(dirty, rects)
+
+            if playing and index < last_frame:
+                index += 1
+
+            self.clock.tick(FRAME_RATE)
 
+        pygame.quit()
 
+    def interpolated_cars(self, sim):
+        '''
+        Method to get the main car and the cars the camera can see where they are
+        between the last two steps of the simulation, and move the camera to follow
+        the main car there
+        Input:
+            sim (Simulation obj) - The simulation to draw
+        Output:
+            A tuple of the main car, a list of the other cars, the car directly in front
+            of the main car (or None) as Car objs to draw, and the scroll of the road
+        '''
+        player = sim.player
+        traffic = sim.cars_on_road
+        rows = sim.visible_rows()
+        x_pos, y_pos, cars_y, scroll = sim.interpolate(rows)
+
+        drawn = Car(x_pos, y_pos, player.cur_lane, player.velocity)
+        drawn.image = player.image
+        self.camera.follow(drawn)
+
+        cars = []
+        closest_car = None
+        closest_row = None if sim.closest_car is None else sim.closest_car.row
+        for row, car_y in zip(rows.tolist(), cars_y.tolist()):
+            car = Car(float(traffic.x_pos[row]), car_y, int(traffic.lane[row]),
+                      float(traffic.velocity[row]))
+            cars.append(car)
+            if row == closest_row:
+                closest_car = car
+
+        # The car ahead can be further down the highway than the camera sees
+        if closest_car is None and closest_row is not None:
+            closest_car = traffic.view(closest_row)
+
+        return drawn, cars, closest_car, scroll
+
+    def draw_cars(self, cars, player, closest_car):
+        '''
+        Method to draw the main car, the other cars with their velocities and the
+        distance line to the car ahead, where the camera sees them
+        Input:
+            cars (iterable of Car objs) - The cars on the screen other than the main car
+            player (Car obj) - The main car
+            closest_car (Car obj) - The car directly in front of the main car, or None
+        Output:
+            A list of the rects of the screen that were drawn to
+        '''
+        top = self.camera.top
+        rects = []
+        for car in cars:
+            if car.image == "":
+                car.load_image("images/chevy_black.png")
 
-                # logic for smooth acceleration
-                if self.change:
-                    self.update = True
-                    self.change = False
-                    time_for_accel = utils.calculate_time(player.velocity, target_velocity)
-                    start_vel = player.velocity
-                    start_time = pygame.time.get_ticks()
+            rects.append(car.draw_image(self.screen, top))
+            label = TEXT_CACHE.render(FONT_19, f"{quantize(car.velocity, 1):g}", RED)
+            rects.append(self.screen.blit(label, [car.x_pos + 15, car.y_pos - top + 30]))
 
-                cur_time = pygame.time.get_ticks()
+        rects.append(player.draw_image(self.screen, top))
 
-                if self.update and utils.ms_to_sec(cur_time - start_time) < time_for_accel:
-                    player.velocity = round(utils.update_velocity(start_vel, target_velocity,
-                                                                  utils.ms_to_sec(cur_time - start_time)), 2)
-                elif self.update:
-                    player.velocity = float(target_velocity)
+        # The car ahead can be further down the highway than the screen reaches
+        if closest_car is not None and closest_car.y_pos + CAR_HEIGHT > top:
+            rects += self.draw_distance_line(closest_car, player)
 
-                # Spawn another car if needed
-                possible_car = utils.car_spwan(buttons['spawn'], cars_on_road, self.cars_on_screen)
-                if possible_car != None:
-                    possible_car.load_image("images/chevy_black.png")
-                    cars_on_road.add(possible_car)
-                    self.cars_on_screen += 1
-
-                # Change lanes if needed
-                if utils.lane_change(player, buttons, cars_on_road):
-                    self.flag = True
-
-                # Methods to draw info the the screen
-                self.draw_stripes(stripe_count, stripes, stripe_width, stripe_height,
-                                  player.velocity)
-                self.draw_background(velocity_input, text_velocity, player.velocity)
-                self.draw_buttons(buttons)
-                self.draw_lane_change_lines(player, BLACK, BLACK)
-
-                # draw the cars to the screen and get the set of cars in the same lane as
-                # the main car
-                for car in cars_on_road:
-                    # Check to get the closest car infront of the main car
-                    if car.check_out_of_screen():
-                        cars_on_road.remove(car)
-                        self.cars_on_screen -= 1
-                        break
-
-                    car.move_spawned_cars(player.velocity)
-                    car.draw_image(self.screen)
-                    self.screen.blit(FONT_19.render(f"{car.velocity}", True, RED), [car.x_pos + 15, car.y_pos + 30])
-
-                player.draw_image(self.screen)
-
-                if closest_car != None:
-                    self.draw_distance_line(closest_car, player)
-
-                pygame.display.flip()
+        return rects
 
-            else:
-                self.draw_start_menu(text_title, text_ins)
+    def draw_threats(self, sim):
+        '''
+        Method to draw a line between every pair of cars in the threat map with their
+        time to collision, red when it is under the blind spot braking time
+        Input:
+            sim (Simulation obj) - The simulation with the threat map to draw
+        Output:
+            A list of the rects of the screen that were drawn to
+        '''
+        threats = sim.threats
+        traffic = sim.cars_on_road
+        player = sim.player
+        rects = []
+
+        for pair in range(len(threats)):
+            ends = []
+            for row, top in ((threats.leader_row[pair], 60), (threats.follower_row[pair], 0)):
+                car = player if row < 0 else traffic.view(int(row))
+                ends.append((car.x_pos + 21, self.camera.to_screen(car.y_pos) + top))
+
+            ttc = threats.ttc[pair]
+            colour = RED if ttc <= sim.params.blind_spot_time else YELLOW
+            rects.append(pygame.draw.line(self.screen, colour, ends[0], ends[1], 2))
+            if math.isfinite(ttc):
+                label = TEXT_CACHE.render(FONT_19, f"{quantize(ttc, 0.1):g} s", colour)
+                rects.append(self.screen.blit(label, [(ends[0][0] + ends[1][0]) / 2 + 4,
+                                                      (ends[0][1] + ends[1][1]) / 2]))
+
+        return rects
+
+    def draw_profile(self):
+        '''
+        Method to draw the p50 and p99 time (in ms) of every part of the frame in the
+        bottom left corner. The numbers are only worked out again every 30 frames so
+        that they can be read
+        Input:
+            None
+        Output:
+            A list of the rects of the screen that were drawn to
+        '''
+        profiler = self.profiler
+        if not self.profile_lines or profiler.counts.get('frame', 0) % 30 == 0:
+            self.profile_lines = ["span               p50     p99"]
+            for name in profiler.buffers:
+                p50, p99 = profiler.percentiles(name)
+                self.profile_lines.append(f"{name[:16]:<16} {p50 * 1000:6.2f} {p99 * 1000:7.2f}")
+
+        rects = []
+        top = self.height - 20 * len(self.profile_lines) - 5
+        for row, line in enumerate(self.profile_lines):
+            text = TEXT_CACHE.render(PROFILE_FONT, line, BLACK)
+            rects.append(self.screen.blit(text, [2, top + 20 * row]))
+
+        return rects
+
+    @staticmethod
+    def update_lane_buttons(sim, buttons):
+        '''
+        Method to release the lane change buttons once the simulation is done with them
+        Input:
+            sim (Simulation obj) - The simulation that was just stepped
+            buttons (dict of button objs) - The left and right lane change buttons
+        Output:
+            None
+        '''
+        player = sim.player
+        highway = sim.highway
 
-            self.clock.tick(60)
+        # A lane change asked for by a script keeps its button pressed like a click does
+        for direction, name in ((0, 'left'), (1, 'right')):
+            if sim.lane_request == direction and not buttons[name].pressed:
+                buttons[name].pressed = True
+                buttons[name].colour = YELLOW
 
-        pygame.quit()
+        if sim.lane_request != 0 or player.x_pos == highway.lane_x(0):
+            buttons['left'].pressed = sim.lane_request == 0
+            buttons['left'].colour = GREY
+
+        if sim.lane_request != 1 or player.x_pos == highway.lane_x(highway.lanes - 1):
+            buttons['right'].pressed = sim.lane_request == 1
+            buttons['right'].colour = GREY
 
     def draw_start_menu(self, text_title, text_ins):
         '''
@@ -225,49 +487,102 @@ class Game:
         self.screen.blit(text_ins, [self.width / 2 - 85, self.height / 2 + 40])
         pygame.display.flip()
 
-    def draw_stripes(self, stripe_count, stripes, stripe_width, stripe_height, velocity):
+    def build_road(self):
         '''
-        Method to draw the stripes to the road
+        Method to draw the parts of the road that never change (the grass, the yellow
+        edge lines and the stripes) once to an off-screen surface. The surface is one
+        stripe taller than the screen so that the stripes can be scrolled by showing a
+        different part of it
         Input:
-            stripe_count (int) - The number of stripes to draw to the screen
-            stripes ([int, int]) - An array of the positions of the stripes on the screen
-            stripe_width (int) - The pixel width of the stripes
-            stripe_height (int) - The pixrl height of the stripes
-            velocity (double) - The velocity of the car
-        Output:
             None
+        Output:
+            The surface with the road drawn on it
         '''
+        road = pygame.Surface((self.width, self.height + STRIPE_PERIOD)).convert()
+        road.fill(GREY)
+
         # Drawing the stripes
-        for i in range(stripe_count):
-            pygame.draw.rect(self.screen, WHITE, [stripes[i][0], stripes[i][1],
-                                                  stripe_width, stripe_height])
-        # Move the stripes
-        for i in range(stripe_count):
-            # This accounts for speed at which the line moves
-            stripes[i][1] += velocity / 10
-            if stripes[i][1] > self.height:
-                stripes[i][1] = -30 - stripe_height
+        for stripe_y in range(-10, road.get_height(), STRIPE_PERIOD):
+            pygame.draw.rect(road, WHITE, [255, stripe_y, STRIPE_WIDTH, STRIPE_HEIGHT])
+            pygame.draw.rect(road, WHITE, [345, stripe_y, STRIPE_WIDTH, STRIPE_HEIGHT])
+
+        # Drawing the outer lines
+        pygame.draw.lines(road, YELLOW, False, [(165, 0), (165, road.get_height())], 5)
+        pygame.draw.lines(road, YELLOW, False, [(435, 0), (435, road.get_height())], 5)
+
+        # Drawing the 'grass'
+        pygame.draw.rect(road, GREEN, (0, 0, 163, road.get_height()), 0)
+        pygame.draw.rect(road, GREEN, (437, 0, 163, road.get_height()), 0)
+
+        return road
 
-    def draw_background(self, velocity_input, text_velocity, velocity):
+    def draw_road(self, scroll):
         '''
-        This is a method to draw the background to the current screen
+        Method to draw the road to the screen. Only the road between the grass is
+        drawn again when the stripes have moved, and only the areas that had something
+        drawn over them last frame are cleaned up
+        Input:
+            scroll (double) - The distance in pixels the main car has travelled, the
+                              stripes are shifted down by this amount
+        Output:
+            A list of the rects of the screen that were drawn to
         '''
-        # Drawing the outer lines to the screen
-        pygame.draw.lines(self.screen, YELLOW, False, [(165, 0), (165, 900)], 5)
-        pygame.draw.lines(self.screen, YELLOW, False, [(435, 0), (435, 900)], 5)
+        offset = scroll % STRIPE_PERIOD
+        shift = STRIPE_PERIOD - offset
+        screen_rect = self.screen.get_rect()
+
+        if self.road_offset is None:
+            dirty = [screen_rect]
+        else:
+            dirty = list(self.last_rects)
+            if offset != self.road_offset:
+                dirty.append(ROAD_RECT)
 
-        # Drawing the 'grass' to the screen
-        pygame.draw.rect(self.screen, GREEN, (0, 0, 163, 900), 0)
-        pygame.draw.rect(self.screen, GREEN, (437, 0, 163, 900), 0)
+        for rect in dirty:
+            self.screen.blit(self.background, rect.topleft, area=rect.move(0, shift))
+
+        self.road_offset = offset
+        return dirty
+
+    def update_display(self, dirty, rects):
+        '''
+        Method to push only the parts of the screen that changed to the display
+        Input:
+            dirty ([Rect]) - The parts of the road that were drawn again
+            rects ([Rect]) - The parts of the screen that were drawn over the road
+        Output:
+            None
+        '''
+        screen_rect = self.screen.get_rect()
+        self.last_rects = [rect.clip(screen_rect) for rect in rects]
+        self.last_rects = [rect for rect in self.last_rects if rect.width and rect.height]
+        pygame.display.update(dirty + self.last_rects)
+
+    def draw_background(self, velocity_input, text_velocity, velocity, time_scale=1):
+        '''
+        This is a method to draw the text and the input box over the background
+        Output:
+            A list of the rects of the screen that were drawn to
+        '''
+        rects = []
 
         # Handling the drawing the textbox to the screen
         velocity_input.update()
-        self.screen.blit(text_velocity, [445, 0])
-        velocity_input.draw(self.screen)
+        rects.append(self.screen.blit(text_velocity, [445, 0]))
+        rects.append(velocity_input.draw(self.screen))
 
         # Writing the current velocity to the screen
-        text_cur_velocity = FONT_19.render(f"Current Velocity:{velocity}", True, BLACK)
-        self.screen.blit(text_cur_velocity, [0, 0])
+        text_cur_velocity = TEXT_CACHE.render(FONT_19,
+                                              f"Current Velocity:{quantize(velocity, 0.1)}",
+                                              BLACK)
+        rects.append(self.screen.blit(text_cur_velocity, [0, 0]))
+
+        # Writing the time scale to the screen when running faster than real time
+        if time_scale != 1:
+            rects.append(self.screen.blit(TEXT_CACHE.render(FONT_19, f"Time scale: {time_scale}x",
+                                                            BLACK), [0, 20]))
+
+        return rects
 
     def draw_distance_line(self, front_car, player):
         '''
@@ -277,18 +592,21 @@ class Game:
             front_car (Car obj) - The car directly in front of the main car
             player (Car obj) - The main car that the cruise control algorithm is following
         Output:
-            None
+            A list of the rects of the screen that were drawn to
         '''
         # Drawing the distance line between cars
         y_diff = front_car.y_pos - player.y_pos
         x_diff = abs(front_car.x_pos - player.x_pos)
         distance = round(math.sqrt(y_diff ** 2 + x_diff ** 2) / 12, 2)
 
-        t_1 = (front_car.x_pos + 21, front_car.y_pos+ 60)
-        t_2 = (player.x_pos + 21, player.y_pos)
-        pygame.draw.line(self.screen, YELLOW, t_1, t_2)
-        self.screen.blit(FONT_19.render(f"      Distance: {distance} m", True, BLACK),
-                         [(t_1[0] + t_2[0])/2, (t_1[1] + t_2[1])/2])
+        t_1 = (front_car.x_pos + 21, self.camera.to_screen(front_car.y_pos) + 60)
+        t_2 = (player.x_pos + 21, self.camera.to_screen(player.y_pos))
+        line = pygame.draw.line(self.screen, YELLOW, t_1, t_2)
+        label = self.screen.blit(TEXT_CACHE.render(FONT_19,
+                                                   f"      Distance: {quantize(distance, 0.1)} m",
+                                                   BLACK),
+                                 [(t_1[0] + t_2[0])/2, (t_1[1] + t_2[1])/2])
+        return [line, label]
 
     def draw_buttons(self, buttons):
         '''
@@ -296,14 +614,18 @@ class Game:
         Input:
             buttons (dict of button objs) - Buttons to be drawn to the screen
         Output:
-            None
+            A list of the rects of the screen that were drawn to
         '''
         # Draw the text for the car spawn button and the lane change buttons
-        self.screen.blit(FONT_19.render("Click to spawn car:", True, BLACK), [0, 50])
-        self.screen.blit(FONT_19.render("Change lanes:", True, BLACK), [460, 115])
+        rects = [self.screen.blit(TEXT_CACHE.render(FONT_19, "Click to spawn car:", BLACK),
+                                  [0, 50]),
+                 self.screen.blit(TEXT_CACHE.render(FONT_19, "Change lanes:", BLACK),
+                                  [460, 115])]
 
         for button in buttons.values():
-            button.draw_button(self.screen)
+            rects.append(button.draw_button(self.screen))
+
+        return rects
 
     def draw_lane_change_lines(self, player, left_colour, right_colour):
         '''
@@ -314,26 +636,49 @@ class Game:
             left_colour (int, int, int) - The RGB colour for the left lane signals
             right_colour (int, int, int) - The RGB colour for the right lane signals
         Output:
-            None
+            A list of the rects of the screen that were drawn to
         '''
-        top_left_1 = (player.x_pos + 2, player.y_pos + 5)
-        top_left_2 = (player.x_pos - 20, player.y_pos - 60)
-        pygame.draw.line(self.screen, left_colour, top_left_1, top_left_2)
+        player_y = self.camera.to_screen(player.y_pos)
+        top_left_1 = (player.x_pos + 2, player_y + 5)
+        top_left_2 = (player.x_pos - 20, player_y - 60)
+        rects = [pygame.draw.line(self.screen, left_colour, top_left_1, top_left_2)]
 
-        bottom_left_1 = (player.x_pos + 3, player.y_pos + 56)
-        bottom_left_2 = (player.x_pos - 20, player.y_pos + 100)
-        pygame.draw.line(self.screen, left_colour, bottom_left_1, bottom_left_2)
+        bottom_left_1 = (player.x_pos + 3, player_y + 56)
+        bottom_left_2 = (player.x_pos - 20, player_y + 100)
+        rects.append(pygame.draw.line(self.screen, left_colour, bottom_left_1, bottom_left_2))
 
-        top_right_1 = (player.x_pos + 40, player.y_pos + 5)
-        top_right_2 = (player.x_pos + 62, player.y_pos - 60)
-        pygame.draw.line(self.screen, right_colour, top_right_1, top_right_2)
+        top_right_1 = (player.x_pos + 40, player_y + 5)
+        top_right_2 = (player.x_pos + 62, player_y - 60)
+        rects.append(pygame.draw.line(self.screen, right_colour, top_right_1, top_right_2))
 
-        bottom_right_1 = (player.x_pos + 40, player.y_pos + 56)
-        bottom_right_2 = (player.x_pos + 62, player.y_pos + 100)
-        pygame.draw.line(self.screen, right_colour, bottom_right_1, bottom_right_2)
+        bottom_right_1 = (player.x_pos + 40, player_y + 56)
+        bottom_right_2 = (player.x_pos + 62, player_y + 100)
+        rects.append(pygame.draw.line(self.screen, right_colour, bottom_right_1, bottom_right_2))
 
+        return rects
 
 
 if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description="EcoCAR DEV Challenge demo")
+    PARSER.add_argument('--record', help="Directory to record the run to")
+    PARSER.add_argument('--replay', help="Directory of a recording to play back")
+    PARSER.add_argument('--profile', help="File to write the frame timing histograms to")
+    PARSER.add_argument('--script', help="JSONL or CSV file of timed traffic events to play")
+    PARSER.add_argument('--telemetry', help="host:port or Unix socket path to stream the "
+                                            "state of every frame to")
+    PARSER.add_argument('--physics-rate', type=float, default=PHYSICS_RATE,
+                        help="Steps of the simulation and the cruise control a second")
+    PARSER.add_argument('--fps', type=float, default=RENDER_RATE,
+                        help="Frames drawn a second")
+    PARSER.add_argument('--font', help="Font file to draw the text with instead of the system "
+                                       "fonts, \"default\" for the font that comes with pygame")
+    ARGS = PARSER.parse_args()
+    if ARGS.font:
+        fonts.FONT_FILE = ARGS.font
+
     GAME = Game()
-    GAME.run()
+    if ARGS.replay:
+        GAME.replay(ARGS.replay)
+    else:
+        GAME.run(ARGS.record, ARGS.profile, ARGS.script, ARGS.telemetry, ARGS.physics_rate,
+                 ARGS.fps)
@@ -0,0 +1,407 @@
+'''
+This file contains the event driven mode of the headless simulation. On a sparse highway
+most steps do not change a single decision: every car keeps heading for the same
+velocity, so where it will be follows from the arithmetic of a step alone. Instead of
+running those steps one at a time the scheduler works a whole stretch of them out at
+once with numpy, doing the same arithmetic in the same order so every car ends up in
+exactly the same place, and checks every decision on the way (the velocity the cruise
+control of each car heads for, the order of the cars in each lane, the blind spot
+braking and adaptive cruise control of the main car, a car leaving the highway and the
+script coming due). The simulation jumps straight to the first step where one of them
+changes, the next event, and takes that step the normal way. While decisions change
+every step, such as while a car hovers at the edge of its following window or the main
+car changes lanes, the simulation is stepped at its physics rate instead
+'''
+
+import numpy as np
+import cruise_control
+import utils
+from car import Car, CAR_HEIGHT, FRAME_RATE, PIXELS_PER_METER
+
+# How many pixels a car moves in a second for every km/h of velocity
+PIXELS_PER_KMH = FRAME_RATE / 10
+
+# How many steps a jump looks ahead after a decision changed, every jump that makes it
+# all the way doubles it
+MIN_HORIZON = 32
+
+# The most steps times vehicles worked out by a single jump, so the arrays stay small
+MAX_CELLS = 1 << 18
+
+# A jump that gets fewer than MIN_HORIZON steps ahead is followed by this many steps at
+# the physics rate before the next jump, doubling every time it happens again in a row
+MAX_BACKOFF = 64
+
+class EventScheduler:
+    '''
+    This class runs a simulation by jumping from event to event. The rows of the
+    traffic store are the vehicles it looks at, with the main car after the last row
+    '''
+
+    def __init__(self, sim):
+        '''
+        Method to set up the scheduler of a simulation
+        Input:
+            sim (Simulation obj) - The simulation to run
+        '''
+        self.sim = sim
+
+        # How many steps the next jump looks ahead, and how many steps to take at the
+        # physics rate before it
+        self.horizon = MIN_HORIZON
+        self.backoff = 0
+        self.wait = 0
+
+        # The number of jumps made
+        self.jumps = 0
+
+    def link_leaders(self):
+        '''
+        Method to find the vehicle ahead of every vehicle in its lane, the same cars the
+        cruise control of the traffic and of the main car follow
+        Input:
+            None
+        Output:
+            An int array with the leader of every vehicle, -1 for none
+        '''
+        sim = self.sim
+        player = sim.player
+        count = sim.cars_on_road.count
+        index = sim.cars_on_road.sorted_index()
+
+        leader = np.full(count + 1, -1)
+        for lane in list(index.rows):
+            rows = index.lane_rows(lane)
+            leader[rows[1:]] = rows[:-1]
+            if lane == player.cur_lane:
+                keys = index.lane_keys(lane)
+                behind = np.searchsorted(keys, player.y_pos, side='right')
+                ahead = np.searchsorted(keys, player.y_pos, side='left')
+                if behind < len(rows):
+                    leader[rows[behind]] = count
+                if ahead > 0:
+                    leader[count] = rows[ahead - 1]
+
+        return leader
+
+    def player_path(self, steps):
+        '''
+        Method to work out the next steps of the main car, as long as its target
+        velocity does not change
+        Input:
+            steps (int) - How many steps to work out
+        Output:
+            A tuple of arrays with a value for now and after every step: the time, the
+            velocity and y position of the main car and the scroll of the road
+        '''
+        sim = self.sim
+        player = sim.player
+        time_step = sim.time_step
+
+        # Added up one step at a time the way the steps do, so the times and the
+        # positions come out the same
+        times = np.cumsum(np.append(sim.time, np.full(steps, time_step)))
+        velocity = np.full(steps + 1, float(sim.target_velocity) if sim.update
+                           else player.velocity)
+        velocity[0] = player.velocity
+        if sim.update:
+            ramping = np.flatnonzero(times[:-1] - sim.start_time < sim.time_for_accel)
+            velocity[ramping + 1] = [sim.ramped_velocity(time)
+                                     for time in times[ramping].tolist()]
+
+        moved = velocity[1:] * PIXELS_PER_KMH * time_step
+        y_pos = np.cumsum(np.append(player.y_pos, -moved))
+        scroll = np.cumsum(np.append(sim.scroll, moved))
+        return times, velocity, y_pos, scroll
+
+    def highway_path(self, player_y):
+        '''
+        Method to work out where the ends of the highway are after every step, it
+        moves with the main car the way Highway.follow moves it
+        Input:
+            player_y (array of double) - The y position of the main car now and after
+                                         every step
+        Output:
+            A tuple of three lists with the start, the end and whether the highway is
+            moving after every step
+        '''
+        highway = self.sim.highway
+        start, end, moving = highway.start, highway.end, highway.moving
+        starts, ends, movings = [], [], []
+        for y_pos in player_y[1:].tolist():
+            shift = end + highway.lead - y_pos
+            if shift > 0:
+                start -= shift
+                end -= shift
+                moving = True
+            starts.append(start)
+            ends.append(end)
+            movings.append(moving)
+
+        return starts, ends, movings
+
+    def traffic_path(self, steps, leader, player_y, player_vel):
+        '''
+        Method to work out the next steps of every other car, as long as each of them
+        keeps heading for the velocity it heads for now
+        Input:
+            steps (int) - How many steps to work out
+            leader (array of int) - The vehicle ahead of every vehicle, from link_leaders
+            player_y (array of double) - The y position of the main car now and after
+                                         every step
+            player_vel (array of double) - The velocity of the main car now and after
+                                           every step
+        Output:
+            A tuple of the velocities and y positions of the cars now and after every
+            step (a row for every step) and the velocities they head for
+        '''
+        sim = self.sim
+        params = sim.params
+        traffic = sim.cars_on_road
+        count = traffic.count
+
+        velocity = np.empty((steps + 1, count))
+        velocity[0] = traffic.velocity[:count]
+        y_pos = traffic.y_pos[:count]
+        target = velocity[0].copy()
+        if sim.traffic_follow_dist is not None and count:
+            # The velocity of the main car is updated before the traffic looks at it
+            leader_y, leader_vel = self.leading(leader, y_pos[None], velocity[:1],
+                                                player_y[:1], player_vel[1:2])
+            target = cruise_control.traffic_targets(velocity[0], traffic.cruise[:count], y_pos,
+                                                    leader_y[0], leader_vel[0],
+                                                    sim.traffic_follow_dist, params)
+            for step in range(steps):
+                velocity[step + 1] = utils.ramp_velocity(velocity[step], target, sim.time_step,
+                                                         params.accel, params.brake)
+                if np.array_equal(velocity[step + 1], velocity[step]):
+                    velocity[step + 1:] = velocity[step]
+                    break
+        else:
+            velocity[1:] = velocity[0]
+
+        moved = velocity[1:] / 10 * FRAME_RATE * sim.time_step
+        y_pos = np.cumsum(np.vstack((y_pos, -moved)), axis=0)
+        return velocity, y_pos, target
+
+    def leading(self, leader, y_pos, velocity, player_y, player_vel):
+        '''
+        Method to look up the y position and velocity of the vehicle ahead of every car
+        for many steps at once
+        Input:
+            leader (array of int) - The vehicle ahead of every vehicle, from link_leaders
+            y_pos (array of double) - The y positions of the cars, a row for every step
+            velocity (array of double) - The velocities of the cars, a row for every step
+            player_y (array of double) - The y position of the main car at every step
+            player_vel (array of double) - The velocity of the main car at every step
+        Output:
+            A tuple of two arrays with the y position and the velocity of the vehicle
+            ahead of every car at every step, both are nan for the cars with a clear
+            lane ahead
+        '''
+        ahead = leader[:-1]
+        every_y = np.column_stack((y_pos, player_y))[:, ahead]
+        every_vel = np.column_stack((velocity, player_vel))[:, ahead]
+        return np.where(ahead >= 0, every_y, np.nan), np.where(ahead >= 0, every_vel, np.nan)
+
+    # pylint: disable=R0913, R0914
+    def first_change(self, leader, player, traffic, road):
+        '''
+        Method to find the first of some steps where a decision is not the same as it
+        is now
+        Input:
+            leader (array of int) - The vehicle ahead of every vehicle, from link_leaders
+            player (tuple of arrays) - The path of the main car, from player_path
+            traffic (tuple of arrays) - The path of the other cars, from traffic_path
+            road (tuple of lists) - The ends of the highway, from highway_path
+        Output:
+            The number of steps before the first one with a change, all of them if
+            nothing changes
+        '''
+        sim = self.sim
+        count = sim.cars_on_road.count
+        times, player_vel, player_y, _ = player
+        velocity, y_pos, target = traffic
+        steps = len(times) - 1
+        changed = np.zeros(steps, dtype=bool)
+
+        # The script coming due
+        script = sim.script
+        if script is not None and script.pending is not None:
+            changed |= times[:-1] >= script.pending['time']
+
+        # The order of the cars in every lane, and the cars in the lane of the main car
+        # next to it, which are ahead of it for some of the checks and not for others
+        leader_y, leader_vel = self.leading(leader, y_pos[:-1], velocity[:-1],
+                                            player_y[:-1], player_vel[1:])
+        with np.errstate(invalid='ignore'):
+            changed |= np.any((leader[:-1] >= 0) & ~(leader_y < y_pos[:-1]), axis=1)
+        lane = sim.cars_on_road.lane[:count] == sim.player.cur_lane
+        changed |= np.any(lane & (y_pos[:-1] == player_y[:-1, None]), axis=1)
+
+        # The velocity every car heads for
+        if sim.traffic_follow_dist is not None and count:
+            targets = cruise_control.traffic_targets(velocity[:-1], sim.cars_on_road.cruise[:count],
+                                                     y_pos[:-1], leader_y, leader_vel,
+                                                     sim.traffic_follow_dist, sim.params)
+            changed |= np.any(targets != target, axis=1)
+
+        # A car driving off either end of the highway (see Highway.off_road)
+        starts, ends, _ = road
+        changed |= np.any((y_pos[1:] + CAR_HEIGHT > np.array(starts)[:, None]) |
+                          (y_pos[1:] < np.array(ends)[:, None]), axis=1)
+
+        # The braking of the main car
+        changed[self.braking_steps(leader[count], player, traffic)] = True
+
+        return int(np.argmax(changed)) if changed.any() else steps
+
+    def braking_steps(self, ahead, player, traffic):
+        '''
+        Method to find the first of some steps where the blind spot braking or the
+        adaptive cruise control of the main car slow it down
+        Input:
+            ahead (int) - The row of the car ahead of the main car, -1 for none
+            player (tuple of arrays) - The path of the main car, from player_path
+            traffic (tuple of arrays) - The path of the other cars, from traffic_path
+        Output:
+            A list with the step, empty if the main car never brakes
+        '''
+        sim = self.sim
+        params = sim.params
+        _, player_vel, player_y, _ = player
+        velocity, y_pos, _ = traffic
+        if ahead < 0:
+            return []
+
+        # Neither of them brakes unless the main car is faster than the car ahead, and
+        # only within a distance that is worked out with some room to spare here. The
+        # steps left are checked exactly the way check_braking checks them
+        vel, lead_vel = player_vel[:-1], velocity[:-1, ahead]
+        gap = player_y[:-1] - y_pos[:-1, ahead]
+        blind_spot = sim.flag & (2 * (gap / 12 - 0.01) <= params.blind_spot_time * (vel + lead_vel))
+        following = False
+        if sim.follow_dist is not None:
+            closing = utils.kmh_to_ms(vel - lead_vel)
+            window = params.follow_dist[sim.follow_dist] * closing / 2 * \
+                     (-closing / params.brake) * PIXELS_PER_METER
+            following = (sim.target_velocity > lead_vel) & (gap <= window * (1 + 1e-9) + 1e-9)
+
+        for step in np.flatnonzero((vel > lead_vel) & (blind_spot | following)).tolist():
+            if any(self.braking_checks(step, ahead, player, traffic)[1:]):
+                return [step]
+
+        return []
+
+    def braking_checks(self, step, ahead, player, traffic):
+        '''
+        Method to run Simulation.braking_checks at the start of one of the steps worked
+        out for a jump
+        Input:
+            step (int) - The step
+            ahead (int) - The row of the car ahead of the main car
+            player (tuple of arrays) - The path of the main car, from player_path
+            traffic (tuple of arrays) - The path of the other cars, from traffic_path
+        Output:
+            The tuple returned by Simulation.braking_checks
+        '''
+        sim = self.sim
+        cars = sim.cars_on_road
+        _, player_vel, player_y, _ = player
+        velocity, y_pos, _ = traffic
+        main = Car(sim.player.x_pos, float(player_y[step]), sim.player.cur_lane,
+                   float(player_vel[step]))
+        lead = Car(float(cars.x_pos[ahead]), float(y_pos[step, ahead]), int(cars.lane[ahead]),
+                   float(velocity[step, ahead]))
+        return sim.braking_checks(main, lead)
+
+    def jump(self, steps):
+        '''
+        Method to move the simulation forward by up to a number of steps at once,
+        stopping before the first step where a decision changes
+        Input:
+            steps (int) - The most steps to move forward
+        Output:
+            The number of steps moved forward
+        '''
+        sim = self.sim
+        traffic = sim.cars_on_road
+        player = sim.player
+        count = traffic.count
+
+        with sim.profiler.span('traffic_acc'):
+            leader = self.link_leaders()
+            player_path = self.player_path(steps)
+            _, player_vel, player_y, _ = player_path
+            traffic_path = self.traffic_path(steps, leader, player_y, player_vel)
+            road = self.highway_path(player_y)
+            skipped = self.first_change(leader, player_path, traffic_path, road)
+
+        if skipped == 0:
+            return 0
+
+        with sim.profiler.span('move_cars'):
+            times, _, _, scroll = player_path
+            velocity, y_pos, _ = traffic_path
+            traffic.velocity[:count] = velocity[skipped]
+            traffic.y_pos[:count] = y_pos[skipped]
+            traffic.index.dirty = True
+
+            # The distance to the car ahead is from the check at the start of the last
+            # step, before anything moved
+            sim.previous_x = player.x_pos
+            ahead = leader[count]
+            sim.distance = None if ahead < 0 else \
+                           self.braking_checks(skipped - 1, ahead, player_path, traffic_path)[0]
+
+            player.velocity = sim.ramped_velocity(times[skipped - 1])
+            player.y_pos = float(player_y[skipped])
+            sim.highway.start, sim.highway.end, sim.highway.moving = \
+                (part[skipped - 1] for part in road)
+            sim.camera.follow(player)
+            sim.closest_car = sim.find_closest_car()
+            sim.scroll = float(scroll[skipped])
+            sim.time = float(times[skipped])
+
+        # Every jump counts as a step of the simulation
+        sim.steps += 1
+        self.jumps += 1
+        return skipped
+
+    def run(self, duration):
+        '''
+        Method to run the simulation for an amount of simulated time by jumping from
+        event to event, it takes as many steps of the physics rate as Simulation.run.
+        Moving the main car into another lane is a couple of pixels every frame, so
+        while a lane change is requested or under way the simulation is stepped at its
+        physics rate instead, and so it is while decisions keep changing every few steps
+        Input:
+            duration (double) - The amount of simulated time in seconds
+        Output:
+            None
+        '''
+        sim = self.sim
+        steps = round(duration / sim.time_step)
+
+        while steps > 0:
+            if self.wait or sim.change or sim.lane_request is not None or \
+               sim.lane_change.active:
+                sim.step()
+                steps -= 1
+                self.wait = max(self.wait - 1, 0)
+                continue
+
+            horizon = min(steps, self.horizon, MAX_CELLS // (sim.cars_on_road.count + 1))
+            skipped = self.jump(horizon)
+            steps -= skipped
+            if skipped == horizon:
+                self.horizon *= 2
+                continue
+
+            # The next step changes a decision, it is taken the normal way
+            self.horizon = MIN_HORIZON
+            if skipped < MIN_HORIZON:
+                self.backoff = min(max(2 * self.backoff, 1), MAX_BACKOFF)
+            else:
+                self.backoff = 0
+            self.wait = 1 + self.backoff
@@ -0,0 +1,95 @@
+'''
+This file contains the fonts the demo draws its text with. Looking up a system font
+scans every font that is installed, so a font is only made the first time it is used,
+and all of the text can be drawn with a font file instead of the system fonts
+'''
+
+import os
+import pygame
+
+# A font file to draw all of the text with instead of looking up the system fonts,
+# "default" is the font that comes with pygame. Set with the ECOCAR_FONT environment
+# variable or the --font option of the demo
+FONT_FILE = os.environ.get('ECOCAR_FONT')
+
+# The fonts that have been made so far, keyed by their name, size and boldness. pygame
+# frees every font when it quits, so they are forgotten then
+FONTS = dict()
+
+def clear_fonts():
+    '''
+    Function to forget every font that has been made, pygame calls it when it quits
+    Input:
+        None
+    Output:
+        None
+    '''
+    FONTS.clear()
+
+def get_font(name, size, bold=False):
+    '''
+    Function to get a font, it is only made the first time it is asked for
+    Input:
+        name (str) - The name of the system font, or None for the font that comes with
+                     pygame
+        size (int) - The size of the font
+        bold (bool) - Whether the font is bold
+    Output:
+        The pygame Font obj
+    '''
+    # Fonts made before the font module was last shut down can not be drawn with
+    if not pygame.font.get_init():
+        clear_fonts()
+        pygame.font.init()
+
+    key = (name, size, bold)
+    font = FONTS.get(key)
+    if font is not None:
+        return font
+
+    # pygame only calls a quit function once, so it is registered again with the
+    # first font made after every quit
+    if not FONTS:
+        pygame.register_quit(clear_fonts)
+
+    if name is not None and FONT_FILE is None:
+        font = pygame.font.SysFont(name, size, bold)
+    else:
+        font = pygame.font.Font(None if name is None or FONT_FILE == 'default' else FONT_FILE,
+                                size)
+        font.set_bold(bold)
+
+    FONTS[key] = font
+    return font
+
+class LazyFont:
+    '''
+    This class stands in for a font that is only made the first time text is drawn
+    with it, so fonts can be defined when a module is imported without any of the
+    work of loading them
+    '''
+
+    def __init__(self, name, size, bold=False):
+        '''
+        Method to describe a font without making it
+        Input:
+            name (str) - The name of the system font, or None for the font that comes
+                         with pygame
+            size (int) - The size of the font
+            bold (bool) - Whether the font is bold
+        '''
+        self.name = name
+        self.size = size
+        self.bold = bold
+
+    def render(self, text, antialias, colour):
+        '''
+        Method to draw text with the font, the same as pygame.font.Font.render
+        Input:
+            text (str) - The text to draw
+            antialias (bool) - Whether to smooth the edges of the letters
+            colour ((int, int, int)) - The colour of the text
+        Output:
+            The surface with the text drawn on it
+        '''
+        return get_font(self.name, self.size, self.bold).render(text, antialias, colour)
@@ -0,0 +1,169 @@
+'''
+This file contains the highway the cars drive along, with the layout of its lanes, and
+the camera that follows the main car. Positions are in world coordinates, pixels along
+the highway with smaller y values further ahead (the same direction as on the screen),
+and the camera turns them into screen coordinates when they are drawn
+'''
+
+import math
+from car import CAR_HEIGHT, PIXELS_PER_METER, SCREEN_HEIGHT
+
+# Where on the screen the camera keeps the main car
+PLAYER_SCREEN_Y = 800
+
+# The x position of the cars in the leftmost lane and the distance between lanes
+FIRST_LANE_X = 180
+LANE_WIDTH = 100
+
+class Highway:
+    '''
+    This class describes a straight highway with any number of lanes, split into
+    segments of equal length. It starts at the bottom of the first view of the main
+    car and goes on ahead of it, and once the main car is half way along it the whole
+    highway moves forward with the main car so the road never runs out. Lanes are
+    numbered from 0 on the left
+    '''
+
+    # pylint: disable=R0913
+    def __init__(self, length=20000, segment_length=100, lanes=3, lane_width=LANE_WIDTH,
+                 first_lane_x=FIRST_LANE_X):
+        '''
+        Method to initialize a highway
+        Input:
+            length (double) - The length of the highway in meters
+            segment_length (double) - The length of every segment in meters
+            lanes (int) - The number of lanes
+            lane_width (int) - The distance in pixels between the cars of two lanes
+            first_lane_x (int) - The x position of the cars in the leftmost lane
+        '''
+        self.lanes = lanes
+        self.lane_width = lane_width
+        self.lane_positions = [first_lane_x + lane * lane_width for lane in range(lanes)]
+
+        self.length = length
+        self.segment_length = segment_length
+        self.segment_pixels = segment_length * PIXELS_PER_METER
+
+        # The world y positions of the start (behind) and the end (ahead) of the road
+        self.start = SCREEN_HEIGHT
+        self.end = SCREEN_HEIGHT - length * PIXELS_PER_METER
+
+        # How far (in pixels) the end of the road is kept ahead of the main car, and
+        # whether the road has started moving with it
+        self.lead = length * PIXELS_PER_METER / 2
+        self.moving = False
+
+    def has_lane(self, lane):
+        '''
+        Method to check if a lane is part of the highway
+        Input:
+            lane (int) - The number of the lane
+        Output:
+            A boolean value denoting if the lane exists
+        '''
+        return 0 <= lane < self.lanes
+
+    def lane_x(self, lane):
+        '''
+        Method to get the x position of the cars in a lane
+        Input:
+            lane (int) - The number of the lane
+        Output:
+            The x position in pixels
+        '''
+        return self.lane_positions[lane]
+
+    def in_lane(self, x_pos):
+        '''
+        Method to check if a car is lined up with a lane rather than between two lanes
+        Input:
+            x_pos (double) - The x position of the car
+        Output:
+            A boolean value denoting if the car is in a lane
+        '''
+        return x_pos in self.lane_positions
+
+    def segment(self, y_pos):
+        '''
+        Method to find the segment a position is in
+        Input:
+            y_pos (double) - The world y position
+        Output:
+            The number of the segment, numbers go down towards the end of the highway
+        '''
+        return math.floor(y_pos / self.segment_pixels)
+
+    def follow(self, y_pos):
+        '''
+        Method to move the highway forward with the main car, both ends move the same
+        distance so the length of the road stays the same
+        Input:
+            y_pos (double) - The world y position of the main car
+        Output:
+            None
+        '''
+        shift = self.end + self.lead - y_pos
+        if shift > 0:
+            self.start -= shift
+            self.end -= shift
+            self.moving = True
+
+    def off_road(self, y_pos):
+        '''
+        Method to see which cars have driven off either end of the highway, this works
+        on single positions as well as on numpy arrays of positions
+        Input:
+            y_pos (array of double) - The world y positions of the cars
+        Output:
+            An array of booleans denoting which cars are off the highway
+        '''
+        return (y_pos + CAR_HEIGHT > self.start) | (y_pos < self.end)
+
+class Camera:
+    '''
+    This class keeps the main car at the same place on the screen and turns world
+    positions into screen positions
+    '''
+
+    def __init__(self, screen_y=PLAYER_SCREEN_Y, height=SCREEN_HEIGHT):
+        '''
+        Method to initialize a camera
+        Input:
+            screen_y (double) - The screen y position the followed car is kept at
+            height (double) - The height of the screen in pixels
+        '''
+        self.screen_y = screen_y
+        self.height = height
+
+        # The world y position at the top of the screen
+        self.top = 0.0
+
+    def follow(self, car):
+        '''
+        Method to move the camera so that a car is at its place on the screen
+        Input:
+            car (Car obj) - The car to follow
+        Output:
+            None
+        '''
+        self.top = car.y_pos - self.screen_y
+
+    def to_screen(self, y_pos):
+        '''
+        Method to turn a world y position into a screen y position
+        Input:
+            y_pos (double) - The world y position
+        Output:
+            The y position on the screen
+        '''
+        return y_pos - self.top
+
+    def bounds(self):
+        '''
+        Method to get the part of the world the camera can see
+        Input:
+            None
+        Output:
+            A tuple of the world y positions at the top and the bottom of the screen
+        '''
+        return self.top, self.top + self.height
@@ -5,12 +5,11 @@ This file outlines the class that can be used to setup input boxes for our demo
 # pylint: disable= E1101, R0913, R1710
 
 import pygame
+from fonts import get_font
 
-pygame.init()
 YELLOW = pygame.Color("#fcdb38")
 GREY = pygame.Color("#D3D3D3")
 BLACK = (0, 0, 0)
-FONT = pygame.font.Font(None, 32)
 
 class InputBox:
     '''
@@ -21,7 +20,8 @@ class InputBox:
         self.box = pygame.Rect(x_pos, y_pos, width, height)
         self.colour = GREY
         self.text = text
-        self.text_surface = FONT.render(text, True, self.colour)
+        self.font = get_font(None, 32)
+        self.text_surface = self.font.render(text, True, self.colour)
         self.active = False
 
     def handle_event(self, event):
@@ -49,7 +49,7 @@ class InputBox:
                 else:
                     self.text += event.unicode
 
-                self.text_surface = FONT.render(self.text, True, BLACK)
+                self.text_surface = self.font.render(self.text, True, BLACK)
 
     def update(self):
         '''
@@ -67,7 +67,7 @@ class InputBox:
             screen (screen obj) - The screen that pygame is using for the main instance of
                                   the demo
         Output:
-            None
+            The rect of the screen that was drawn to
         '''
-        screen.blit(self.text_surface, (self.box.x+5, self.box.y+5))
-        pygame.draw.rect(screen, self.colour, self.box, 2)
+        text_rect = screen.blit(self.text_surface, (self.box.x+5, self.box.y+5))
+        return text_rect.union(pygame.draw.rect(screen, self.colour, self.box, 2))
@@ -0,0 +1,187 @@
+'''
+This file contains the per lane index of the cars on the road. For every lane it
+keeps the rows of the traffic store ordered by their y position so that the car
+ahead, the car behind and the cars near a position can be found with a binary search,
+and where each segment of the highway starts in that order so that the cars in a
+segment can be looked up directly
+'''
+
+import numpy as np
+
+class LaneIndex:
+    '''
+    This class keeps the cars of every lane sorted by y position (the top of the
+    screen first). It is kept up to date as cars are added, removed and moved rather
+    than being rebuilt for every query
+    '''
+
+    def __init__(self, segment_pixels):
+        '''
+        Method to initialize an index with no cars in it
+        Input:
+            segment_pixels (double) - The length in pixels of a highway segment
+        '''
+        # For every lane the rows of the cars in it and their y positions, both in
+        # the order of the y positions
+        self.rows = dict()
+        self.keys = dict()
+
+        # Set when the cars have moved and the keys need to be refreshed
+        self.dirty = False
+
+        # For every lane, the first and last place of every segment that has cars in
+        # it. Worked out when it is first needed after the cars have changed
+        self.segment_pixels = segment_pixels
+        self.segments = dict()
+
+    def lane_rows(self, lane):
+        '''
+        Method to get the rows of the cars in a lane, ordered by y position
+        Input:
+            lane (int) - The lane to get the cars of
+        Output:
+            An array of rows in the traffic store
+        '''
+        return self.rows.get(lane, np.zeros(0, dtype=np.int64))
+
+    def lane_keys(self, lane):
+        '''
+        Method to get the sorted y positions of the cars in a lane
+        Input:
+            lane (int) - The lane to get the positions of
+        Output:
+            An array of y positions
+        '''
+        return self.keys.get(lane, np.zeros(0))
+
+    def insert(self, rows, lanes, y_pos):
+        '''
+        Method to add new cars to the index
+        Input:
+            rows (array of int) - The rows of the new cars in the traffic store
+            lanes (array of int) - The lanes of the new cars
+            y_pos (array of double) - The y positions of the new cars
+        Output:
+            None
+        '''
+        for lane in np.unique(lanes).tolist():
+            in_lane = lanes == lane
+            new_keys = y_pos[in_lane]
+            order = np.argsort(new_keys, kind='stable')
+            new_keys = new_keys[order]
+            new_rows = rows[in_lane][order]
+
+            keys = self.lane_keys(lane)
+            places = np.searchsorted(keys, new_keys, side='right')
+            self.keys[lane] = np.insert(keys, places, new_keys)
+            self.rows[lane] = np.insert(self.lane_rows(lane), places, new_rows)
+            self.segments.pop(lane, None)
+
+    def remove(self, removed, remap):
+        '''
+        Method to take cars out of the index after they were removed from the traffic
+        store, and to follow the cars that were moved to a different row
+        Input:
+            removed (array of bool) - For every old row, True if that car was removed
+            remap (array of int) - For every old row, the row the car is now in
+        Output:
+            None
+        '''
+        for lane, rows in self.rows.items():
+            keep = ~removed[rows]
+            self.rows[lane] = remap[rows[keep]]
+            self.keys[lane] = self.keys[lane][keep]
+
+        self.segments.clear()
+
+    def change_lane(self, row, old_lane, new_lane, y_pos):
+        '''
+        Method to move a single car from one lane to another
+        Input:
+            row (int) - The row of the car in the traffic store
+            old_lane (int) - The lane the car was in
+            new_lane (int) - The lane the car is now in
+            y_pos (double) - The y position of the car
+        Output:
+            None
+        '''
+        rows = self.lane_rows(old_lane)
+        keep = rows != row
+        self.rows[old_lane] = rows[keep]
+        self.keys[old_lane] = self.lane_keys(old_lane)[keep]
+        self.segments.pop(old_lane, None)
+        self.insert(np.array([row]), np.array([new_lane]), np.array([float(y_pos)]))
+
+    def refresh(self, y_pos):
+        '''
+        Method to bring the index up to date after the cars have moved. Cars in the
+        same lane rarely pass each other so the order is usually still correct and
+        only the keys are copied, otherwise the nearly sorted lane is sorted again
+        Input:
+            y_pos (array of double) - The y position of every car in the traffic store
+        Output:
+            None
+        '''
+        for lane, rows in self.rows.items():
+            keys = y_pos[rows]
+            if len(keys) > 1 and np.any(keys[1:] < keys[:-1]):
+                order = np.argsort(keys, kind='stable')
+                keys = keys[order]
+                self.rows[lane] = rows[order]
+
+            self.keys[lane] = keys
+
+        self.segments.clear()
+        self.dirty = False
+
+    def leader(self, lane, y_pos):
+        '''
+        Method to find the closest car ahead of a position in a lane
+        Input:
+            lane (int) - The lane to look in
+            y_pos (double) - The y position to look ahead of
+        Output:
+            The row of the car ahead, or None if there is no car ahead
+        '''
+        place = np.searchsorted(self.lane_keys(lane), y_pos, side='left')
+        if place == 0:
+            return None
+
+        return int(self.rows[lane][place - 1])
+
+    def between(self, lane, lower, upper):
+        '''
+        Method to find all of the cars in a lane with lower <= y position < upper
+        Input:
+            lane (int) - The lane to look in
+            lower (double) - The smallest y position to include
+            upper (double) - The y position to stop at
+        Output:
+            An array of the rows of the cars in the range
+        '''
+        keys = self.lane_keys(lane)
+        start = np.searchsorted(keys, lower, side='left')
+        end = np.searchsorted(keys, upper, side='left')
+        return self.lane_rows(lane)[start:end]
+
+    def segment_rows(self, lane, segment):
+        '''
+        Method to find all of the cars in a lane that are in a segment of the highway,
+        the lookup itself does not depend on the number of cars
+        Input:
+            lane (int) - The lane to look in
+            segment (int) - The number of the segment (see Highway.segment)
+        Output:
+            An array of the rows of the cars in the segment, ordered by y position
+        '''
+        bounds = self.segments.get(lane)
+        if bounds is None:
+            # The keys are sorted so the cars of every segment are next to each other
+            numbers = np.floor(self.lane_keys(lane) / self.segment_pixels).astype(np.int64)
+            firsts = np.flatnonzero(np.diff(numbers, prepend=numbers[:1] - 1))
+            lasts = np.append(firsts[1:], len(numbers))
+            bounds = dict(zip(numbers[firsts].tolist(), zip(firsts.tolist(), lasts.tolist())))
+            self.segments[lane] = bounds
+
+        first, last = bounds.get(segment, (0, 0))
+        return self.lane_rows(lane)[first:last]
@@ -0,0 +1,323 @@
+'''
+This file contains the lane change planner of the main car. Instead of checking the
+target lane again every frame while the main car moves over, the whole move is checked
+once against where the cars in the target lane will be while it happens (each of them
+keeps its velocity until it is told otherwise). The plan is only checked again when one
+of the cars it depends on changes velocity or lane, or the main car changes velocity,
+and a lane change that is no longer safe part way through is aborted rather than
+carried on
+'''
+
+import numpy as np
+import cruise_control
+import utils
+from car import FRAME_RATE
+from events import PIXELS_PER_KMH
+
+# How fast (pixels per second) the main car moves towards the other lane, 2 pixels
+# every frame
+LANE_CHANGE_SPEED = 2 * FRAME_RATE
+
+# How far ahead (in seconds) to look for a safe time to start a lane change, a lane
+# that stays blocked for longer is planned again after this long
+PLAN_HORIZON = 5
+
+# The states of a lane change. Waiting for the whole move to be safe, moving over with
+# the rest of the move known to be safe, and moving back to the lane it started from
+WAITING = 'waiting'
+COMMITTED = 'committed'
+ABORTED = 'aborted'
+
+def blocked_starts(gap, closing, fast, duration, lengths):
+    '''
+    Function to work out when a lane change can not start because of each car in the
+    target lane. Every car blocks the move while it is within the lane change zone
+    around the main car, or while it is ahead within the sensor range and going too
+    much faster than the main car (the same rules as cruise_control.check_lane_change,
+    at every moment of the move)
+    Input:
+        gap (array of double) - The y position of every car relative to the main car
+        closing (array of double) - How fast (pixels per second) each gap grows
+        fast (array of bool) - Which cars are fast enough to block from ahead
+        duration (double) - How long in seconds the lane change takes
+        lengths (double) - The half length of the lane change zone in pixels
+    Output:
+        A tuple of two arrays, the first and last time (seconds from now) at which a
+        lane change starting then would meet each car. Cars that never block have
+        an empty range
+    '''
+    lower = np.where(fast, -cruise_control.SENSOR_RANGE, -lengths)
+    upper = np.full(len(gap), float(lengths))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reach_lower = (lower - gap) / closing
+        reach_upper = (upper - gap) / closing
+        first = np.minimum(reach_lower, reach_upper)
+        last = np.maximum(reach_lower, reach_upper)
+
+    # A car keeping the same distance blocks forever or never
+    still = closing == 0
+    inside = (lower <= gap) & (gap < upper)
+    first[still] = np.where(inside[still], -np.inf, np.inf)
+    last[still] = np.where(inside[still], np.inf, -np.inf)
+
+    return first - duration, last
+
+def earliest_start(first, last):
+    '''
+    Function to find the earliest time from now that is not in any of the ranges of
+    times a lane change can not start at
+    Input:
+        first (array of double) - The start of every blocked range
+        last (array of double) - The end of every blocked range
+    Output:
+        The earliest time in seconds (0 if the lane change can start now), inf if
+        it can never start
+    '''
+    blocking = last >= 0
+    first = first[blocking]
+    last = last[blocking]
+    if len(first) == 0:
+        return 0.0
+
+    # Going through the ranges in order of their start, the earliest free time is the
+    # end of everything before the first range that starts after it
+    order = np.argsort(first, kind='stable')
+    first = first[order]
+    reach = np.maximum.accumulate(last[order])
+    free = np.concatenate(([0.0], np.maximum(reach[:-1], 0.0)))
+    gaps = np.flatnonzero(first > free)
+    if len(gaps):
+        return float(free[gaps[0]])
+
+    return float(reach[-1])
+
+class LaneChangePlanner:
+    '''
+    This class plans and carries out the lane changes of the main car. It remembers
+    the cars in the target lane that can get in the way during the planning horizon,
+    and the velocities the plan assumed for them
+    '''
+
+    def __init__(self, cars_on_road, params=None):
+        '''
+        Method to initialize a planner with no lane change in progress
+        Input:
+            cars_on_road (Traffic obj) - All of the cars on the road
+            params (ControllerParams obj) - The controller settings, the defaults if None
+        '''
+        self.cars_on_road = cars_on_road
+        self.params = params or cruise_control.ControllerParams()
+
+        # None when there is no lane change, otherwise WAITING, COMMITTED or ABORTED
+        self.state = None
+        self.direction = None
+        self.origin_lane = None
+        self.target_lane = None
+
+        # When a waiting lane change is planned again (in simulated seconds)
+        self.replan_time = 0.0
+
+        # The views, rows and velocities of the cars the plan depends on, the views
+        # keep their rows up to date as other cars leave the road so the rows are only
+        # looked up again when a car was removed. Then the velocity of the main car the
+        # plan assumed and the version of the target lane it was made with
+        self.watched = []
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.watched_vel = np.zeros(0)
+        self.removed = 0
+        self.player_vel = None
+        self.version = None
+
+        # How many times the target lane was planned from scratch and checked again
+        self.plans = 0
+        self.revalidations = 0
+
+    @property
+    def active(self):
+        '''
+        True while a lane change is waiting to start or the main car is moving sideways
+        '''
+        return self.state is not None
+
+    def possible(self, player, direction):
+        '''
+        Method to check if the highway has a lane for the main car to change into
+        Input:
+            player (Car obj) - The main car
+            direction (int) - A 0 (for left) or 1 (for right) to indicate the direction
+        Output:
+            A boolean value denoting if there is a lane on that side of the main car
+        '''
+        return self.cars_on_road.highway.has_lane(player.cur_lane - 1 if direction == 0 else
+                                                  player.cur_lane + 1)
+
+    def duration(self, player):
+        '''
+        Method to work out how long the rest of the move into the target lane takes
+        Input:
+            player (Car obj) - The main car
+        Output:
+            The time in seconds
+        '''
+        target_x = self.cars_on_road.highway.lane_x(self.target_lane)
+        return abs(target_x - player.x_pos) / LANE_CHANGE_SPEED
+
+    def start_time(self, player, rows):
+        '''
+        Method to find when the rest of the lane change can start, going by where the
+        cars in the target lane will be when they keep their velocities
+        Input:
+            player (Car obj) - The main car
+            rows (array of int) - The rows of the cars to check against
+        Output:
+            A tuple of the time in seconds from now (inf if never) and the rows of the
+            cars the plan depends on
+        '''
+        traffic = self.cars_on_road
+        params = self.params
+        velocity = traffic.velocity[rows]
+        relative_vel = utils.kmh_to_ms(velocity) - utils.kmh_to_ms(player.velocity)
+
+        zone = params.lane_change_lengths * player.height
+        gap = traffic.y_pos[rows] - player.y_pos
+
+        first, last = blocked_starts(gap, (player.velocity - velocity) * PIXELS_PER_KMH,
+                                     relative_vel > params.lane_change_speed,
+                                     self.duration(player), zone)
+        # Any car nearby could get in the way by changing its velocity, the ones further
+        # away only matter if they are already closing in
+        nearby = np.abs(gap) <= cruise_control.SENSOR_RANGE + zone
+        soon = (last >= 0) & (first <= PLAN_HORIZON)
+        return earliest_start(first, last), rows[nearby | soon]
+
+    def plan(self, player, time, rows=None):
+        '''
+        Method to check the rest of the lane change and decide whether it goes ahead
+        Input:
+            player (Car obj) - The main car
+            time (double) - The current simulated time in seconds
+            rows (array of int) - The rows of the cars to check against, every car in
+                                  the target lane if None
+        Output:
+            None
+        '''
+        traffic = self.cars_on_road
+        if rows is None:
+            rows = traffic.sorted_index().lane_rows(self.target_lane)
+            self.version = traffic.lane_versions.get(self.target_lane)
+            self.plans += 1
+        else:
+            self.revalidations += 1
+
+        start, self.rows = self.start_time(player, rows)
+        self.watched = [traffic.view(row) for row in self.rows.tolist()]
+        self.watched_vel = traffic.velocity[self.rows]
+        self.removed = traffic.removed
+        self.player_vel = player.velocity
+
+        if start <= 0:
+            if self.state == WAITING:
+                self.state = COMMITTED
+        elif self.state == COMMITTED:
+            self.state = ABORTED
+        else:
+            self.replan_time = time + min(start, PLAN_HORIZON)
+
+    def changed(self, player):
+        '''
+        Method to check if anything the plan depends on is different to what it assumed
+        Input:
+            player (Car obj) - The main car
+        Output:
+            None if nothing changed, 'velocity' if only the velocities of the watched
+            cars changed, and 'traffic' if cars joined or left the target lane or the
+            main car changed velocity (which changes which cars can get in the way)
+        '''
+        traffic = self.cars_on_road
+        if traffic.lane_versions.get(self.target_lane) != self.version:
+            return 'traffic'
+
+        if traffic.removed != self.removed:
+            rows = [car.row for car in self.watched]
+            if None in rows:
+                return 'traffic'
+            self.rows = np.array(rows, dtype=np.int64)
+            self.removed = traffic.removed
+
+        if player.velocity != self.player_vel:
+            return 'traffic'
+
+        if np.any(traffic.velocity[self.rows] != self.watched_vel):
+            return 'velocity'
+
+        return None
+
+    def begin(self, player, direction, time):
+        '''
+        Method to start planning a lane change
+        Input:
+            player (Car obj) - The main car
+            direction (int) - A 0 (for left) or 1 (for right) to indicate the direction
+            time (double) - The current simulated time in seconds
+        Output:
+            None
+        '''
+        self.state = WAITING
+        self.direction = direction
+        self.origin_lane = player.cur_lane
+        self.target_lane = player.cur_lane - 1 if direction == 0 else player.cur_lane + 1
+        self.plan(player, time)
+
+    def step(self, player, direction, time, elapsed_time=1 / FRAME_RATE):
+        '''
+        Method to move the main car a step further through a lane change. A lane change
+        starts once the whole move is safe, and is aborted (the main car moves back to
+        the lane it started from) if it stops being safe or the request is taken back
+        part way through
+        Input:
+            player (Car obj) - The main car
+            direction (int) - The lane change that is requested, a 0 (for left), a 1
+                              (for right) or None
+            time (double) - The current simulated time in seconds
+            elapsed_time (double) - The time in seconds the main car moves for
+        Output:
+            A boolean value denoting whether or not a lane change has occured
+        '''
+        highway = self.cars_on_road.highway
+
+        if self.state is not None and direction != self.direction and self.state != ABORTED:
+            self.state = ABORTED if self.state == COMMITTED else None
+
+        if self.state is None:
+            if direction is None or not self.possible(player, direction):
+                return False
+            self.begin(player, direction, time)
+
+        if self.state != ABORTED:
+            change = self.changed(player)
+            if change == 'traffic':
+                self.plan(player, time)
+            elif change == 'velocity':
+                self.plan(player, time, self.rows)
+            elif self.state == WAITING and time >= self.replan_time:
+                self.plan(player, time)
+
+        if self.state == WAITING:
+            return False
+
+        lane = self.target_lane if self.state == COMMITTED else self.origin_lane
+        target_x = highway.lane_x(lane)
+        step = LANE_CHANGE_SPEED * elapsed_time
+        if target_x < player.x_pos:
+            step = -step
+        player.x_pos += step
+
+        if (target_x - player.x_pos) * step > 0:
+            return False
+
+        player.x_pos = target_x
+        finished = self.state == COMMITTED
+        player.cur_lane = lane
+        self.state = None
+        return finished
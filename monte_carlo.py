@@ -0,0 +1,261 @@
+'''
+This file contains the Monte Carlo runner that validates the cruise control logic
+statistically. It runs many randomized (but seeded) traffic episodes on the headless
+simulation across a pool of processes and reports how often the main car crashed,
+how close it got to the car ahead and how often it started braking
+'''
+
+import argparse
+import json
+import multiprocessing
+import time
+import numpy as np
+import cruise_control
+import utils
+from car import CAR_HEIGHT, PIXELS_PER_METER
+from lane_planner import COMMITTED
+from simulation import Simulation, TIME_STEP
+
+class Scenario:
+    '''
+    This class describes the randomized traffic that every episode is run with
+    '''
+
+    # pylint: disable=R0902, R0913
+    def __init__(self, duration=30, start_cars=3, spawn_interval=2.0, lanes=(0, 1, 2),
+                 spawn_y=(0, 600), velocity=(50, 100), player_velocity=(60, 100),
+                 lane_change_rate=0.1, follow_dist='mid', traffic_follow_dist='mid'):
+        '''
+        Method to initialize a scenario
+        Input:
+            duration (double) - The simulated time in seconds of every episode
+            start_cars (int) - The number of cars on the road when the episode starts
+            spawn_interval (double) - Seconds between new cars, 0 to never add more cars
+            lanes (tuple of int) - The lanes cars are spawned into
+            spawn_y ((int, int)) - The range of screen y positions cars are spawned at
+            velocity ((int, int)) - The range of velocities (km/h) of the spawned cars
+            player_velocity ((int, int)) - The range of velocities (km/h) the main car
+                                           is asked to drive at
+            lane_change_rate (double) - The average number of lane changes the main car
+                                        is asked to make every second
+            follow_dist (string) - The acc_scenario_1 following distance, or None
+            traffic_follow_dist (string) - The following distance of the other cars, or
+                                           None to keep them at a constant velocity
+        '''
+        self.duration = duration
+        self.start_cars = start_cars
+        self.spawn_interval = spawn_interval
+        self.lanes = lanes
+        self.spawn_y = spawn_y
+        self.velocity = velocity
+        self.player_velocity = player_velocity
+        self.lane_change_rate = lane_change_rate
+        self.follow_dist = follow_dist
+        self.traffic_follow_dist = traffic_follow_dist
+
+def spawn_car(sim, scenario):
+    '''
+    Function to put a car anywhere it does not overlap with any other car, using the
+    free stretches of each lane so that a crowded road never stalls the episode
+    Input:
+        sim (Simulation obj) - The simulation to add the car to
+        scenario (Scenario obj) - The scenario that describes where cars can go
+    Output:
+        A boolean value denoting if a car was added, False if the road was full
+    '''
+    try:
+        spawn_cars(sim, scenario, 1)
+    except ValueError:
+        return False
+
+    return True
+
+def spawn_cars(sim, scenario, n):
+    '''
+    Function to put many cars onto the road at once without any of them overlapping
+    Input:
+        sim (Simulation obj) - The simulation to add the cars to
+        scenario (Scenario obj) - The scenario that describes where cars can go
+        n (int) - The number of cars to add
+    Output:
+        An array of the ids given to the new cars
+    Raises:
+        ValueError if there is not enough room on the road for n more cars
+    '''
+    top = sim.camera.top
+    return sim.spawn_many(n, {lane: 1 for lane in scenario.lanes},
+                          (top + scenario.spawn_y[0], top + scenario.spawn_y[1]),
+                          scenario.velocity)
+
+def run_episode(seed, scenario, params=None):
+    '''
+    Function to run a single randomized episode
+    Input:
+        seed (int) - The seed for everything random in the episode
+        scenario (Scenario obj) - The scenario to run
+        params (ControllerParams obj) - The controller settings, the defaults if None
+    Output:
+        A dict with the results of the episode
+    Raises:
+        ValueError if the scenario's starting cars do not fit in its spawn area
+    '''
+    sim = Simulation(seed=seed, follow_dist=scenario.follow_dist, params=params,
+                     traffic_follow_dist=scenario.traffic_follow_dist)
+    player = sim.player
+    traffic = sim.cars_on_road
+
+    player.velocity = sim.random.randint(*scenario.player_velocity)
+    sim.set_target_velocity(player.velocity)
+    spawn_cars(sim, scenario, scenario.start_cars)
+
+    steps = round(scenario.duration / TIME_STEP)
+    spawn_every = round(scenario.spawn_interval / TIME_STEP)
+    lane_change_chance = scenario.lane_change_rate * TIME_STEP
+
+    collisions = 0
+    crashed_into = set()
+    min_headway = None
+
+    for step in range(1, steps + 1):
+        if spawn_every and step % spawn_every == 0:
+            spawn_car(sim, scenario)
+
+        if sim.lane_request is None and sim.random.random() < lane_change_chance:
+            sim.request_lane_change(sim.random.randint(0, 1))
+
+        sim.step()
+
+        # A lane change the planner could not start straight away is given up on, the
+        # next one is random again
+        if sim.lane_request is not None and sim.lane_change.state != COMMITTED:
+            sim.request_lane_change(None)
+
+        # Count every car the main car runs into (once per car)
+        hit = cruise_control.overlaps(player.x_pos, player.y_pos, traffic.x_pos[:traffic.count],
+                                      traffic.y_pos[:traffic.count])
+        new_hits = set(traffic.ids[:traffic.count][hit].tolist()) - crashed_into
+        collisions += len(new_hits)
+        crashed_into |= new_hits
+
+        # The time headway is the gap to the car ahead (in meters, at the scale the
+        # cars move at) divided by our speed. A car that overlaps or is being passed
+        # has no gap, those are counted as collisions above instead
+        lead = sim.closest_car
+        if lead is not None and player.velocity > 0:
+            gap = (player.y_pos - lead.y_pos - CAR_HEIGHT) / PIXELS_PER_METER
+            if gap > 0:
+                headway = gap / utils.kmh_to_ms(player.velocity)
+                min_headway = headway if min_headway is None else min(min_headway, headway)
+
+    return {'seed': seed,
+            'collisions': collisions,
+            'min_headway': min_headway,
+            'brake_events': sim.brake_events}
+
+def _run_chunk(args):
+    '''
+    Function that is run in the worker processes, it runs a chunk of episodes
+    Input:
+        args ((list of int, Scenario obj)) - The seeds to run and the scenario
+    Output:
+        A list of the results of every episode
+    '''
+    seeds, scenario = args
+    return [run_episode(seed, scenario) for seed in seeds]
+
+def summarize(results):
+    '''
+    Function to combine the results of many episodes
+    Input:
+        results (list of dict) - The results from run_episode
+    Output:
+        A dict with the aggregated statistics
+    '''
+    collisions = np.array([result['collisions'] for result in results])
+    brakes = np.array([result['brake_events'] for result in results])
+    finite = np.array([result['min_headway'] for result in results
+                       if result['min_headway'] is not None])
+
+    return {'episodes': len(results),
+            'collision_rate': float(np.mean(collisions > 0)) if len(results) else 0.0,
+            'collisions': int(collisions.sum()),
+            'min_headway': float(finite.min()) if len(finite) else None,
+            'min_headway_p5': float(np.percentile(finite, 5)) if len(finite) else None,
+            'brake_events': int(brakes.sum()),
+            'brake_events_per_episode': float(brakes.mean()) if len(results) else 0.0}
+
+def run_episodes(episodes, scenario=None, seed=0, workers=None, chunk_size=50):
+    '''
+    Function to run many episodes across a pool of processes
+    Input:
+        episodes (int) - The number of episodes to run
+        scenario (Scenario obj) - The scenario to run, the defaults are used if None
+        seed (int) - The seed of the first episode, episode i uses seed + i
+        workers (int) - The number of processes to use, defaults to the number of cores
+        chunk_size (int) - The number of episodes sent to a process at a time
+    Output:
+        A tuple of the summary dict and the list of the results of every episode
+    '''
+    scenario = scenario or Scenario()
+    seeds = list(range(seed, seed + episodes))
+    chunks = [(seeds[i:i + chunk_size], scenario) for i in range(0, episodes, chunk_size)]
+
+    results = []
+    if workers == 1:
+        for chunk in chunks:
+            results.extend(_run_chunk(chunk))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for chunk_results in pool.imap_unordered(_run_chunk, chunks):
+                results.extend(chunk_results)
+
+    results.sort(key=lambda result: result['seed'])
+    return summarize(results), results
+
+def main():
+    '''
+    Command line entry point for the Monte Carlo runner
+    '''
+    defaults = Scenario()
+    parser = argparse.ArgumentParser(description="Run randomized cruise control episodes")
+    parser.add_argument('--episodes', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=defaults.duration)
+    parser.add_argument('--start-cars', type=int, default=defaults.start_cars)
+    parser.add_argument('--spawn-interval', type=float, default=defaults.spawn_interval)
+    parser.add_argument('--lanes', type=int, nargs='+', default=list(defaults.lanes))
+    parser.add_argument('--spawn-y', type=int, nargs=2, default=list(defaults.spawn_y))
+    parser.add_argument('--velocity', type=int, nargs=2, default=list(defaults.velocity))
+    parser.add_argument('--player-velocity', type=int, nargs=2,
+                        default=list(defaults.player_velocity))
+    parser.add_argument('--lane-change-rate', type=float, default=defaults.lane_change_rate)
+    parser.add_argument('--follow-dist', choices=['short', 'mid', 'long', 'none'],
+                        default=defaults.follow_dist)
+    parser.add_argument('--traffic-follow-dist', choices=['short', 'mid', 'long', 'none'],
+                        default=defaults.traffic_follow_dist)
+    parser.add_argument('--output', help="File to write the results of every episode to")
+    args = parser.parse_args()
+
+    scenario = Scenario(duration=args.duration, start_cars=args.start_cars,
+                        spawn_interval=args.spawn_interval, lanes=tuple(args.lanes),
+                        spawn_y=tuple(args.spawn_y), velocity=tuple(args.velocity),
+                        player_velocity=tuple(args.player_velocity),
+                        lane_change_rate=args.lane_change_rate,
+                        follow_dist=None if args.follow_dist == 'none' else args.follow_dist,
+                        traffic_follow_dist=None if args.traffic_follow_dist == 'none'
+                        else args.traffic_follow_dist)
+
+    start = time.perf_counter()
+    summary, results = run_episodes(args.episodes, scenario, args.seed, args.workers,
+                                    args.chunk_size)
+    summary['wall_time'] = round(time.perf_counter() - start, 3)
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output)
+
+if __name__ == '__main__':
+    main()
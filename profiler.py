@@ -0,0 +1,153 @@
+'''
+This file contains the frame profiler. Named spans (event handling, the parts of a
+simulation step, each of the draw methods...) are timed and kept in fixed size ring
+buffers, so that the percentiles of the recent frames can be shown on screen and
+histograms of every phase can be written out at the end of a run
+'''
+
+import contextlib
+import json
+import time
+import numpy as np
+
+class FrameProfiler:
+    '''
+    This class collects the durations of named spans. Each name keeps only its most
+    recent samples in a ring buffer so memory use does not grow over a run
+    '''
+
+    def __init__(self, size=1024, enabled=True):
+        '''
+        Method to initialize an empty profiler
+        Input:
+            size (int) - The number of recent samples to keep for every span
+            enabled (bool) - Whether to time anything, a disabled profiler costs nothing
+        '''
+        self.size = size
+        self.enabled = enabled
+        self.buffers = dict()
+        self.counts = dict()
+        self.null_span = contextlib.nullcontext()
+
+    def record(self, name, duration):
+        '''
+        Method to add a sample to a span
+        Input:
+            name (str) - The name of the span
+            duration (double) - How long the span took in seconds
+        Output:
+            None
+        '''
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = np.zeros(self.size)
+            self.buffers[name] = buffer
+            self.counts[name] = 0
+
+        buffer[self.counts[name] % self.size] = duration
+        self.counts[name] += 1
+
+    def span(self, name):
+        '''
+        Method to time a block of code, used as "with profiler.span('name'):"
+        Input:
+            name (str) - The name of the span
+        Output:
+            A context manager that records the time spent inside it
+        '''
+        if not self.enabled:
+            return self.null_span
+
+        return _Span(self, name)
+
+    def samples(self, name):
+        '''
+        Method to get the samples that are currently kept for a span
+        Input:
+            name (str) - The name of the span
+        Output:
+            An array of durations in seconds
+        '''
+        return self.buffers[name][:min(self.counts[name], self.size)]
+
+    def percentiles(self, name, points=(50, 99)):
+        '''
+        Method to get percentiles of the recent samples of a span
+        Input:
+            name (str) - The name of the span
+            points (tuple of double) - The percentiles to get
+        Output:
+            A list with the durations in seconds at each of the percentiles
+        '''
+        return np.percentile(self.samples(name), points).tolist()
+
+    def histogram(self, name, bins=20):
+        '''
+        Method to get a histogram of the recent samples of a span
+        Input:
+            name (str) - The name of the span
+            bins (int) - The number of bins, they are spaced logarithmically so that both
+                         short and long spans are visible
+        Output:
+            A tuple of the bin edges (in seconds) and the number of samples in each bin
+        '''
+        samples = self.samples(name)
+        low = max(samples.min(), 1e-7)
+        high = max(samples.max(), low * 1.01)
+        counts, edges = np.histogram(samples, np.geomspace(low, high, bins + 1))
+        return edges.tolist(), counts.tolist()
+
+    def summary(self):
+        '''
+        Method to get the statistics of every span
+        Input:
+            None
+        Output:
+            A dict mapping each span name to its statistics and histogram
+        '''
+        spans = dict()
+        for name in self.buffers:
+            samples = self.samples(name)
+            p50, p90, p99 = self.percentiles(name, (50, 90, 99))
+            edges, counts = self.histogram(name)
+            spans[name] = {'calls': self.counts[name],
+                           'samples': len(samples),
+                           'mean': float(samples.mean()),
+                           'p50': p50,
+                           'p90': p90,
+                           'p99': p99,
+                           'max': float(samples.max()),
+                           'histogram': {'edges': edges, 'counts': counts}}
+
+        return spans
+
+    def dump(self, path):
+        '''
+        Method to write the statistics and histograms of every span to a JSON file
+        Input:
+            path (str) - The file to write to
+        Output:
+            None
+        '''
+        with open(path, 'w') as output:
+            json.dump(self.summary(), output, indent=2)
+
+class _Span:
+    '''
+    The context manager returned by FrameProfiler.span
+    '''
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
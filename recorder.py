@@ -0,0 +1,211 @@
+'''
+This file contains the trajectory recorder and the reader used to replay a run.
+A recording is a directory of flat binary column files, one value per frame for the
+main car and one value per car per frame for the other cars, so that any frame
+can be read straight out of a memory map without going through the ones before it
+'''
+
+import json
+import os
+import numpy as np
+from lane_planner import WAITING, COMMITTED, ABORTED
+
+# The columns with one value for every frame. Positions and velocities are kept as
+# float64, the world coordinates along a long highway are too large for float32 to hold
+# to a fraction of a pixel
+FRAME_COLUMNS = {
+    'time': np.float64,
+    'scroll': np.float64,
+    'start': np.int64,
+    'count': np.int64,
+    'player_x': np.float64,
+    'player_y': np.float64,
+    'player_velocity': np.float64,
+    'player_lane': np.int8,
+    'target_velocity': np.float64,
+    'lane_request': np.int8,
+    'lane_change': np.int8,
+    'closest_id': np.int64,
+}
+
+# The columns with one value for every car in every frame
+CAR_COLUMNS = {
+    'id': np.int64,
+    'x': np.float64,
+    'y': np.float64,
+    'velocity': np.float64,
+    'lane': np.int8,
+}
+
+# The lane change planner states in the order they are numbered in the lane_change column
+LANE_CHANGE_STATES = (None, WAITING, COMMITTED, ABORTED)
+
+class TrajectoryRecorder:
+    '''
+    This class writes the state of a simulation to a recording every frame. The
+    frames are kept in memory and appended to the files in batches so that
+    recording does not slow down the frames it is recording
+    '''
+
+    def __init__(self, path, batch_frames=120):
+        '''
+        Method to start a new recording
+        Input:
+            path (str) - The directory to write the recording to, it is created if it
+                         does not exist and any recording already in it is replaced
+            batch_frames (int) - How many frames to keep in memory before writing them
+        '''
+        self.path = path
+        self.batch_frames = batch_frames
+        self.frames = 0
+        self.cars = 0
+        os.makedirs(path, exist_ok=True)
+
+        self.files = dict()
+        for name in list(FRAME_COLUMNS) + ['car_' + name for name in CAR_COLUMNS]:
+            self.files[name] = open(os.path.join(path, name + '.bin'), 'wb')
+
+        self.frame_buffer = {name: [] for name in FRAME_COLUMNS}
+        self.car_buffer = {name: [] for name in CAR_COLUMNS}
+        self.write_meta()
+
+    def record(self, sim):
+        '''
+        Method to add the current state of a simulation to the recording
+        Input:
+            sim (Simulation obj) - The simulation to record
+        Output:
+            None
+        '''
+        traffic = sim.cars_on_road
+        player = sim.player
+        count = traffic.count
+        closest = sim.closest_car
+
+        frame = self.frame_buffer
+        frame['time'].append(sim.time)
+        frame['scroll'].append(sim.scroll)
+        frame['start'].append(self.cars)
+        frame['count'].append(count)
+        frame['player_x'].append(player.x_pos)
+        frame['player_y'].append(player.y_pos)
+        frame['player_velocity'].append(player.velocity)
+        frame['player_lane'].append(player.cur_lane)
+        frame['target_velocity'].append(sim.target_velocity)
+        frame['lane_request'].append(-1 if sim.lane_request is None else sim.lane_request)
+        frame['lane_change'].append(LANE_CHANGE_STATES.index(sim.lane_change.state))
+        frame['closest_id'].append(-1 if closest is None else closest.car_id)
+
+        cars = self.car_buffer
+        cars['id'].append(traffic.ids[:count].copy())
+        cars['x'].append(traffic.x_pos[:count].copy())
+        cars['y'].append(traffic.y_pos[:count].copy())
+        cars['velocity'].append(traffic.velocity[:count].copy())
+        cars['lane'].append(traffic.lane[:count].copy())
+
+        self.frames += 1
+        self.cars += count
+        if len(frame['time']) >= self.batch_frames:
+            self.flush()
+
+    def flush(self):
+        '''
+        Method to append all of the frames kept in memory to the files
+        Input:
+            None
+        Output:
+            None
+        '''
+        if not self.frame_buffer['time']:
+            return
+
+        for name, dtype in FRAME_COLUMNS.items():
+            np.asarray(self.frame_buffer[name], dtype=dtype).tofile(self.files[name])
+            self.frame_buffer[name] = []
+
+        for name, dtype in CAR_COLUMNS.items():
+            column = np.concatenate(self.car_buffer[name]).astype(dtype, copy=False)
+            column.tofile(self.files['car_' + name])
+            self.car_buffer[name] = []
+
+        for output in self.files.values():
+            output.flush()
+
+        self.write_meta()
+
+    def write_meta(self):
+        '''
+        Method to write the description of the recording next to the columns
+        '''
+        meta = {'frames': self.frames - len(self.frame_buffer['time']),
+                'frame_columns': {name: np.dtype(dtype).str
+                                  for name, dtype in FRAME_COLUMNS.items()},
+                'car_columns': {name: np.dtype(dtype).str
+                                for name, dtype in CAR_COLUMNS.items()}}
+        with open(os.path.join(self.path, 'meta.json'), 'w') as meta_file:
+            json.dump(meta, meta_file)
+
+    def close(self):
+        '''
+        Method to write out any frames still in memory and close the files
+        '''
+        self.flush()
+        for output in self.files.values():
+            output.close()
+
+class Trajectory:
+    '''
+    This class reads a recording through memory maps, so opening it is instant and
+    any frame can be read without reading the rest of the recording
+    '''
+
+    def __init__(self, path):
+        '''
+        Method to open a recording
+        Input:
+            path (str) - The directory the recording was written to
+        '''
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+
+        self.frames = meta['frames']
+        self.columns = dict()
+        for name, dtype in meta['frame_columns'].items():
+            self.columns[name] = self._map(os.path.join(path, name + '.bin'), dtype,
+                                           self.frames)
+
+        cars = 0
+        if self.frames:
+            cars = int(self.columns['start'][-1] + self.columns['count'][-1])
+        for name, dtype in meta['car_columns'].items():
+            self.columns['car_' + name] = self._map(os.path.join(path, 'car_' + name + '.bin'),
+                                                    dtype, cars)
+
+    @staticmethod
+    def _map(file_name, dtype, length):
+        '''
+        Method to memory map the first length values of a column file
+        '''
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+
+        return np.memmap(file_name, dtype=dtype, mode='r', shape=(length,))
+
+    def __len__(self):
+        return self.frames
+
+    def frame(self, index):
+        '''
+        Method to read a single frame of the recording
+        Input:
+            index (int) - The number of the frame
+        Output:
+            A dict with the values of the frame columns, and the arrays of the car
+            columns under 'cars'. The lane change state is given as the planner's state
+            (None, "waiting", "committed" or "aborted")
+        '''
+        frame = {name: self.columns[name][index].item() for name in FRAME_COLUMNS}
+        frame['lane_change'] = LANE_CHANGE_STATES[frame['lane_change']]
+        rows = slice(frame['start'], frame['start'] + frame['count'])
+        frame['cars'] = {name: self.columns['car_' + name][rows] for name in CAR_COLUMNS}
+        return frame
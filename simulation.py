@@ -0,0 +1,509 @@
+'''
+This file contains the headless simulation engine. It advances the main car, the
+spawned cars and the cruise control decisions without needing a pygame window,
+fonts or a frame cap, so that it can be run much faster than real time
+'''
+
+import math
+import random
+import numpy as np
+import cruise_control
+import utils
+from car import Car, CAR_HEIGHT, FRAME_RATE
+from events import EventScheduler, PIXELS_PER_KMH
+from highway import Camera, Highway, PLAYER_SCREEN_Y
+from lane_planner import LaneChangePlanner
+from profiler import FrameProfiler
+from traffic import Traffic
+
+# The fixed amount of simulated time in seconds that every step moves forward, unless
+# the simulation is given a different physics rate
+TIME_STEP = 1 / FRAME_RATE
+
+# The time scales (multiples of real time) the simulation can be run at
+TIME_SCALES = (1, 10, 1000)
+
+# The most steps a single call to advance will simulate. Without a limit a slow frame
+# makes the next one simulate even more steps, so at the fast time scales every frame
+# takes longer than the one before it
+MAX_STEPS_PER_ADVANCE = 1000
+
+class Simulation:
+    '''
+    The simulation holds all of the state for the cars on the road and moves it
+    forward in time one step at a time
+    '''
+
+    # pylint: disable=R0913
+    def __init__(self, seed=None, follow_dist=None, params=None, profiler=None,
+                 traffic_follow_dist='mid', highway=None, physics_rate=FRAME_RATE):
+        '''
+        Method to initialize the main car and an empty road
+        Input:
+            seed (int) - The seed for the random traffic, runs with the same seed and
+                         the same inputs replay identically
+            follow_dist (string) - "short", "mid" or "long" to have the main car follow
+                                   the car ahead with acc_scenario_1, or None to only
+                                   use the blind spot braking
+            params (ControllerParams obj) - The controller settings, the defaults if None
+            profiler (FrameProfiler obj) - Where to record how long each part of a step
+                                           takes, nothing is recorded if None
+            traffic_follow_dist (string) - "short", "mid" or "long" to have every other
+                                           car follow the car ahead of it, or None to
+                                           keep them at a constant velocity
+            highway (Highway obj) - The highway to drive on, the default one if None
+            physics_rate (double) - How many steps to simulate every second, the cruise
+                                    control makes its decisions every step
+        '''
+        # Everything is in world coordinates, the main car starts at the same place on
+        # the highway as it is on the screen and the camera follows it from there
+        self.highway = highway or Highway()
+        self.camera = Camera()
+        self.player = Car(280, PLAYER_SCREEN_Y, 1, 75)
+        self.cars_on_road = Traffic(highway=self.highway)
+        self.random = random.Random(seed)
+
+        # Simulated time in seconds since the simulation started, and the real time
+        # that has not been simulated yet
+        self.time = 0.0
+        self.steps = 0
+        self.time_step = 1 / physics_rate
+        self.accumulator = 0.0
+        self.time_scale = TIME_SCALES[0]
+
+        # How far (in pixels) the main car has travelled, used to scroll the road
+        self.scroll = 0.0
+
+        # Where the main car was sideways before the last step, to draw it in between
+        self.previous_x = self.player.x_pos
+
+        # State used for the smooth acceleration of the main car
+        self.target_velocity = self.player.velocity
+        self.change = False
+        self.update = False
+        self.start_vel = self.player.velocity
+        self.start_time = 0.0
+        self.time_for_accel = 0.0
+
+        # The blind spot braking is only allowed once per lane
+        self.flag = True
+        self.follow_dist = follow_dist
+        self.traffic_follow_dist = traffic_follow_dist
+        self.params = params or cruise_control.ControllerParams()
+        self.profiler = profiler or FrameProfiler(enabled=False)
+
+        # The number of times the main car has started braking
+        self.brake_events = 0
+
+        # None when no lane change was requested, otherwise 0 (left) or 1 (right)
+        self.lane_request = None
+        self.lane_change = LaneChangePlanner(self.cars_on_road, self.params)
+
+        self.closest_car = None
+        self.distance = None
+
+        # The TrafficScript obj that adds cars and changes velocities as time passes
+        self.script = None
+
+        # The EventScheduler obj used when running event driven, made on first use
+        self.events = None
+
+        # The last threat map that was worked out and the state of the road it is for
+        self._threats = None
+        self._threats_for = None
+
+    def set_target_velocity(self, velocity):
+        '''
+        Method to give the main car a new velocity to smoothly accelerate towards
+        Input:
+            velocity (double) - The new target velocity in km/h
+        Output:
+            None
+        '''
+        self.target_velocity = velocity
+        self.change = True
+
+    def request_lane_change(self, direction):
+        '''
+        Method to request (or cancel) a lane change of the main car
+        Input:
+            direction (int) - A 0 (for left) or 1 (for right), or None to cancel, a lane
+                              change that was cancelled part way through moves back
+                              to the lane it started from
+        Output:
+            None
+        '''
+        self.lane_request = direction
+
+    def spawn_car(self):
+        '''
+        Method to spawn a new car with a random speed onto the road
+        Input:
+            None
+        Output:
+            The Car obj that was added to the road, or None if the road is full
+        '''
+        new_car = utils.car_spwan(self.cars_on_road, self.cars_on_screen, self.random,
+                                  self.player, self.camera.top)
+        if new_car is None:
+            return None
+
+        return self.cars_on_road.add(new_car.x_pos, new_car.y_pos, new_car.cur_lane,
+                                     new_car.velocity)
+
+    def spawn_many(self, n, distribution=None, y_range=None, velocity=(50, 100)):
+        '''
+        Method to put many cars onto the road at once, anywhere they do not overlap
+        with another car or the main car
+        Input:
+            n (int) - The number of cars to add
+            distribution (dict) - The share of the cars each lane gets, as
+                                  {lane: weight}, all of the lanes get the same if None
+            y_range ((int, int)) - The smallest and largest world y position of a new
+                                   car, the part of the highway on the screen if None
+            velocity ((int, int)) - The range of velocities (km/h) of the new cars
+        Output:
+            An array of the ids given to the new cars
+        Raises:
+            ValueError if there is not enough room on the road for n more cars
+        '''
+        if y_range is None:
+            top, bottom = self.camera.bounds()
+            y_range = (math.ceil(top), math.floor(bottom) - CAR_HEIGHT)
+
+        rng = np.random.default_rng(self.random.getrandbits(64))
+        x_pos, y_pos, lanes, velocities = utils.spawn_many(n, self.cars_on_road, distribution,
+                                                           rng, y_range, velocity, self.player)
+        return self.add_cars(x_pos, y_pos, lanes, velocities)
+
+    def add_cars(self, x_pos, y_pos, lanes, velocities):
+        '''
+        Method to put many cars onto the road at once, there is no limit on how many
+        cars can be added this way
+        Input:
+            x_pos (array of int) - The x coordinates of the cars
+            y_pos (array of int) - The world y coordinates of the cars
+            lanes (array of int) - The lanes the cars are in
+            velocities (array of double) - The velocities of the cars in km/h
+        Output:
+            An array of the ids given to the new cars
+        '''
+        return self.cars_on_road.add_many(x_pos, y_pos, lanes, velocities)
+
+    def visible_rows(self):
+        '''
+        Method to find the cars the camera can see
+        Input:
+            None
+        Output:
+            An array of the rows of the cars that are at least partly on the screen
+        '''
+        top, bottom = self.camera.bounds()
+        return self.cars_on_road.rows_between(top - CAR_HEIGHT, bottom)
+
+    @property
+    def threats(self):
+        '''
+        The pairs of cars closing in on each other (see cruise_control.threat_map). They
+        are only worked out when they are asked for, and then kept until the simulation
+        moves on or cars are added or removed
+        '''
+        traffic = self.cars_on_road
+        state = (self.steps, traffic.next_id, traffic.removed)
+        if self._threats_for != state:
+            self._threats = cruise_control.threat_map(self.player, traffic,
+                                                      self.params.threat_horizon)
+            self._threats_for = state
+
+        return self._threats
+
+    @property
+    def cars_on_screen(self):
+        '''
+        The number of cars on the screen, including the main car
+        '''
+        return len(self.visible_rows()) + 1
+
+    def find_closest_car(self):
+        '''
+        Method to find the car directly in front of the main car in its lane
+        Input:
+            None
+        Output:
+            The closest Car obj, or None if there are no cars ahead in the lane
+        '''
+        return cruise_control.lead_car(self.player, self.cars_on_road)
+
+    def check_braking(self):
+        '''
+        Method to slow the main car down to the speed of the closest car when it is
+        about to reach it (blind spot braking), or when the adaptive cruise control
+        says it is following too closely
+        Input:
+            None
+        Output:
+            None
+        '''
+        closest_car = self.closest_car
+        self.distance = None
+        if closest_car is None:
+            return
+
+        self.distance, blind_spot, following = self.braking_checks(self.player, closest_car)
+        if blind_spot:
+            self.set_target_velocity(closest_car.velocity)
+            self.flag = False
+
+        # Adaptive cruise control, slow down to the speed of the car ahead
+        if following:
+            self.set_target_velocity(closest_car.velocity)
+
+    def braking_checks(self, player, closest_car):
+        '''
+        Method to run the blind spot and adaptive cruise control checks of the main car
+        against the car ahead of it, without acting on them
+        Input:
+            player (Car obj) - The main car
+            closest_car (Car obj) - The car directly ahead of the main car
+        Output:
+            A tuple of the distance to the car ahead in meters, whether the blind spot
+            braking starts and whether the adaptive cruise control slows the main car
+            down to the car ahead
+        '''
+        y_diff = closest_car.y_pos - player.y_pos
+        x_diff = abs(closest_car.x_pos - player.x_pos)
+        distance = round(math.sqrt(y_diff ** 2 + x_diff ** 2) / 12, 2)
+
+        bs_time = (2 * distance) / (player.velocity + closest_car.velocity)
+        blind_spot = bs_time <= self.params.blind_spot_time and self.flag and \
+                     player.velocity > closest_car.velocity
+
+        # The blind spot braking already slows the main car down to the car ahead
+        target_velocity = closest_car.velocity if blind_spot else self.target_velocity
+        following = self.follow_dist is not None and \
+                    target_velocity > closest_car.velocity and \
+                    cruise_control.acc_scenario_1(player, closest_car, self.follow_dist,
+                                                 self.params) > 0
+        return distance, blind_spot, following
+
+    def update_velocity(self):
+        '''
+        Method to move the velocity of the main car smoothly towards its target
+        Input:
+            None
+        Output:
+            None
+        '''
+        player = self.player
+        params = self.params
+
+        if self.change:
+            self.update = True
+            self.change = False
+            if self.target_velocity < player.velocity:
+                self.brake_events += 1
+            self.time_for_accel = utils.calculate_time(player.velocity, self.target_velocity,
+                                                       params.accel, params.brake)
+            self.start_vel = player.velocity
+            self.start_time = self.time
+
+        player.velocity = self.ramped_velocity(self.time)
+
+    def ramped_velocity(self, time):
+        '''
+        Method to work out the velocity of the main car at a time during the ramp to
+        its target velocity
+        Input:
+            time (double) - The simulated time in seconds
+        Output:
+            The velocity of the main car in km/h, its current velocity when it is not
+            ramping
+        '''
+        params = self.params
+        ramp_time = time - self.start_time
+
+        if self.update and ramp_time < self.time_for_accel:
+            return round(utils.update_velocity(self.start_vel, self.target_velocity,
+                                               ramp_time, params.accel, params.brake), 2)
+        if self.update:
+            return float(self.target_velocity)
+
+        return self.player.velocity
+
+    def traffic_targets(self):
+        '''
+        Method to work out the velocity every other car is heading for with the cruise
+        control (see cruise_control.traffic_targets), each car is checked against the
+        car ahead of it in its lane
+        Input:
+            None
+        Output:
+            An array with the velocity (km/h) every car is heading for, their current
+            velocity when the traffic does not run the cruise control
+        '''
+        traffic = self.cars_on_road
+        count = traffic.count
+        if self.traffic_follow_dist is None or count == 0:
+            return traffic.velocity[:count].copy()
+
+        leader_y, leader_vel = traffic.leaders(self.player)
+        return cruise_control.traffic_targets(traffic.velocity[:count], traffic.cruise[:count],
+                                              traffic.y_pos[:count], leader_y, leader_vel,
+                                              self.traffic_follow_dist, self.params)
+
+    def update_traffic_velocity(self, elapsed_time):
+        '''
+        Method to ramp the velocity of every other car towards the velocity its cruise
+        control is heading for
+        Input:
+            elapsed_time (double) - The amount of time in seconds to move forward
+        Output:
+            None
+        '''
+        traffic = self.cars_on_road
+        count = traffic.count
+        if self.traffic_follow_dist is None or count == 0:
+            return
+
+        traffic.velocity[:count] = utils.ramp_velocity(traffic.velocity[:count],
+                                                       self.traffic_targets(), elapsed_time,
+                                                       self.params.accel, self.params.brake)
+
+    def step(self, elapsed_time=None):
+        '''
+        Method to advance the simulation by a single step
+        Input:
+            elapsed_time (double) - The amount of time in seconds to move forward, the
+                                    time step of the physics rate if None
+        Output:
+            None
+        '''
+        player = self.player
+        profiler = self.profiler
+        if elapsed_time is None:
+            elapsed_time = self.time_step
+        self.previous_x = player.x_pos
+
+        if self.script is not None:
+            with profiler.span('script'):
+                self.script.apply(self)
+
+        with profiler.span('closest_car'):
+            self.closest_car = self.find_closest_car()
+
+        with profiler.span('blind_spot_braking'):
+            self.check_braking()
+
+        # logic for smooth acceleration
+        with profiler.span('velocity_update'):
+            self.update_velocity()
+
+        with profiler.span('traffic_acc'):
+            self.update_traffic_velocity(elapsed_time)
+
+        # Change lanes if needed
+        with profiler.span('lane_change'):
+            # A lane change into a lane the highway does not have can never happen, so
+            # the request is dropped instead of being kept waiting forever
+            if self.lane_request is not None and \
+               not self.lane_change.possible(player, self.lane_request):
+                self.lane_request = None
+
+            if (self.lane_request is not None or self.lane_change.active) and \
+               self.lane_change.step(player, self.lane_request, self.time, elapsed_time):
+                self.lane_request = None
+                self.flag = True
+
+        # Drive every car along the highway and remove the ones that left it, then look
+        # for the car ahead again now that everything has moved
+        with profiler.span('move_cars'):
+            player.y_pos -= player.velocity * PIXELS_PER_KMH * elapsed_time
+            self.cars_on_road.move(elapsed_time)
+            self.highway.follow(player.y_pos)
+            self.cars_on_road.cull()
+            self.camera.follow(player)
+            self.closest_car = self.find_closest_car()
+
+        self.scroll += player.velocity * PIXELS_PER_KMH * elapsed_time
+        self.time += elapsed_time
+        self.steps += 1
+
+    def advance(self, real_time):
+        '''
+        Method to advance the simulation by an amount of real (wall-clock) time. The
+        time is scaled by the time scale and then simulated in fixed steps, any time
+        left over is carried on to the next call. At most MAX_STEPS_PER_ADVANCE steps are
+        simulated, if there is more time than that the rest is dropped and the
+        simulation runs slower than the time scale asks for
+        Input:
+            real_time (double) - The real time in seconds that has passed
+        Output:
+            The number of steps that were simulated
+        '''
+        self.accumulator += real_time * self.time_scale
+        steps = int(self.accumulator / self.time_step)
+        if steps > MAX_STEPS_PER_ADVANCE:
+            steps = MAX_STEPS_PER_ADVANCE
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.time_step
+
+        for _ in range(steps):
+            self.step()
+
+        return steps
+
+    def set_time_scale(self, time_scale):
+        '''
+        Method to change how many times faster than real time the simulation runs
+        Input:
+            time_scale (int) - The new time scale (ie. 1, 10 or 1000)
+        Output:
+            None
+        '''
+        self.time_scale = time_scale
+
+    def run(self, duration, event_driven=False):
+        '''
+        Method to run the simulation for a given amount of simulated time, as fast as
+        possible
+        Input:
+            duration (double) - The amount of simulated time in seconds
+            event_driven (bool) - Whether to jump straight from one event to the next
+                                  (see events.py) instead of stepping at the physics
+                                  rate
+        Output:
+            None
+        '''
+        if event_driven:
+            if self.events is None:
+                self.events = EventScheduler(self)
+            self.events.run(duration)
+            return
+
+        for _ in range(round(duration / self.time_step)):
+            self.step()
+
+    def interpolate(self, rows):
+        '''
+        Method to work out where to draw the cars between the state before the last
+        step and the state after it, by how much of the next step the real time has
+        already reached. Every car moved at its current velocity during the last step
+        so its earlier position follows from that
+        Input:
+            rows (array of int) - The rows of the other cars to work out
+        Output:
+            A tuple of the x and y position of the main car, an array of the y
+            positions of the other cars and the scroll of the road
+        '''
+        player = self.player
+        traffic = self.cars_on_road
+        reached = min(self.accumulator / self.time_step, 1.0)
+
+        # How many pixels further back every km/h of velocity puts a car
+        behind = (1 - reached) * self.time_step * PIXELS_PER_KMH
+        x_pos = self.previous_x + reached * (player.x_pos - self.previous_x)
+        y_pos = traffic.y_pos[rows] + traffic.velocity[rows] * behind
+
+        return (x_pos, player.y_pos + player.velocity * behind, y_pos,
+                self.scroll - player.velocity * behind)
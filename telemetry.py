@@ -0,0 +1,255 @@
+'''
+This file contains the live telemetry stream. A server running its own asyncio loop on
+a background thread sends a snapshot of the simulation every frame to everyone that
+is connected, as one line of JSON per frame, over TCP or a Unix socket. Every
+subscriber has a small queue and the oldest snapshots are dropped when it falls
+behind, so a slow subscriber can never hold up the frame loop
+'''
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+
+def parse_address(address):
+    '''
+    Function to split an address into what the server or the client connects to
+    Input:
+        address (str) - "host:port" for TCP, anything else is the path of a Unix socket
+    Output:
+        A tuple of the host and port, or of None and the socket path
+    '''
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+
+    return None, address
+
+def snapshot(sim):
+    '''
+    Function to take a copy of everything the telemetry sends about a simulation
+    Input:
+        sim (Simulation obj) - The simulation to copy
+    Output:
+        A dict with the state of the main car and the positions of all of the cars
+    '''
+    player = sim.player
+    traffic = sim.cars_on_road
+    count = traffic.count
+    closest = sim.closest_car
+
+    return {'time': sim.time,
+            'step': sim.steps,
+            'velocity': player.velocity,
+            'target_velocity': sim.target_velocity,
+            'closest_id': None if closest is None else closest.car_id,
+            'distance': sim.distance,
+            'x': player.x_pos,
+            'y': player.y_pos,
+            'lane': player.cur_lane,
+            'lane_request': sim.lane_request,
+            'changing_lanes': not sim.highway.in_lane(player.x_pos),
+            'lane_change': sim.lane_change.state,
+            'cars': {'id': traffic.ids[:count].copy(),
+                     'x': traffic.x_pos[:count].copy(),
+                     'y': traffic.y_pos[:count].copy(),
+                     'velocity': traffic.velocity[:count].copy(),
+                     'lane': traffic.lane[:count].copy()}}
+
+def encode(state):
+    '''
+    Function to turn a snapshot into the line that is sent to the subscribers
+    Input:
+        state (dict) - A snapshot from the snapshot function
+    Output:
+        The bytes of the JSON line
+    '''
+    state = dict(state, cars={name: column.tolist() for name, column in state['cars'].items()})
+    return (json.dumps(state, separators=(',', ':')) + '\n').encode()
+
+class TelemetryServer:
+    '''
+    This class runs the telemetry server on a background thread. publish is the only
+    method the frame loop calls, it copies the state and hands it over to the server
+    thread without waiting on it
+    '''
+
+    def __init__(self, address='127.0.0.1:8765', queue_size=60):
+        '''
+        Method to set up (but not start) a telemetry server
+        Input:
+            address (str) - "host:port" to listen on TCP, or the path of a Unix socket
+            queue_size (int) - How many snapshots to keep for a subscriber that is
+                               behind before the oldest ones are dropped
+        '''
+        self.address = address
+        self.queue_size = queue_size
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+
+        # The exception the server thread failed to start with, if it did
+        self.error = None
+
+        # The queue of every connected subscriber, only used on the server thread
+        self.subscribers = set()
+
+        # The number of snapshots that were dropped because a subscriber was behind
+        self.dropped = 0
+
+    def start(self, timeout=5):
+        '''
+        Method to start the server thread, it returns once the server is listening
+        Input:
+            timeout (double) - How long in seconds to wait for the server to start
+        Output:
+            None
+        Raises:
+            OSError if the server could not listen on the address (ie. the port is
+            already in use), TimeoutError if it did not start in time
+        '''
+        self.thread = threading.Thread(target=self._serve, name='telemetry', daemon=True)
+        self.thread.start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError(f"The telemetry server did not start on {self.address} "
+                               f"within {timeout} seconds")
+
+        if self.error is not None:
+            self.thread.join()
+            raise self.error
+
+    def _serve(self):
+        '''
+        Method that runs the event loop of the server thread until stop is called. If
+        the server can not start, the exception is kept for start to raise
+        '''
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        host, port = parse_address(self.address)
+        try:
+            if host is None:
+                start = asyncio.start_unix_server(self._handle, path=port)
+            else:
+                start = asyncio.start_server(self._handle, host, port)
+            self.server = loop.run_until_complete(start)
+        except Exception as error: # pylint: disable=W0703
+            self.error = error
+            loop.close()
+            self.ready.set()
+            return
+
+        self.loop = loop
+        self.ready.set()
+
+        try:
+            loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.server.close()
+            loop.run_until_complete(self.server.wait_closed())
+            loop.close()
+
+    async def _handle(self, _reader, writer):
+        '''
+        Method that sends the snapshots to a single subscriber until it disconnects
+        '''
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        try:
+            while True:
+                writer.write(await queue.get())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.subscribers.discard(queue)
+            writer.close()
+
+    def _broadcast(self, state):
+        '''
+        Method run on the server thread to queue a snapshot for every subscriber,
+        dropping the oldest snapshot of any subscriber whose queue is full
+        '''
+        if not self.subscribers:
+            return
+
+        line = encode(state)
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(line)
+
+    def publish(self, sim):
+        '''
+        Method to send the current state of a simulation to every subscriber. Nothing
+        is copied when no one is connected
+        Input:
+            sim (Simulation obj) - The simulation to send the state of
+        Output:
+            None
+        '''
+        if self.loop is None or not self.subscribers:
+            return
+
+        self.loop.call_soon_threadsafe(self._broadcast, snapshot(sim))
+
+    def stop(self):
+        '''
+        Method to close the server and wait for its thread to finish
+        Input:
+            None
+        Output:
+            None
+        '''
+        if self.loop is None:
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop = None
+
+async def _follow(address, output):
+    '''
+    Coroutine that connects to a telemetry server and copies every line to output
+    '''
+    host, port = parse_address(address)
+    if host is None:
+        reader, _ = await asyncio.open_unix_connection(port)
+    else:
+        reader, _ = await asyncio.open_connection(host, port)
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        output.write(line.decode())
+        output.flush()
+
+def main():
+    '''
+    Command line entry point to log the telemetry of a running demo
+    '''
+    parser = argparse.ArgumentParser(description="Log the live telemetry of the demo")
+    parser.add_argument('address', nargs='?', default='127.0.0.1:8765',
+                        help="host:port or the path of a Unix socket")
+    parser.add_argument('--output', help="File to write the snapshots to, stdout if not given")
+    args = parser.parse_args()
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        asyncio.run(_follow(args.address, output))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.output:
+            output.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+'''
+The modules of the project live in the top level folder rather than in a package, so
+it is put on the path for the tests to import them from
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,40 @@
+'''
+Tests for finding every crash on the road at once
+'''
+
+import numpy as np
+import cruise_control
+from traffic import Traffic
+
+def brute_force(traffic):
+    '''
+    Function to check every pair of cars against each other
+    Input:
+        traffic (Traffic obj) - All of the cars on the road
+    Output:
+        A set of the (smaller id, larger id) pairs of every collision
+    '''
+    pairs = set()
+    for first in range(traffic.count):
+        for second in range(first + 1, traffic.count):
+            if cruise_control.check_collision(traffic.x_pos[first], traffic.y_pos[first],
+                                              traffic.x_pos[second], traffic.y_pos[second]):
+                pairs.add(tuple(sorted((int(traffic.ids[first]), int(traffic.ids[second])))))
+    return pairs
+
+def test_find_collisions_matches_brute_force():
+    '''
+    Every pair the sweep finds is a collision and no collision is missed, on roads
+    from empty to crowded
+    '''
+    rng = np.random.default_rng(0)
+    for count in (0, 1, 2, 50, 300):
+        traffic = Traffic()
+        lanes = rng.integers(0, 3, size=count)
+        # Some cars are part way between lanes so they can hit cars in both
+        x_pos = traffic.highway.lane_x(0) + 100 * lanes + rng.choice([0, 0, 50], size=count)
+        traffic.add_many(x_pos, rng.uniform(0, 3000, count), lanes, np.full(count, 80))
+
+        found = cruise_control.find_collisions(traffic)
+        assert len(found) == len(brute_force(traffic))
+        assert {tuple(pair) for pair in found.tolist()} == brute_force(traffic)
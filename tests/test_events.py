@@ -0,0 +1,91 @@
+'''
+Tests for the event driven mode against stepping at the frame rate
+'''
+
+import os
+import pytest
+from simulation import Simulation
+from traffic_script import TrafficScript
+
+# The platoon script that comes with the project
+PLATOON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'scenarios', 'platoon.jsonl')
+
+def sparse_run(seed, event_driven, traffic_follow_dist):
+    '''
+    Function to run a minute of sparse highway traffic
+    Input:
+        seed (int) - The seed for the placement of the cars
+        event_driven (bool) - Whether to run event driven or stepped
+        traffic_follow_dist (string) - The following distance of the other cars
+    Output:
+        The Simulation obj after the run
+    '''
+    sim = Simulation(seed=seed, follow_dist='mid', traffic_follow_dist=traffic_follow_dist)
+    sim.set_target_velocity(100)
+    sim.spawn_many(20, y_range=(-40000, 700), velocity=(60, 120))
+    sim.run(60, event_driven)
+    return sim
+
+def cars_by_id(sim):
+    '''
+    Function to get the y position and velocity of every car keyed by its id
+    '''
+    traffic = sim.cars_on_road
+    count = traffic.count
+    return dict(zip(traffic.ids[:count].tolist(),
+                    zip(traffic.y_pos[:count].tolist(), traffic.velocity[:count].tolist())))
+
+def assert_same_state(stepped, events):
+    '''
+    Function to check that two simulations ended up in the same state
+    '''
+    assert events.time == stepped.time
+    assert events.player.y_pos == pytest.approx(stepped.player.y_pos, abs=1e-6)
+    assert events.player.velocity == stepped.player.velocity
+    assert events.brake_events == stepped.brake_events
+    assert events.distance == stepped.distance
+
+    stepped_cars = cars_by_id(stepped)
+    event_cars = cars_by_id(events)
+    assert stepped_cars.keys() == event_cars.keys()
+    for car_id, (y_pos, velocity) in stepped_cars.items():
+        assert event_cars[car_id][0] == pytest.approx(y_pos, abs=1e-6)
+        assert event_cars[car_id][1] == velocity
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('traffic_follow_dist', [None, 'mid'])
+def test_events_follow_the_stepped_trajectory(seed, traffic_follow_dist):
+    '''
+    Both modes make the same decisions at the same steps, so they end with the same
+    cars in the same places. Traffic that keeps its velocity needs only a few jumps,
+    traffic that hovers at the edge of its following window is stepped
+    '''
+    stepped = sparse_run(seed, False, traffic_follow_dist)
+    events = sparse_run(seed, True, traffic_follow_dist)
+    assert_same_state(stepped, events)
+    if traffic_follow_dist is None:
+        assert events.steps < stepped.steps / 20
+
+def scripted_run(event_driven):
+    '''
+    Function to run the platoon script while the main car is asked to change lanes
+    and to change its velocity
+    '''
+    sim = Simulation(seed=0, follow_dist='mid')
+    sim.script = TrafficScript(PLATOON)
+    for second in range(30):
+        if second % 7 == 3:
+            sim.request_lane_change(second % 2)
+        if second % 11 == 5:
+            sim.set_target_velocity(80 + second)
+        sim.run(1, event_driven)
+
+    return sim
+
+def test_events_follow_a_script_and_lane_changes():
+    '''
+    Script events, lane changes and new target velocities in the middle of a run all
+    happen at the same step in both modes
+    '''
+    assert_same_state(scripted_run(False), scripted_run(True))
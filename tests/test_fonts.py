@@ -0,0 +1,24 @@
+'''
+Tests for the cache of the fonts the demo draws its text with
+'''
+
+import pygame
+from fonts import get_font
+
+def test_fonts_are_made_again_after_pygame_quits():
+    '''
+    A font from before pygame quit is never handed out again, so a second demo or a
+    replay in the same process draws with a font that still works
+    '''
+    first = get_font(None, 20)
+    assert get_font(None, 20) is first
+
+    for restart in (pygame.init, lambda: None):
+        pygame.quit()
+        restart()
+        font = get_font(None, 20)
+        assert font is not first
+        assert font.render("Speed", True, (0, 0, 0)).get_width() > 0
+        first = font
+
+    pygame.quit()
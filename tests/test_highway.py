@@ -0,0 +1,26 @@
+'''
+Tests for the highway the cars drive along
+'''
+
+from highway import Highway
+from simulation import Simulation
+
+def test_highway_moves_with_the_main_car():
+    '''
+    The road keeps going ahead of the main car long after it would have reached the
+    end of a highway that stays put, so the cars driving with it are never removed
+    '''
+    for event_driven in (False, True):
+        sim = Simulation(seed=0, highway=Highway(length=500), traffic_follow_dist=None)
+        sim.add_cars([180, 380], [500, -2000], [0, 2], [75, 75])
+        sim.run(120, event_driven=event_driven)
+
+        highway = sim.highway
+        assert highway.moving
+        assert highway.end < sim.player.y_pos < highway.start
+        assert sim.cars_on_road.count == 2
+
+        # A car that is left far behind falls off the start of the road
+        sim.add_cars([180], [sim.player.y_pos], [0], [0])
+        sim.run(60, event_driven=event_driven)
+        assert sim.cars_on_road.count == 2
@@ -0,0 +1,51 @@
+'''
+Tests for checking lane changes from many states of the main car at once
+'''
+
+import numpy as np
+import pytest
+import cruise_control
+from car import Car
+from highway import Highway
+from simulation import Simulation
+
+@pytest.mark.parametrize('lanes', [3, 6])
+@pytest.mark.parametrize('cars', [3, 40, 2000])
+@pytest.mark.parametrize('lengths', [3, 20])
+def test_mask_matches_check_lane_change(lanes, cars, lengths):
+    '''
+    Every state gets the same answer from the mask as from check_lane_change, in
+    sparse and dense traffic and with lane change zones wider than the sensor range
+    '''
+    sim = Simulation(seed=cars + lanes, highway=Highway(lanes=lanes))
+    sim.spawn_many(cars, y_range=(-cars * 140 // lanes, 840), velocity=(40, 140))
+    traffic = sim.cars_on_road
+    params = cruise_control.ControllerParams(lane_change_lengths=lengths)
+
+    rng = np.random.default_rng(lanes * cars)
+    states = 2000
+    direction = rng.integers(0, 2, states)
+    lane = rng.integers(0, lanes, states)
+    y_pos = rng.uniform(traffic.y_pos[:traffic.count].min() - 1000, 1800, states)
+    velocity = rng.uniform(0, 160, states)
+
+    mask = cruise_control.lane_change_mask(direction, lane, y_pos, velocity, traffic, params)
+    expected = [cruise_control.check_lane_change(
+        int(direction[state]), Car(sim.highway.lane_x(int(lane[state])), float(y_pos[state]),
+                                   int(lane[state]), float(velocity[state])), traffic, params)
+                for state in range(states)]
+    assert mask.tolist() == expected
+
+def test_mask_sees_cars_behind_a_long_zone():
+    '''
+    A car behind the main car that is inside a lane change zone longer than the
+    sensor range blocks the lane change in the mask as well
+    '''
+    sim = Simulation()
+    sim.add_cars([180], [1400.0], [0], [60.0])
+    params = cruise_control.ControllerParams(lane_change_lengths=20)
+    player = Car(380, 500, 2)
+
+    expected = cruise_control.check_lane_change(0, player, sim.cars_on_road, params)
+    mask = cruise_control.lane_change_mask(0, 2, 500, player.velocity, sim.cars_on_road, params)
+    assert bool(mask) == expected
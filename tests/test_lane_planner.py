@@ -0,0 +1,125 @@
+'''
+Tests for the lane change planner of the main car
+'''
+
+from lane_planner import ABORTED, COMMITTED, WAITING, LANE_CHANGE_SPEED
+from simulation import Simulation
+
+def lane_change_sim(velocity=75):
+    '''
+    Function to make a simulation with the main car in the middle lane, far enough
+    along the highway that there can be cars behind it, and the other cars keeping
+    their velocities
+    Input:
+        velocity (double) - The velocity of the main car in km/h
+    Output:
+        The Simulation obj
+    '''
+    sim = Simulation(seed=0, traffic_follow_dist=None)
+    sim.player.y_pos = -5000
+    sim.player.velocity = velocity
+    sim.target_velocity = velocity
+    return sim
+
+def test_lane_change_into_an_empty_lane():
+    '''
+    A lane change into an empty lane is committed straight away and takes the width
+    of a lane at the lane change speed
+    '''
+    sim = lane_change_sim()
+    sim.request_lane_change(0)
+    sim.step()
+    assert sim.lane_change.state == COMMITTED
+
+    sim.run(100 / LANE_CHANGE_SPEED)
+    assert sim.player.cur_lane == 0
+    assert sim.player.x_pos == sim.highway.lane_x(0)
+    assert not sim.lane_change.active
+    assert sim.lane_request is None
+
+def test_lane_change_waits_for_a_car_alongside():
+    '''
+    The main car does not move while a car alongside it blocks the target lane, and
+    goes once the car is gone
+    '''
+    sim = lane_change_sim()
+    beside = sim.cars_on_road.add(180, -5000, 0, 75)
+    sim.request_lane_change(0)
+    sim.run(2)
+    assert sim.lane_change.state == WAITING
+    assert sim.player.x_pos == sim.highway.lane_x(1)
+
+    sim.cars_on_road.remove(beside)
+    sim.run(1)
+    assert sim.player.cur_lane == 0
+
+def test_lane_change_aborts_when_a_car_moves_in():
+    '''
+    A car cutting into the target lane part way through sends the main car back to
+    the lane it started from
+    '''
+    sim = lane_change_sim()
+    sim.request_lane_change(0)
+    sim.run(0.2)
+    assert sim.lane_change.state == COMMITTED
+
+    sim.cars_on_road.add(180, sim.player.y_pos - 30, 0, 75)
+    sim.step()
+    assert sim.lane_change.state == ABORTED
+
+    # The request still stands, so the main car waits for the lane to clear again
+    sim.run(1)
+    assert sim.player.cur_lane == 1
+    assert sim.player.x_pos == sim.highway.lane_x(1)
+    assert sim.lane_change.state == WAITING
+
+def test_cancelled_lane_change_moves_back():
+    '''
+    Taking the request back part way through aborts the lane change
+    '''
+    sim = lane_change_sim()
+    sim.request_lane_change(1)
+    sim.run(0.3)
+    sim.request_lane_change(None)
+    sim.step()
+    assert sim.lane_change.state == ABORTED
+
+    sim.run(1)
+    assert sim.player.cur_lane == 1
+    assert sim.player.x_pos == sim.highway.lane_x(1)
+
+def test_lane_change_off_the_road_is_dropped():
+    '''
+    A lane change towards a lane the highway does not have is dropped straight away,
+    so the event driven mode keeps jumping instead of stepping for the rest of the run
+    '''
+    sim = lane_change_sim()
+    sim.player.cur_lane = 2
+    sim.player.x_pos = sim.highway.lane_x(2)
+    sim.request_lane_change(1)
+    sim.run(60, event_driven=True)
+    assert sim.lane_request is None
+    assert not sim.lane_change.active
+    assert sim.player.cur_lane == 2
+    assert sim.steps < 60
+
+def test_main_car_slowing_down_checks_every_car_again():
+    '''
+    A car too far behind to matter at the speed the lane change was planned with
+    gets in the way once the main car slows right down, even though the plan did not
+    watch it
+    '''
+    sim = lane_change_sim(200)
+    sim.cars_on_road.add(180, sim.player.y_pos + 1000, 0, 200)
+    sim.request_lane_change(0)
+    sim.step()
+    assert sim.lane_change.state == COMMITTED
+
+    # One step in, the main car is back in its lane straight away
+    sim.player.velocity = 0
+    sim.target_velocity = 0
+    sim.step()
+    assert sim.player.x_pos == sim.highway.lane_x(1)
+
+    sim.step()
+    assert sim.lane_change.state == WAITING
@@ -0,0 +1,30 @@
+'''
+Tests for recording a run and reading it back
+'''
+
+from lane_planner import COMMITTED
+from recorder import Trajectory, TrajectoryRecorder
+from simulation import Simulation
+
+def test_recording_keeps_positions_far_along_the_highway(tmp_path):
+    '''
+    Positions far along the highway are read back exactly, along with the lane change
+    state of the main car
+    '''
+    sim = Simulation(seed=0, traffic_follow_dist=None)
+    sim.player.y_pos = -150000.123
+    sim.add_cars([180, 380], [-150400.456, -149600.789], [0, 2], [70.25, 80.5])
+    sim.request_lane_change(0)
+
+    recorder = TrajectoryRecorder(str(tmp_path), batch_frames=4)
+    for _ in range(10):
+        sim.step()
+        recorder.record(sim)
+    recorder.close()
+
+    frame = Trajectory(str(tmp_path)).frame(9)
+    assert frame['player_x'] == sim.player.x_pos
+    assert frame['player_y'] == sim.player.y_pos
+    assert frame['lane_change'] == COMMITTED
+    assert frame['cars']['y'].tolist() == sim.cars_on_road.y_pos[:2].tolist()
+    assert frame['cars']['velocity'].tolist() == sim.cars_on_road.velocity[:2].tolist()
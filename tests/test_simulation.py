@@ -0,0 +1,26 @@
+'''
+Tests for advancing the simulation by real time
+'''
+
+from simulation import Simulation, MAX_STEPS_PER_ADVANCE
+
+def test_advance_carries_the_left_over_time():
+    '''
+    Time that does not make up a whole step is simulated on a later call
+    '''
+    sim = Simulation(seed=0)
+    assert sim.advance(sim.time_step * 1.5) == 1
+    assert sim.advance(sim.time_step * 0.5) == 1
+    assert sim.steps == 2
+
+def test_advance_is_capped_at_the_fast_time_scale():
+    '''
+    A slow frame at the fastest time scale does not make the next frame simulate more
+    steps, the time that did not fit is dropped
+    '''
+    sim = Simulation(seed=0, physics_rate=240)
+    sim.set_time_scale(1000)
+    assert sim.advance(0.5) == MAX_STEPS_PER_ADVANCE
+    assert sim.accumulator == 0.0
+    assert sim.advance(1 / 60) == MAX_STEPS_PER_ADVANCE
+    assert sim.steps == 2 * MAX_STEPS_PER_ADVANCE
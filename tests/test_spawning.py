@@ -0,0 +1,59 @@
+'''
+Tests for placing many cars on the road at once
+'''
+
+import numpy as np
+import pytest
+import cruise_control
+from car import CAR_HEIGHT
+from highway import Highway
+from monte_carlo import Scenario, run_episode
+from simulation import Simulation
+
+def test_spawn_many_never_overlaps():
+    '''
+    New cars keep clear of each other, of the cars already on the road and of the
+    main car, and stay within the stretch they were asked for
+    '''
+    sim = Simulation(seed=0, highway=Highway(lanes=4))
+    sim.spawn_many(50, y_range=(-3000, 800))
+    sim.spawn_many(400, y_range=(-20000, 800), distribution={0: 1, 1: 3, 3: 1})
+
+    traffic = sim.cars_on_road
+    assert traffic.count == 450
+    assert len(cruise_control.find_collisions(traffic)) == 0
+    assert not cruise_control.overlaps(sim.player.x_pos, sim.player.y_pos,
+                                       traffic.x_pos[:traffic.count],
+                                       traffic.y_pos[:traffic.count]).any()
+    assert traffic.y_pos[:traffic.count].min() >= -20000
+    assert traffic.y_pos[:traffic.count].max() <= 800
+    assert not np.any(traffic.lane[50:traffic.count] == 2)
+
+def test_spawn_many_fills_the_road_then_refuses():
+    '''
+    Every spot that fits a car can be filled, and asking for more than that fails
+    without adding any cars
+    '''
+    sim = Simulation(seed=1)
+    gap = CAR_HEIGHT + cruise_control.COLLISION_MARGIN
+
+    # Each of the three lanes fits 11 cars in 10 gaps, the main car is further back
+    sim.spawn_many(3 * 11 - 1, y_range=(0, 10 * gap))
+    assert len(cruise_control.find_collisions(sim.cars_on_road)) == 0
+
+    count = sim.cars_on_road.count
+    with pytest.raises(ValueError):
+        sim.spawn_many(2, y_range=(0, 10 * gap))
+    assert sim.cars_on_road.count == count
+
+def test_monte_carlo_episode_fills_a_crowded_road():
+    '''
+    A Monte Carlo episode keeps adding cars to a crowded road without
+    stalling, and refuses to start with more cars than fit
+    '''
+    scenario = Scenario(duration=2, start_cars=30, spawn_interval=0.05, spawn_y=(-3000, 600))
+    result = run_episode(0, scenario)
+    assert result['collisions'] == 0
+
+    with pytest.raises(ValueError):
+        run_episode(0, Scenario(start_cars=60))
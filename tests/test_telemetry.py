@@ -0,0 +1,20 @@
+'''
+Tests for the live telemetry server
+'''
+
+import pytest
+from telemetry import TelemetryServer
+
+def test_start_raises_when_the_address_is_taken():
+    '''
+    A server that can not listen raises from start instead of leaving it waiting
+    '''
+    first = TelemetryServer('127.0.0.1:0')
+    first.start()
+    port = first.server.sockets[0].getsockname()[1]
+
+    try:
+        with pytest.raises(OSError):
+            TelemetryServer(f'127.0.0.1:{port}').start()
+    finally:
+        first.stop()
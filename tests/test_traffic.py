@@ -0,0 +1,69 @@
+'''
+Tests for the array backed traffic store
+'''
+
+import numpy as np
+from traffic import Traffic
+
+def random_traffic(rng, count):
+    '''
+    Function to fill a traffic store with cars at random places
+    Input:
+        rng (numpy Generator obj) - The random number generator to place the cars with
+        count (int) - The number of cars to add
+    Output:
+        The Traffic obj
+    '''
+    traffic = Traffic(capacity=4)
+    lanes = rng.integers(0, 3, size=count)
+    traffic.add_many(traffic.highway.lane_x(0) + 100 * lanes, rng.uniform(-5000, 700, count),
+                     lanes, rng.integers(50, 100, size=count))
+    return traffic
+
+def test_remove_keeps_every_other_car():
+    '''
+    Removing cars leaves every other car with the same values, and the views handed
+    out before still point at their own car
+    '''
+    rng = np.random.default_rng(0)
+    traffic = random_traffic(rng, 200)
+    cars = {int(car_id): (x_pos, y_pos, lane, velocity) for car_id, x_pos, y_pos, lane, velocity
+            in zip(traffic.ids, traffic.x_pos, traffic.y_pos, traffic.lane, traffic.velocity)}
+    views = [traffic.view(row) for row in range(0, traffic.count, 3)]
+
+    for _ in range(10):
+        mask = rng.random(traffic.count) < 0.2
+        for car_id in traffic.remove_mask(mask).tolist():
+            del cars[car_id]
+
+    assert traffic.count == len(cars)
+    for row in range(traffic.count):
+        x_pos, y_pos, lane, velocity = cars[int(traffic.ids[row])]
+        assert (traffic.x_pos[row], traffic.y_pos[row]) == (x_pos, y_pos)
+        assert (traffic.lane[row], traffic.velocity[row]) == (lane, velocity)
+
+    for view in views:
+        if view.car_id in cars:
+            assert traffic.ids[view.row] == view.car_id
+        else:
+            assert view.row is None
+
+def test_lane_index_matches_sorting():
+    '''
+    The lane index gives the cars of every lane in y order after cars move, change
+    lanes and leave the road
+    '''
+    rng = np.random.default_rng(1)
+    traffic = random_traffic(rng, 300)
+
+    for _ in range(20):
+        traffic.move(0.5)
+        traffic.set_lane(int(rng.integers(traffic.count)), int(rng.integers(3)))
+        traffic.remove_mask(rng.random(traffic.count) < 0.05)
+
+        index = traffic.sorted_index()
+        for lane in range(3):
+            rows = np.flatnonzero(traffic.lane[:traffic.count] == lane)
+            expected = rows[np.argsort(traffic.y_pos[rows], kind='stable')]
+            assert np.array_equal(traffic.y_pos[index.lane_rows(lane)],
+                                  traffic.y_pos[expected])
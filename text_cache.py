@@ -0,0 +1,70 @@
+'''
+This file contains a cache for rendered text. Rendering text with a font rasterises
+every glyph, so labels that are drawn every frame are rendered once and the
+surfaces are reused for as long as the text stays the same
+'''
+
+from collections import OrderedDict
+
+class TextCache:
+    '''
+    This class is a bounded least recently used cache of rendered text surfaces,
+    keyed by the font, the text and the colour
+    '''
+
+    def __init__(self, max_size=256):
+        '''
+        Method to initialize an empty cache
+        Input:
+            max_size (int) - The most surfaces to keep, the least recently used surface
+                             is dropped once there are more
+        '''
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, colour, antialias=True):
+        '''
+        Method to get the surface for a piece of text, rendering it only if it is not
+        in the cache yet
+        Input:
+            font (Font obj) - The pygame font to render with
+            text (str) - The text to render
+            colour (int, int, int) - The RGB colour of the text
+            antialias (bool) - Whether the text should be antialiased
+        Output:
+            The surface with the rendered text
+        '''
+        key = (font, text, tuple(colour), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, colour)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+
+        return surface
+
+    def clear(self):
+        '''
+        Method to drop all of the cached surfaces
+        '''
+        self.surfaces.clear()
+
+def quantize(value, step):
+    '''
+    Function to round a number to a multiple of step, so that labels showing a number
+    that changes every frame only change (and need rendering) once per step
+    Input:
+        value (double) - The number to round
+        step (double) - The size of the steps to round to
+    Output:
+        The rounded number
+    '''
+    return round(round(value / step) * step, 6)
@@ -0,0 +1,358 @@
+'''
+This file contains the array backed store for all of the cars on the road (other
+than the main car). The positions, velocities and lanes of the cars are kept in
+numpy columns so that they can be moved and removed with single vectorized
+operations, while TrafficCar objects give a Car like view of a single row
+'''
+
+import numpy as np
+from car import Car, CAR_WIDTH, CAR_HEIGHT, FRAME_RATE
+from highway import Highway
+from lane_index import LaneIndex
+
+class TrafficCar(Car):
+    '''
+    This is a lightweight view of a single car in the traffic store so that it can
+    be drawn and passed to the functions that expect Car objects
+    '''
+
+    # pylint: disable=W0231
+    def __init__(self, traffic, car_id, row):
+        self.traffic = traffic
+        self.car_id = car_id
+        self.row = row
+        self.image = ""
+        self.width = CAR_WIDTH
+        self.height = CAR_HEIGHT
+
+    @property
+    def x_pos(self):
+        return float(self.traffic.x_pos[self.row])
+
+    @x_pos.setter
+    def x_pos(self, value):
+        self.traffic.x_pos[self.row] = value
+
+    @property
+    def y_pos(self):
+        return float(self.traffic.y_pos[self.row])
+
+    @y_pos.setter
+    def y_pos(self, value):
+        self.traffic.y_pos[self.row] = value
+        self.traffic.index.dirty = True
+
+    @property
+    def velocity(self):
+        return float(self.traffic.velocity[self.row])
+
+    @velocity.setter
+    def velocity(self, value):
+        self.traffic.velocity[self.row] = value
+
+    @property
+    def cur_lane(self):
+        return int(self.traffic.lane[self.row])
+
+    @cur_lane.setter
+    def cur_lane(self, value):
+        self.traffic.set_lane(self.row, value)
+
+# The columns every car has a value in
+COLUMNS = ('ids', 'x_pos', 'y_pos', 'velocity', 'cruise', 'lane')
+
+class Traffic:
+    '''
+    This class stores the cars on the road as a struct of arrays. Only the first
+    count rows of each column are in use, the columns grow as more cars are added
+    '''
+
+    def __init__(self, capacity=16, highway=None):
+        '''
+        Method to initialize an empty traffic store
+        Input:
+            capacity (int) - The number of cars to allocate space for up front
+            highway (Highway obj) - The highway the cars drive on, the default one if None
+        '''
+        self.highway = highway or Highway()
+        self.count = 0
+        self.next_id = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.x_pos = np.zeros(capacity)
+        self.y_pos = np.zeros(capacity)
+        self.velocity = np.zeros(capacity)
+        self.cruise = np.zeros(capacity)
+        self.lane = np.zeros(capacity, dtype=np.int64)
+
+        # The views that have been handed out, keyed by the id of the car
+        self.views = dict()
+
+        # The cars of every lane ordered by y position
+        self.index = LaneIndex(self.highway.segment_pixels)
+
+        # The number of cars that have been removed from the road so far
+        self.removed = 0
+
+        # For every lane, a count that goes up every time a car is added to it or
+        # moves into or out of it, so anything watching a lane can tell when to look
+        # at it again
+        self.lane_versions = dict()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        '''
+        Iterating over the store gives a TrafficCar view for every car on the road
+        '''
+        return iter([self.view(row) for row in range(self.count)])
+
+    def view(self, row):
+        '''
+        Method to get the TrafficCar view for the car stored in a given row
+        Input:
+            row (int) - The row of the car in the columns
+        Output:
+            The TrafficCar obj for that car
+        '''
+        car_id = int(self.ids[row])
+        car = self.views.get(car_id)
+        if car is None:
+            car = TrafficCar(self, car_id, row)
+            self.views[car_id] = car
+
+        return car
+
+    def _reserve(self, extra):
+        '''
+        Method to make sure there is enough room in the columns for more cars
+        Input:
+            extra (int) - The number of cars that are about to be added
+        Output:
+            None
+        '''
+        needed = self.count + extra
+        if needed <= len(self.ids):
+            return
+
+        capacity = max(needed, 2 * len(self.ids))
+        for name in COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def add(self, x_pos, y_pos, lane, velocity):
+        '''
+        Method to add a single car to the road
+        Input:
+            x_pos (int) - The x coordinate of the car
+            y_pos (int) - The world y coordinate of the car
+            lane (int) - The lane the car is in
+            velocity (double) - The velocity of the car in km/h
+        Output:
+            The TrafficCar view of the new car
+        '''
+        self.add_many([x_pos], [y_pos], [lane], [velocity])
+        return self.view(self.count - 1)
+
+    def add_many(self, x_pos, y_pos, lanes, velocities):
+        '''
+        Method to add many cars to the road at once
+        Input:
+            x_pos (array of int) - The x coordinates of the cars
+            y_pos (array of int) - The world y coordinates of the cars
+            lanes (array of int) - The lanes the cars are in
+            velocities (array of double) - The velocities of the cars in km/h, this is
+                                           also the velocity they cruise at when the
+                                           road ahead is clear
+        Output:
+            An array of the ids given to the new cars
+        '''
+        amount = len(x_pos)
+        self._reserve(amount)
+        new = slice(self.count, self.count + amount)
+
+        self.ids[new] = np.arange(self.next_id, self.next_id + amount)
+        self.x_pos[new] = x_pos
+        self.y_pos[new] = y_pos
+        self.lane[new] = lanes
+        self.velocity[new] = velocities
+        self.cruise[new] = velocities
+
+        self.next_id += amount
+        self.count += amount
+        self._lanes_changed(np.unique(self.lane[new]).tolist())
+        self.index.insert(np.arange(new.start, new.stop), self.lane[new], self.y_pos[new])
+        return self.ids[new].copy()
+
+    def remove(self, car):
+        '''
+        Method to remove a single car from the road
+        Input:
+            car (TrafficCar obj) - The car to remove
+        Output:
+            None
+        '''
+        mask = np.zeros(self.count, dtype=bool)
+        mask[car.row] = True
+        self.remove_mask(mask)
+
+    def remove_mask(self, mask):
+        '''
+        Method to remove every car where the mask is set. The holes left behind are
+        filled with the cars from the end of the columns so only the moved views
+        need to be updated
+        Input:
+            mask (array of bool) - A value for each car on the road, True to remove it
+        Output:
+            An array of the ids of the cars that were removed
+        '''
+        removed_rows = np.flatnonzero(mask[:self.count])
+        removed_ids = self.ids[removed_rows].copy()
+        if len(removed_rows) == 0:
+            return removed_ids
+
+        new_count = self.count - len(removed_rows)
+
+        # Rows past the new end that are kept get moved into the holes before it
+        holes = removed_rows[removed_rows < new_count]
+        tail = np.arange(new_count, self.count)
+        movers = tail[~mask[new_count:self.count]]
+
+        for name in COLUMNS:
+            column = getattr(self, name)
+            column[holes] = column[movers]
+
+        remap = np.arange(self.count)
+        remap[movers] = holes
+        self.index.remove(mask[:self.count], remap)
+
+        for car_id in removed_ids.tolist():
+            car = self.views.pop(car_id, None)
+            if car is not None:
+                car.row = None
+
+        for row, car_id in zip(holes.tolist(), self.ids[holes].tolist()):
+            car = self.views.get(car_id)
+            if car is not None:
+                car.row = row
+
+        self.count = new_count
+        self.removed += len(removed_ids)
+        return removed_ids
+
+    def move(self, elapsed_time=1 / FRAME_RATE):
+        '''
+        Method to drive every car forward along the highway at its own velocity
+        Input:
+            elapsed_time (double) - The time in seconds the cars have been moving for
+        Output:
+            None
+        '''
+        self.y_pos[:self.count] -= self.velocity[:self.count] / 10 * FRAME_RATE * elapsed_time
+        self.index.dirty = True
+
+    def cull(self):
+        '''
+        Method to remove all of the cars that have driven off either end of the highway
+        Input:
+            None
+        Output:
+            An array of the ids of the cars that were removed
+        '''
+        return self.remove_mask(self.highway.off_road(self.y_pos[:self.count]))
+
+    def rows_between(self, lower, upper):
+        '''
+        Method to find the cars with lower <= y position < upper in every lane. Only the
+        segments of the highway that overlap the range are looked at, so the time this
+        takes depends on the number of cars found rather than on all of the cars
+        Input:
+            lower (double) - The smallest world y position to include
+            upper (double) - The world y position to stop at
+        Output:
+            An array of the rows of the cars in the range
+        '''
+        index = self.sorted_index()
+        first = self.highway.segment(lower)
+        last = self.highway.segment(upper)
+
+        found = [index.segment_rows(lane, segment)
+                 for lane in index.rows for segment in range(first, last + 1)]
+        rows = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+        y_pos = self.y_pos[rows]
+        return rows[(y_pos >= lower) & (y_pos < upper)]
+
+    def set_lane(self, row, lane):
+        '''
+        Method to move a car into a different lane
+        Input:
+            row (int) - The row of the car
+            lane (int) - The lane the car is now in
+        Output:
+            None
+        '''
+        old_lane = int(self.lane[row])
+        if old_lane != lane:
+            self.lane[row] = lane
+            self.sorted_index().change_lane(row, old_lane, lane, self.y_pos[row])
+            self._lanes_changed((old_lane, lane))
+
+    def _lanes_changed(self, lanes):
+        '''
+        Method to note that cars were added to or moved between lanes
+        '''
+        for lane in lanes:
+            self.lane_versions[lane] = self.lane_versions.get(lane, 0) + 1
+
+    def sorted_index(self):
+        '''
+        Method to get the lane index, brought up to date with the latest positions
+        Input:
+            None
+        Output:
+            The LaneIndex obj for the cars on the road
+        '''
+        if self.index.dirty:
+            self.index.refresh(self.y_pos[:self.count])
+
+        return self.index
+
+    def leader(self, lane, y_pos):
+        '''
+        Method to find the closest car ahead of a position in a lane
+        Input:
+            lane (int) - The lane to look in
+            y_pos (double) - The y position to look ahead of
+        Output:
+            The TrafficCar view of the car ahead, or None if there is no car ahead
+        '''
+        row = self.sorted_index().leader(lane, y_pos)
+        return None if row is None else self.view(row)
+
+    def leaders(self, player=None):
+        '''
+        Method to find the car directly ahead of every car in its lane
+        Input:
+            player (Car obj) - The main car, so that the cars behind it follow it
+        Output:
+            A tuple of two arrays with the y position and the velocity of the car ahead
+            of every car, both are nan for the cars with a clear lane ahead
+        '''
+        index = self.sorted_index()
+        leader_y = np.full(self.count, np.nan)
+        leader_vel = np.full(self.count, np.nan)
+
+        for lane, rows in index.rows.items():
+            leader_y[rows[1:]] = self.y_pos[rows[:-1]]
+            leader_vel[rows[1:]] = self.velocity[rows[:-1]]
+
+            # The first car behind the main car follows the main car instead
+            if player is not None and player.cur_lane == lane:
+                place = np.searchsorted(index.keys[lane], player.y_pos, side='right')
+                if place < len(rows):
+                    leader_y[rows[place]] = player.y_pos
+                    leader_vel[rows[place]] = player.velocity
+
+        return leader_y, leader_vel
@@ -0,0 +1,214 @@
+'''
+This file contains the scripted traffic input. A script is a JSONL or CSV file of
+timed events (cars being spawned, cars changing velocity and requests for the main
+car) that is read a line at a time as the simulation reaches the time of each event,
+so even scripts with millions of events never have to be held in memory
+'''
+
+import argparse
+import csv
+import json
+import time
+import numpy as np
+from simulation import Simulation
+
+# The kinds of events a script can have, and the fields each of them needs
+EVENT_FIELDS = {
+    'spawn': ('lane', 'y', 'velocity'),
+    'velocity': ('car', 'velocity'),
+    'target': ('velocity',),
+    'lane_change': ('direction',),
+}
+
+def _parse_csv_row(row):
+    '''
+    Function to turn a row of a CSV script into an event with the right types
+    Input:
+        row (dict) - The row as read by csv.DictReader
+    Output:
+        The event dict, without the fields that were empty
+    '''
+    event = {name: value for name, value in row.items() if value not in (None, '')}
+    for name in ('time', 'y', 'velocity'):
+        if name in event:
+            event[name] = float(event[name])
+    for name in ('lane', 'direction'):
+        if name in event:
+            event[name] = int(event[name])
+
+    return event
+
+def read_events(path):
+    '''
+    Generator that reads the events of a script one at a time. Blank lines and lines
+    starting with # are skipped
+    Input:
+        path (str) - The script file, read as CSV (with a header row naming the
+                     fields, any field an event does not use is left empty) if it
+                     ends in .csv and as JSONL (one JSON object per line) otherwise
+    Output:
+        Yields the event dicts in the order they are in the file
+    Raises:
+        ValueError if an event is missing a field, has an unknown type or is earlier
+        than the event before it
+    '''
+    last_time = 0.0
+    with open(path, newline='') as script:
+        if path.endswith('.csv'):
+            lines = (line for line in script if line.strip() and not line.startswith('#'))
+            rows = (_parse_csv_row(row) for row in csv.DictReader(lines))
+        else:
+            rows = (json.loads(line) for line in script
+                    if line.strip() and not line.startswith('#'))
+
+        for number, event in enumerate(rows, 1):
+            fields = EVENT_FIELDS.get(event.get('type'))
+            if fields is None or 'time' not in event:
+                raise ValueError(f"{path}: event {number} has no time or an unknown type "
+                                 f"({event.get('type')!r})")
+            missing = [name for name in fields if name not in event]
+            if missing:
+                raise ValueError(f"{path}: event {number} is missing {', '.join(missing)}")
+            if event['time'] < last_time:
+                raise ValueError(f"{path}: event {number} at {event['time']} s is earlier "
+                                 f"than the event before it")
+
+            last_time = event['time']
+            yield event
+
+class TrafficScript:
+    '''
+    This class feeds the events of a script to a simulation as its time passes. Only
+    the next event is read ahead of time, and the cars the script named are only
+    remembered while they are still on the road
+    '''
+
+    def __init__(self, path):
+        '''
+        Method to open a script
+        Input:
+            path (str) - The JSONL or CSV script file
+        '''
+        self.path = path
+        self.events = read_events(path)
+        self.pending = next(self.events, None)
+        self.applied = 0
+
+        # The traffic id of every car the script gave a name to
+        self.cars = dict()
+
+    @property
+    def finished(self):
+        '''
+        True once every event in the script has been applied
+        '''
+        return self.pending is None
+
+    def apply(self, sim):
+        '''
+        Method to apply every event that is due by the current time of a simulation
+        Input:
+            sim (Simulation obj) - The simulation to apply the events to
+        Output:
+            The number of events that were applied
+        '''
+        applied = 0
+        while self.pending is not None and self.pending['time'] <= sim.time:
+            self.apply_event(sim, self.pending)
+            self.pending = next(self.events, None)
+            applied += 1
+
+        self.applied += applied
+        return applied
+
+    def apply_event(self, sim, event):
+        '''
+        Method to apply a single event to a simulation
+        Input:
+            sim (Simulation obj) - The simulation to apply the event to
+            event (dict) - The event read from the script
+        Output:
+            None
+        '''
+        traffic = sim.cars_on_road
+        kind = event['type']
+
+        if kind == 'spawn':
+            lane = event['lane']
+            # The y position of a new car is where it appears on the screen
+            new_id = sim.add_cars([sim.highway.lane_x(lane)], [sim.camera.top + event['y']],
+                                  [lane], [event['velocity']])[0]
+            if 'car' in event:
+                self.forget_removed_cars(traffic)
+                self.cars[str(event['car'])] = int(new_id)
+
+        elif kind == 'velocity':
+            car_id = self.cars.get(str(event['car']), -1)
+            rows = np.flatnonzero(traffic.ids[:traffic.count] == car_id)
+            if len(rows):
+                # The car ramps to its new velocity when the traffic runs the cruise
+                # control, otherwise it changes straight away
+                traffic.cruise[rows] = event['velocity']
+                if sim.traffic_follow_dist is None:
+                    traffic.velocity[rows] = event['velocity']
+
+        elif kind == 'target':
+            sim.set_target_velocity(event['velocity'])
+
+        elif kind == 'lane_change':
+            sim.request_lane_change(event['direction'])
+
+    def forget_removed_cars(self, traffic):
+        '''
+        Method to stop remembering the named cars that have left the road, this is
+        only done once there are a lot more names than cars so it stays cheap
+        Input:
+            traffic (Traffic obj) - The cars currently on the road
+        Output:
+            None
+        '''
+        if len(self.cars) <= 2 * traffic.count + 64:
+            return
+
+        on_road = set(traffic.ids[:traffic.count].tolist())
+        self.cars = {name: car_id for name, car_id in self.cars.items() if car_id in on_road}
+
+def main():
+    '''
+    Command line entry point to run a script on the headless simulation
+    '''
+    parser = argparse.ArgumentParser(description="Run a traffic script headless")
+    parser.add_argument('script', help="The JSONL or CSV script file")
+    parser.add_argument('--duration', type=float, default=None,
+                        help="Seconds to simulate, until the last event if not given")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--follow-dist', choices=['short', 'mid', 'long', 'none'],
+                        default='mid')
+    parser.add_argument('--event-driven', action='store_true',
+                        help="Jump from event to event instead of stepping at the frame rate")
+    args = parser.parse_args()
+
+    sim = Simulation(seed=args.seed,
+                     follow_dist=None if args.follow_dist == 'none' else args.follow_dist)
+    script = TrafficScript(args.script)
+    sim.script = script
+
+    start = time.perf_counter()
+    while (args.duration is None and not script.finished) or \
+          (args.duration is not None and sim.time < args.duration):
+        if args.event_driven:
+            # A second at a time, so a script without a duration stops at its last event
+            remaining = 1.0 if args.duration is None else args.duration - sim.time
+            sim.run(min(1.0, remaining), event_driven=True)
+        else:
+            sim.step()
+
+    print(json.dumps({'simulated_time': round(sim.time, 3),
+                      'steps': sim.steps,
+                      'events': script.applied,
+                      'cars_on_road': len(sim.cars_on_road),
+                      'brake_events': sim.brake_events,
+                      'wall_time': round(time.perf_counter() - start, 3)}, indent=2))
+
+if __name__ == '__main__':
+    main()
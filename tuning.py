@@ -0,0 +1,291 @@
+'''
+This file contains the tuning tools for the cruise control. Sets of controller
+settings are run through the Monte Carlo episodes in parallel and ranked by how
+safely they drove, either with a full grid search or with successive halving that
+stops running the settings that are clearly worse early
+'''
+
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import random
+from cruise_control import ControllerParams
+from monte_carlo import Scenario, run_episode, summarize
+
+# The values that are tried for each setting when no other search space is given
+DEFAULT_SPACE = {
+    'brake': [-6.0, -8.0, -10.04],
+    'accel': [2.5, 3.3, 4.0],
+    'follow_mid': [2, 3, 4],
+    'blind_spot_time': [0.5, 1, 1.5, 2],
+    'lane_change_speed': [10, 20],
+}
+
+def grid(space):
+    '''
+    Function to get every combination of the settings in a search space
+    Input:
+        space (dict of lists) - The values to try for each ControllerParams setting
+    Output:
+        A list of dicts, one for each combination
+    '''
+    names = sorted(space)
+    values = itertools.product(*(space[name] for name in names))
+    return [dict(zip(names, combination)) for combination in values]
+
+def sample(space, amount, seed=0):
+    '''
+    Function to pick random combinations of the settings in a search space
+    Input:
+        space (dict of lists) - The values to try for each ControllerParams setting
+        amount (int) - The number of combinations to pick
+        seed (int) - The seed for picking the combinations
+    Output:
+        A list of dicts, one for each combination (without repeats)
+    '''
+    configs = grid(space)
+    if amount >= len(configs):
+        return configs
+
+    return random.Random(seed).sample(configs, amount)
+
+def wilson_interval(failures, trials, z=1.96):
+    '''
+    Function to get the confidence interval of a rate from a number of trials
+    Input:
+        failures (int) - The number of trials that failed
+        trials (int) - The number of trials
+        z (double) - The z score of the confidence level (1.96 for 95%)
+    Output:
+        A tuple of the lower and upper bounds of the rate
+    '''
+    if trials == 0:
+        return 0.0, 1.0
+
+    rate = failures / trials
+    centre = rate + z * z / (2 * trials)
+    spread = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+    scale = 1 + z * z / trials
+    return max(0.0, (centre - spread) / scale), min(1.0, (centre + spread) / scale)
+
+def _run_config(args):
+    '''
+    Function that is run in the worker processes, it runs a chunk of episodes for a
+    single set of settings
+    Input:
+        args ((int, dict, list of int, Scenario obj)) - The index of the settings, the
+                                                       settings, the seeds and the scenario
+    Output:
+        A tuple of the index and the list of the results of every episode
+    '''
+    index, config, seeds, scenario = args
+    params = ControllerParams(**config)
+    return index, [run_episode(seed, scenario, params) for seed in seeds]
+
+def _ranking_key(entry):
+    '''
+    Function to sort the settings, the fewest collisions first, then the largest
+    headway to the car ahead and then the least braking
+    '''
+    summary = entry['summary']
+    headway = summary['min_headway_p5']
+    return (summary['collision_rate'],
+            -headway if headway is not None else -math.inf,
+            summary['brake_events_per_episode'])
+
+class Tuner:
+    '''
+    This class runs the searches over the controller settings. Every set of settings
+    is run on the same seeds so that they are compared on the same traffic
+    '''
+
+    def __init__(self, scenario=None, seed=0, workers=None, chunk_size=25):
+        '''
+        Method to initialize the tuner
+        Input:
+            scenario (Scenario obj) - The traffic to tune on, the defaults if None
+            seed (int) - The seed of the first episode
+            workers (int) - The number of processes to use, defaults to the number of cores
+            chunk_size (int) - The number of episodes sent to a process at a time
+        '''
+        self.scenario = scenario or Scenario()
+        self.seed = seed
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def _run(self, pool, entries, episodes):
+        '''
+        Method to run more episodes for some settings, until each has run a given
+        number of episodes in total
+        Input:
+            pool (Pool obj) - The process pool to run the episodes on
+            entries (list of dict) - The settings and their results so far
+            episodes (int) - The total number of episodes each should have run
+        Output:
+            None
+        '''
+        tasks = []
+        for index, entry in enumerate(entries):
+            done = len(entry['results'])
+            seeds = list(range(self.seed + done, self.seed + episodes))
+            for start in range(0, len(seeds), self.chunk_size):
+                tasks.append((index, entry['params'], seeds[start:start + self.chunk_size],
+                              self.scenario))
+
+        for index, results in pool.imap_unordered(_run_config, tasks):
+            entries[index]['results'].extend(results)
+
+        for entry in entries:
+            entry['results'].sort(key=lambda result: result['seed'])
+            entry['summary'] = summarize(entry['results'])
+
+    def grid_search(self, configs, episodes):
+        '''
+        Method to run every set of settings for the full number of episodes
+        Input:
+            configs (list of dict) - The settings to try
+            episodes (int) - The number of episodes to run each with
+        Output:
+            The ranked report (see report)
+        '''
+        entries = [{'params': config, 'results': [], 'stopped': None} for config in configs]
+        with multiprocessing.Pool(self.workers) as pool:
+            self._run(pool, entries, episodes)
+
+        return report(entries)
+
+    def successive_halving(self, configs, min_episodes=50, max_episodes=1600, eta=2):
+        '''
+        Method to run successive halving over the settings. All of the settings start
+        with a small number of episodes, after every round only the best 1/eta of them
+        go on and each round runs eta times as many episodes. Settings whose collision
+        rate is clearly worse than the best one (their confidence intervals do not
+        overlap) are stopped straight away
+        Input:
+            configs (list of dict) - The settings to try
+            min_episodes (int) - The number of episodes in the first round
+            max_episodes (int) - The most episodes any set of settings is run for
+            eta (int) - How much the field is cut (and the episodes grown) every round
+        Output:
+            The ranked report (see report)
+        '''
+        entries = [{'params': config, 'results': [], 'stopped': None} for config in configs]
+        alive = list(entries)
+        episodes = min_episodes
+        rounds = 0
+
+        with multiprocessing.Pool(self.workers) as pool:
+            while alive:
+                self._run(pool, alive, episodes)
+                rounds += 1
+
+                if len(alive) == 1 or episodes >= max_episodes:
+                    break
+
+                # Early stopping, drop anything that crashes clearly more than the best
+                best_upper = min(self.interval(entry)[1] for entry in alive)
+                for entry in alive:
+                    if self.interval(entry)[0] > best_upper:
+                        entry['stopped'] = rounds
+
+                survivors = sorted((entry for entry in alive if entry['stopped'] is None),
+                                   key=_ranking_key)
+                keep = max(1, math.ceil(len(alive) / eta))
+                for entry in survivors[keep:]:
+                    entry['stopped'] = rounds
+
+                alive = survivors[:keep]
+                episodes = min(episodes * eta, max_episodes)
+
+        return report(entries)
+
+    @staticmethod
+    def interval(entry):
+        '''
+        Method to get the confidence interval of the collision rate of some settings
+        '''
+        summary = entry['summary']
+        crashed = round(summary['collision_rate'] * summary['episodes'])
+        return wilson_interval(crashed, summary['episodes'])
+
+def report(entries):
+    '''
+    Function to rank the settings that were tried. Settings that ran the most episodes
+    (made it furthest in the search) come first, then they are ordered by the fewest
+    collisions, the largest headway and the least braking
+    Input:
+        entries (list of dict) - The settings and their results
+    Output:
+        A list of dicts, one for each set of settings in ranked order
+    '''
+    ranked = sorted(entries, key=lambda entry: (-entry['summary']['episodes'],
+                                                _ranking_key(entry)))
+    rows = []
+    for rank, entry in enumerate(ranked, 1):
+        row = {'rank': rank, 'params': entry['params'], 'stopped_round': entry['stopped']}
+        row.update(entry['summary'])
+        row['collision_interval'] = Tuner.interval(entry)
+        rows.append(row)
+
+    return rows
+
+def print_report(rows, limit=10):
+    '''
+    Function to print the best settings of a report as a table
+    Input:
+        rows (list of dict) - The ranked report
+        limit (int) - The number of settings to print
+    Output:
+        None
+    '''
+    print(f"{'rank':>4} {'episodes':>8} {'collisions':>10} {'headway p5':>10} "
+          f"{'brakes':>7}  settings")
+    for row in rows[:limit]:
+        headway = row['min_headway_p5']
+        headway = f"{headway:.2f}" if headway is not None else '-'
+        settings = ', '.join(f"{name}={value}" for name, value in row['params'].items())
+        print(f"{row['rank']:>4} {row['episodes']:>8} {row['collision_rate']:>10.3f} "
+              f"{headway:>10} {row['brake_events_per_episode']:>7.2f}  {settings}")
+
+def main():
+    '''
+    Command line entry point for the tuner
+    '''
+    parser = argparse.ArgumentParser(description="Tune the cruise control settings")
+    parser.add_argument('--method', choices=['grid', 'halving'], default='halving')
+    parser.add_argument('--space', help="JSON file mapping each setting to a list of values")
+    parser.add_argument('--samples', type=int, default=None,
+                        help="Only try this many random combinations of the settings")
+    parser.add_argument('--episodes', type=int, default=200,
+                        help="Episodes per setting for grid, the most for halving")
+    parser.add_argument('--min-episodes', type=int, default=25)
+    parser.add_argument('--eta', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--output', help="File to write the full ranked report to")
+    args = parser.parse_args()
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space) as space_file:
+            space = json.load(space_file)
+
+    configs = grid(space) if args.samples is None else sample(space, args.samples, args.seed)
+    tuner = Tuner(Scenario(duration=args.duration), args.seed, args.workers)
+
+    if args.method == 'grid':
+        rows = tuner.grid_search(configs, args.episodes)
+    else:
+        rows = tuner.successive_halving(configs, args.min_episodes, args.episodes, args.eta)
+
+    print_report(rows, args.top)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(rows, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -2,17 +2,17 @@
 This file contains a bunch of helper functions
 '''
 
+import math
 import random
+import numpy as np
 import cruise_control
-from car import Car
+from car import Car, CAR_WIDTH, CAR_HEIGHT, SCREEN_HEIGHT
 
 # Defining some constants
 BRAKE = -10.04
 ACCEL = 3.3
-GREY = (159, 163, 168)
-LANESUPERPOSITIONS = [180, 280, 380]
 
-def update_velocity(initial_velocity, target_velocity, elapsed_time):
+def update_velocity(initial_velocity, target_velocity, elapsed_time, accel=ACCEL, brake=BRAKE):
     '''
     This is a function that will be called to show the acceleration and deceleration of the
     car smoothly
@@ -20,31 +20,53 @@ def update_velocity(initial_velocity, target_velocity, elapsed_time):
         initial_velocity (float) - The initial velocity for the car
         target_velocity (float) - The target velocity for the car
         elapsed_time (float) - The time that has passed since the car started accelerating
+        accel (float) - The acceleration of the car in m/s^2
+        brake (float) - The (negative) deceleration of the car in m/s^2
     Output:
         A double representing the updated speed of the car
     '''
     initial = kmh_to_ms(initial_velocity)
     target = kmh_to_ms(target_velocity)
     if target > initial:
-        return ms_to_kmh(ACCEL * elapsed_time + initial)
-    return ms_to_kmh(BRAKE * elapsed_time + initial)
+        return ms_to_kmh(accel * elapsed_time + initial)
+    return ms_to_kmh(brake * elapsed_time + initial)
 
 
-def calculate_time(initial_velocity, target_velocity):
+def ramp_velocity(velocity, target_velocity, elapsed_time, accel=ACCEL, brake=BRAKE):
+    '''
+    This is the step by step form of update_velocity, it moves velocities towards
+    their targets at the acceleration (or braking) rate without going past them. It
+    works on single values as well as on numpy arrays of velocities
+    Input:
+        velocity (array of double) - The current velocities in km/h
+        target_velocity (array of double) - The target velocities in km/h
+        elapsed_time (float) - The time in seconds since the last step
+        accel (float) - The acceleration of the car in m/s^2
+        brake (float) - The (negative) deceleration of the car in m/s^2
+    Output:
+        The updated velocities in km/h
+    '''
+    change = np.clip(kmh_to_ms(target_velocity - velocity), brake * elapsed_time,
+                     accel * elapsed_time)
+    return velocity + ms_to_kmh(change)
+
+def calculate_time(initial_velocity, target_velocity, accel=ACCEL, brake=BRAKE):
     '''
     This is a function that will be called to get the time it will take to update
     the velocity of the car to the desired speed
     Input:
         initial_velocity (double) - The current velocity of the car
         target_velocity (double) - The desired velocity of the car
+        accel (float) - The acceleration of the car in m/s^2
+        brake (float) - The (negative) deceleration of the car in m/s^2
     Output:
         The time it will take in seconds to get to our desired speed
     '''
     cur = kmh_to_ms(initial_velocity)
     target = kmh_to_ms(target_velocity)
     if cur > target:
-        return (target - cur) / BRAKE
-    return (target - cur) / ACCEL
+        return (target - cur) / brake
+    return (target - cur) / accel
 
 def kmh_to_ms(velocity):
     '''
@@ -89,79 +111,189 @@ def ms_to_sec(milli):
     '''
     return milli / 1000
 
-def lane_change(player, buttons, cars_on_road):
+def free_intervals(keys, lower, upper, gap):
     '''
-    This function checks if a button has been pressed for a lane change, if yes it will
-    then complete the lane change
+    Function to find the stretches of a lane where a new car can be placed
     Input:
-        player (Car obj) - The main car that we are moving
-        buttons (dict of buttons) - The left and right lane change buttons
-        cars_on_road (dict of Car objs) - All of the cars currently on the road
+        keys (array of double) - The sorted y positions of the cars already in the lane
+        lower (int) - The smallest y position a new car can have
+        upper (int) - The largest y position a new car can have
+        gap (int) - The smallest distance allowed between the y positions of two cars
     Output:
-        A boolean value denoting whether or not a lange change has occured
-    '''
-    change = False
-
-    if buttons['left'].pressed and player.x_pos != LANESUPERPOSITIONS[0]:
-        change = cruise_control.check_lane_change(0, player, cars_on_road)
-        if change and player.x_pos > LANESUPERPOSITIONS[player.cur_lane - 1]:
-            player.x_pos -= 2
-
-        if player.x_pos <= LANESUPERPOSITIONS[player.cur_lane - 1]:
-            buttons['left'].pressed = False
-            player.cur_lane -= 1
-            player.x_pos = LANESUPERPOSITIONS[player.cur_lane]
-            buttons['left'].colour = GREY
-            return True
-    else:
-        buttons['left'].colour = GREY
-
-    if buttons['right'].pressed and player.x_pos != LANESUPERPOSITIONS[2]:
-        change = cruise_control.check_lane_change(1, player, cars_on_road)
-        if change and player.x_pos < LANESUPERPOSITIONS[player.cur_lane + 1]:
-            player.x_pos += 2
-
-        if player.x_pos >= LANESUPERPOSITIONS[player.cur_lane + 1]:
-            buttons['right'].pressed = False
-            player.cur_lane += 1
-            player.x_pos = LANESUPERPOSITIONS[player.cur_lane]
-            buttons['right'].colour = GREY
-            return True
-    else:
-        buttons['right'].colour = GREY
-
-    return False
-
-def car_spwan(spawn_button, cars_on_road, cars_on_screen):
+        A tuple of two int arrays, the first and last y position of every stretch
+    '''
+    keys = np.asarray(keys, dtype=float)
+    starts = np.concatenate(([lower], np.ceil(keys + gap)))
+    ends = np.concatenate((np.floor(keys - gap), [upper]))
+    starts = np.maximum(starts, lower).astype(np.int64)
+    ends = np.minimum(ends, upper).astype(np.int64)
+    free = ends >= starts
+    return starts[free], ends[free]
+
+def range_max(values, start, end):
+    '''
+    Function to find the largest value in many ranges of an array at once. A table of
+    the largest value of every stretch of the array that is a power of two long is
+    built first, so every range is then answered from two lookups
+    Input:
+        values (array of double) - The values to look in
+        start (array of int) - The first index of every range
+        end (array of int) - The index every range stops at
+    Output:
+        An array with the largest value of values[start:end] for every range, -inf
+        where the range is empty
+    '''
+    values = np.asarray(values, dtype=float)
+    start = np.asarray(start)
+    end = np.asarray(end)
+
+    table = [values]
+    width = 1
+    while 2 * width <= len(values):
+        table.append(np.maximum(table[-1][:-width], table[-1][width:]))
+        width *= 2
+
+    # Two stretches of the longest power of two that fits cover every range
+    largest = np.full(start.shape, -np.inf)
+    length = end - start
+    level = np.zeros(start.shape, dtype=np.int64)
+    found = length > 0
+    level[found] = np.floor(np.log2(length[found]))
+    for power in np.unique(level[found]).tolist():
+        ranges = found & (level == power)
+        largest[ranges] = np.maximum(table[power][start[ranges]],
+                                     table[power][end[ranges] - (1 << power)])
+
+    return largest
+
+def spawn_many(n, cars_on_road, distribution=None, rng=None, y_range=None,
+               velocity=(50, 100), player=None):
+    '''
+    Function to find spots for many new cars at once without any of them overlapping
+    each other, the cars already on the road or the main car. The free stretches of
+    every lane are worked out from the sorted lane index and the new cars are spread
+    over them, so no spot is ever tried and thrown away
+    Input:
+        n (int) - The number of cars to place
+        cars_on_road (Traffic obj) - All of the cars currently on the road
+        distribution (dict) - The share of the new cars each lane gets, as
+                              {lane: weight}, all of the lanes get the same if None
+        rng (numpy Generator obj) - The random number generator to place the cars with
+        y_range ((int, int)) - The smallest and largest world y position of a new car,
+                               the first screen of the highway if None
+        velocity ((int, int)) - The range of velocities (km/h) of the new cars
+        player (Car obj) - The main car, if the new cars must keep clear of it
+    Output:
+        A tuple of arrays with the x positions, y positions, lanes and velocities of
+        the new cars, ordered by lane and then by y position
+    Raises:
+        ValueError if there is not enough room on the road for n more cars
+    '''
+    rng = rng or np.random.default_rng()
+    highway = cars_on_road.highway
+    lower, upper = y_range or (0, SCREEN_HEIGHT - CAR_HEIGHT)
+    lower, upper = math.ceil(lower), math.floor(upper)
+    if distribution is None:
+        distribution = {lane: 1 for lane in range(highway.lanes)}
+
+    lanes = np.array([lane for lane, weight in distribution.items() if weight > 0])
+    weights = np.array([distribution[lane] for lane in lanes.tolist()], dtype=float)
+    gap = CAR_HEIGHT + cruise_control.COLLISION_MARGIN
+    index = cars_on_road.sorted_index()
+
+    # The free stretches of every lane and how many cars fit in each of them
+    intervals = []
+    for lane in lanes.tolist():
+        keys = index.lane_keys(lane)
+        if player is not None and \
+           abs(player.x_pos - highway.lane_x(lane)) < CAR_WIDTH + cruise_control.COLLISION_MARGIN:
+            keys = np.sort(np.append(keys, player.y_pos))
+        starts, ends = free_intervals(keys, lower, upper, gap)
+        intervals.append((starts, ends, (ends - starts) // gap + 1))
+
+    capacity = np.array([fits.sum() for _, _, fits in intervals], dtype=np.int64)
+    if n > capacity.sum():
+        raise ValueError(f"Cannot fit {n} more cars in lanes {lanes.tolist()} between "
+                         f"y = {lower} and y = {upper}, there is only room for "
+                         f"{int(capacity.sum())}")
+
+    # Share the cars between the lanes, and move the ones a lane has no room for to
+    # the lanes that still have room
+    counts = rng.multinomial(n, weights / weights.sum()) if len(lanes) else np.zeros(0, int)
+    counts = np.minimum(counts, capacity)
+    while counts.sum() < n:
+        room = (capacity - counts) > 0
+        shares = weights * room
+        counts = np.minimum(counts + rng.multinomial(n - counts.sum(), shares / shares.sum()),
+                            capacity)
+
+    x_pos, y_pos, lane_ids = [], [], []
+    for lane, count, (starts, ends, fits) in zip(lanes.tolist(), counts.tolist(), intervals):
+        if count == 0:
+            continue
+
+        # Pick which of the spots in the lane are used, then place the cars in each
+        # stretch at random while keeping them at least one gap apart
+        slots = rng.choice(int(fits.sum()), size=count, replace=False)
+        stretch = np.searchsorted(np.cumsum(fits), slots, side='right')
+        stretch.sort()
+        first = np.searchsorted(stretch, stretch, side='left')
+        slack = (ends - starts)[stretch] - (np.bincount(stretch, minlength=len(fits))[stretch]
+                                            - 1) * gap
+        offsets = rng.integers(0, slack + 1)
+        offsets = offsets[np.lexsort((offsets, stretch))]
+        rank = np.arange(count) - first
+
+        y_pos.append(starts[stretch] + offsets + rank * gap)
+        x_pos.append(np.full(count, highway.lane_x(lane)))
+        lane_ids.append(np.full(count, lane))
+
+    if not y_pos:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty.copy(), empty.copy(), empty.copy()
+
+    velocities = rng.integers(velocity[0], velocity[1] + 1, size=n)
+    return np.concatenate(x_pos), np.concatenate(y_pos), np.concatenate(lane_ids), velocities
+
+def car_spwan(cars_on_road, cars_on_screen, rng=random, player=None, top=0):
     '''
     This function spawns a car with a random speed and lane
     Input:
-        spawn_button (button obj) - The button that when pressed will spawn a car
-        cars_on_road (set Car objs) - A set containing all of the cars on screen
+        cars_on_road (Traffic obj) - All of the cars currently on the road
         cars_on_screen (int) - A value denoting how many cars are on the screen
+        rng (Random obj) - The random number generator to place the car with
+        player (Car obj) - The main car, if the new car must keep clear of it
+        top (double) - The world y position at the top of the screen
     Output:
-        - None if the button is not pressed or the screen is full
+        - None if the screen is full, or there is no room left for another car
         - Otherwise a car object is returned for the car to be created
     '''
-    if spawn_button.pressed and cars_on_screen < 10:
-        # Set the button back to its unpressed state and change colour back to GREY
-        spawn_button.pressed = not spawn_button.pressed
-        spawn_button.colour = GREY
+    if cars_on_screen < 10:
+        # New cars go in front of the main car in the middle lane when there is room
+        highway = cars_on_road.highway
+        lane = highway.lanes // 2
+        y_pos = top + 200
+        x_pos = highway.lane_x(lane)
+        velocity = rng.randint(50, 100)
 
-        # Randomly generate the x and y positions of the new car
-        lane =  1 #random.randint(0, 2)
-        y_pos = 200 #random.randint(0, 600)
-        x_pos = LANESUPERPOSITIONS[lane]
+        count = cars_on_road.count
+        taken = cruise_control.overlaps(x_pos, y_pos, cars_on_road.x_pos[:count],
+                                        cars_on_road.y_pos[:count]).any()
+        if player is not None:
+            taken = taken or cruise_control.check_collision(x_pos, y_pos, player.x_pos,
+                                                            player.y_pos)
+        if not taken:
+            return Car(x_pos, y_pos, lane, velocity)
 
-        # Randomly generate the speed of the new car
-        velocity = random.randint(50, 100)
-        print(velocity)
+        # Otherwise anywhere in the other lanes that is free
+        others = {other: 1 for other in range(highway.lanes) if other != lane}
+        try:
+            x_pos, y_pos, lanes, _ = spawn_many(
+                1, cars_on_road, others,
+                np.random.default_rng(rng.getrandbits(64)), (top, top + 800), player=player)
+        except ValueError:
+            return None
 
-        # Checking if the car overlaps with any other cars
-        for car in cars_on_road:
-            while cruise_control.check_collision(x_pos, y_pos, car.x_pos, car.y_pos):
-                lane = random.choice([0, 2])
-                y_pos = random.randint(0, 800)
-                x_pos = LANESUPERPOSITIONS[lane]
+        return Car(int(x_pos[0]), float(y_pos[0]), int(lanes[0]), velocity)
 
-        return Car(x_pos, y_pos, lane, velocity)
+    return None